@@ -0,0 +1,33 @@
+"""
+    AnalysisTools
+
+    Plotting-free processing shared by the figure scripts.
+
+    Usage
+    -----
+    from AnalysisTools import traces
+    traces_norm = traces.process(counts, fps=408, filter_lp=True, norm=True)
+
+    Modules
+    -------
+    traces : dF/F0 conversion, filtering and normalization of (n_traces, n_samples) batches
+    filters : Cached Butterworth filter designs (second-order sections) for stacks of traces
+    windows : Binary-search time windows and zero-copy window views
+    emka : Reader for emka iox / ecgAuto text exports (ECG)
+    actmaps : Model activation maps and activation map analysis
+    conduction : Per-pixel conduction velocity (speed and direction) fields of activation maps
+    mapstore : ActMap / APD map CSVs converted once to memory-mapped float32 binaries
+    stacks : Memory-mapped / chunked reader for 16-bit TIFF recordings (stacks and image sequences)
+    rois : Mean traces of many square / circular ROIs in one pass over a stack
+    binning : Separable uniform / Gaussian / box binning of frame stacks, in place or out-of-core
+    activation : Activation maps (max dF/dt) computed from raw frame stacks
+    durations : Vectorized APD / CaD maps at several recovery levels, with a quality mask
+    beats : Beat detection (upstroke peaks or known PCL) and ensemble averaging of batches of traces
+    dual : Vm / Ca (RH237 / Rhod-2) pairing, per-beat and per-pixel latency, FFT cross-correlation lag
+    phase : Chunked Hilbert phase maps, topological charge and tracking of phase singularities (VF)
+    spectra : Dominant frequency and regularity index maps from batched rfft / Welch spectra, in row tiles
+    alternans : Even / odd and spectral alternans of per-beat APD / amplitude, per ROI (tables) and per pixel (maps)
+    restitution : Exponential / linear APD-DI restitution fits of many curves at once, max slope per animal / group
+    results : Content-addressed cache of parsed traces, maps and fits, keyed on input file hashes and parameters (LRU, size cap)
+    batch : Find every ActMap-*.csv of a study and tabulate their CV and activation times in a process pool
+"""
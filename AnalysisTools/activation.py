@@ -0,0 +1,299 @@
+"""
+Activation maps computed from raw frame stacks.
+
+Each pixel activates at its maximum upstroke slope (max dF/dt) within a
+beat window. The peak of the derivative is refined to a fraction of a frame
+with a parabola through the derivative around it. Pixels are processed in
+blocks of rows, optionally in a process pool, with the same steps as the
+settings recorded in ActMaps_NOTES.ods: box blur, low-pass filter, drift
+removal and a background threshold.
+
+Usage
+-----
+from AnalysisTools import activation, stacks
+stack = stacks.open_stack('data/20190322-piga/01-350_RH237_0001.tif')
+act_map = activation.activation_map(stack, fps=500, start=0.73, end=0.88, invert=True,
+                                    bin_size=15, freq=50)
+activation.save_csv(act_map, 'ActMaps/ActMap-01-350_RH237.csv')
+"""
+
+import io
+import itertools
+import functools
+import collections
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+from AnalysisTools import binning, filters
+
+
+def upstroke_times(frames, fps, invert=False):
+    """
+    Time of the maximum upstroke slope of every pixel, with sub-frame interpolation.
+
+    Parameters
+    ----------
+    frames : array-like
+        (n_frames, H, W) beat window, or (n_frames, ...) traces along the first axis
+
+    fps : float
+        Frame rate (frames per second)
+
+    invert : bool, optional
+        If True, find the steepest decrease instead, e.g. for voltage dyes
+        (RH237, di-4-ANEPPS) whose fluorescence drops as the cells depolarize.
+        Defaults to False.
+
+    Returns
+    -------
+    times : ndarray
+        Activation times (ms) from the first frame, shape frames.shape[1:]
+    """
+    frames = np.asarray(frames, dtype=float)
+    if len(frames) < 3:
+        raise ValueError('At least 3 frames are needed, got {}'.format(len(frames)))
+    slopes = np.diff(frames, axis=0)
+    if invert:
+        slopes = -slopes
+    idx = np.argmax(slopes, axis=0)
+    # Parabola through the slope before, at and after the peak (clamped at the ends)
+    idx_inner = np.clip(idx, 1, len(slopes) - 2)
+    before, peak, after = (np.take_along_axis(slopes, (idx_inner + step)[None], axis=0)[0]
+                           for step in (-1, 0, 1))
+    curvature = before - 2 * peak + after
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(curvature < 0, 0.5 * (before - after) / curvature, 0)
+    offset = np.where(idx == idx_inner, np.clip(offset, -0.5, 0.5), 0)
+    # The slope between frames i and i + 1 is centered at i + 0.5
+    return (idx + 0.5 + offset) / fps * 1000
+
+
+def condition(block, fps, freq=None, order=5, drift=True):
+    """
+    Remove drift and low-pass filter the pixels of a block of frames.
+
+    Parameters
+    ----------
+    block : array-like
+        (n_frames, ...) pixels along the first axis
+
+    fps : float
+        Frame rate (frames per second)
+
+    freq : float, optional
+        Cutoff (Hz) of a low-pass filter along time.
+        Defaults to no filter.
+
+    order : int, optional
+        Low-pass filter order.
+        Defaults to 5.
+
+    drift : bool, optional
+        If True, remove a 1st order (linear) drift of every pixel, fit over the whole block.
+        Defaults to True.
+
+    Returns
+    -------
+    block : ndarray
+        float64 copy of the block
+    """
+    block = np.array(block, dtype=float)
+    if drift:
+        t = np.arange(len(block)) - (len(block) - 1) / 2
+        slope = np.tensordot(t, block, axes=(0, 0)) / (t ** 2).sum()
+        block -= t.reshape((-1,) + (1,) * (block.ndim - 1)) * slope
+    if freq:
+        block = filters.lowpass(fps, freq, order)(block, axis=0)
+    return block
+
+
+def row_blocks(stack, idx_start=0, idx_end=None, bin_size=None, n_rows=64):
+    """
+    Stream a window of frames in blocks of rows of pixels.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) recording
+
+    idx_start, idx_end : int, optional
+        Window of frames.
+        Defaults to every frame.
+
+    bin_size : int, optional
+        Width (px) of a uniform (box blur) spatial filter applied to every frame.
+        Blocks are read with bin_size // 2 extra rows on each side, so the
+        result is the same as binning whole frames.
+        Defaults to no binning.
+
+    n_rows : int, optional
+        Number of rows per block.
+        Defaults to 64.
+
+    Yields
+    ------
+    block : ndarray
+        (n_frames, <= n_rows, W) float32 frames
+    """
+    height = stack.shape[1]
+    halo = bin_size // 2 if bin_size else 0
+    for row_start in range(0, height, n_rows):
+        row_stop = min(row_start + n_rows, height)
+        read_start, read_stop = max(row_start - halo, 0), min(row_stop + halo, height)
+        block = np.asarray(stack[idx_start:idx_end, read_start:read_stop], dtype=np.float32)
+        if bin_size:
+            block = binning.bin_frames(block, kind='uniform', size=bin_size)
+        yield block[:, row_start - read_start:row_stop - read_start]
+
+
+def imap_blocks(function, blocks, processes=None, threads=None):
+    """
+    Apply a function to every block, yielding the results in order.
+
+    Parameters
+    ----------
+    function : callable
+        Function of one block, picklable (e.g. a functools.partial) for processes
+
+    blocks : iterable
+        Blocks, e.g. from row_blocks(); only read as workers become free
+
+    processes : int, optional
+        Number of worker processes.
+        Defaults to processing in this process.
+
+    threads : int, optional
+        Number of worker threads, used if processes isn't given, e.g. for
+        functions that release the GIL.
+        Defaults to processing in this thread.
+
+    Yields
+    ------
+    result
+        function(block) of each block
+    """
+    workers = processes if processes and processes > 1 else (threads if threads and threads > 1 else None)
+    if workers is None:
+        for block in blocks:
+            yield function(block)
+        return
+    executor_class = ProcessPoolExecutor if processes and processes > 1 else ThreadPoolExecutor
+    # Keep at most 2 blocks per worker in flight, so memory stays bounded by the block
+    # size instead of every block of the window being read and queued up front
+    blocks = iter(blocks)
+    with executor_class(max_workers=workers) as executor:
+        futures = collections.deque(executor.submit(function, block)
+                                    for block in itertools.islice(blocks, 2 * workers))
+        while futures:
+            result = futures.popleft().result()
+            for block in itertools.islice(blocks, 1):
+                futures.append(executor.submit(function, block))
+            yield result
+
+
+def map_blocks(function, blocks, processes=None, threads=None):
+    """List of function(block) of every block, see imap_blocks()."""
+    return list(imap_blocks(function, blocks, processes=processes, threads=threads))
+
+
+def _process_block(block, fps, invert=False, freq=None, order=5, drift=True):
+    # Activation times and signal amplitude of one (n_frames, rows, W) block
+    block = condition(block, fps, freq=freq, order=order, drift=drift)
+    amplitude = block.max(axis=0) - block.min(axis=0)
+    return upstroke_times(block, fps, invert=invert), amplitude
+
+
+def activation_map(stack, fps, start=0, end=None, invert=False, bin_size=None, freq=None, order=5,
+                   drift=True, threshold=0.1, relative=True, n_rows=64, processes=None):
+    """
+    Activation map of a beat window of a frame stack.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) recording, e.g. from stacks.open_stack()
+
+    fps : float
+        Frame rate (frames per second)
+
+    start, end : float, optional
+        Beat window (s) from the first frame, e.g. the Start and End of ActMaps_NOTES.ods.
+        Defaults to the whole recording.
+
+    invert : bool, optional
+        If True, activation is the steepest decrease of fluorescence (voltage dyes).
+        Defaults to False.
+
+    bin_size : int, optional
+        Width (px) of a uniform (box blur) spatial filter applied to every frame first.
+        Defaults to no binning.
+
+    freq : float, optional
+        Cutoff (Hz) of a low-pass filter along time.
+        Defaults to no filter.
+
+    order : int, optional
+        Low-pass filter order.
+        Defaults to 5.
+
+    drift : bool, optional
+        If True, remove a linear drift of each pixel over the window.
+        Defaults to True.
+
+    threshold : float, optional
+        Pixels whose signal amplitude is below this fraction of the largest
+        amplitude (background) are set to NaN.
+        Defaults to 0.1.
+
+    relative : bool, optional
+        If True, times are from the earliest activation, like the ActMap-*.csv files,
+        otherwise from the start of the window.
+        Defaults to True.
+
+    n_rows : int, optional
+        Number of rows of pixels processed at a time.
+        Defaults to 64.
+
+    processes : int, optional
+        Number of worker processes for the blocks of rows.
+        Defaults to processing in this process.
+
+    Returns
+    -------
+    act_map : ndarray
+        (H, W) activation times (ms), NaN for background
+    """
+    idx_start = int(round(start * fps))
+    idx_end = None if end is None else int(round(end * fps))
+    process = functools.partial(_process_block, fps=fps, invert=invert, freq=freq, order=order,
+                                drift=drift)
+    results = map_blocks(process, row_blocks(stack, idx_start, idx_end, bin_size=bin_size, n_rows=n_rows),
+                         processes=processes)
+    times = np.concatenate([result[0] for result in results])
+    amplitude = np.concatenate([result[1] for result in results])
+
+    times[amplitude < threshold * amplitude.max()] = np.nan
+    if relative and not np.all(np.isnan(times)):
+        times -= np.nanmin(times)
+    return times
+
+
+def save_csv(act_map, path, decimals=3):
+    """
+    Save a map in the ActMap-*.csv layout: comma separated rows, 'NaN' for no tissue.
+
+    Parameters
+    ----------
+    act_map : ndarray
+        (H, W) map
+
+    path : str
+        Output file
+
+    decimals : int, optional
+        Decimals of the values.
+        Defaults to 3, as in the existing maps.
+    """
+    text = io.StringIO()
+    np.savetxt(text, act_map, fmt='%.{}f'.format(decimals), delimiter=',')
+    with open(path, 'w') as file:
+        file.write(text.getvalue().replace('nan', 'NaN'))
@@ -0,0 +1,205 @@
+"""
+Activation map models and analysis.
+
+Activation maps are 2-D arrays of activation times (ms) indexed [row, column],
+with NaN where there is no tissue. Batches of maps are (n_maps, H, W) stacks,
+or lists of maps of any shapes.
+
+Usage
+-----
+from AnalysisTools import actmaps
+act_map = actmaps.generate(shape=(400, 200), cv=50)
+curves = actmaps.activation_curves([act_map_fast, act_map_slow], fps=500)
+curves.times, curves.percents[0]        # x and y of the first curve
+curves.times_to[:, 1]                   # time to 50% activation of each map
+"""
+
+from collections import namedtuple
+import numpy as np
+
+
+def generate(shape=(200, 200), cv=50, cv_transverse=None, fiber_angle=0, origins=None,
+             origin_times=None, resolution=0.005):
+    """
+    Generate a model activation map by broadcasting over the pixel grid.
+
+    Conduction spreads from each origin along ellipses: at cv along the fibers
+    and at cv_transverse across them. A pixel activates at the earliest time
+    reached from any origin.
+
+    Parameters
+    ----------
+    shape : tuple, optional
+        Map dimensions (rows, columns) in pixels.
+        Defaults to (200, 200).
+
+    cv : float, optional
+        Longitudinal conduction velocity (cm/s), or the velocity in every direction if
+        cv_transverse is None.
+        Defaults to 50.
+
+    cv_transverse : float, optional
+        Transverse conduction velocity (cm/s).
+        Defaults to cv (isotropic conduction).
+
+    fiber_angle : float, optional
+        Fiber direction (degrees), from the column (x) axis towards the row (y) axis.
+        Defaults to 0.
+
+    origins : list, optional
+        Pacing sites as (row, column) pixel coordinates, may be fractional.
+        Defaults to the center of the map: [(rows / 2, columns / 2)].
+
+    origin_times : list, optional
+        Activation time (ms) of each origin.
+        Defaults to 0 for every origin.
+
+    resolution : float, optional
+        Spatial resolution (cm/px).
+        Defaults to 0.005 (4 cm / 200 px).
+
+    Returns
+    -------
+    act_map : ndarray
+        Activation times (ms) with the given shape
+    """
+    rows, cols = shape
+    if origins is None:
+        origins = [(rows / 2, cols / 2)]
+    origins = np.asarray(origins, dtype=float).reshape(-1, 2)
+    if origin_times is None:
+        origin_times = np.zeros(len(origins))
+    origin_times = np.asarray(origin_times, dtype=float).reshape(-1)
+    if cv_transverse is None:
+        cv_transverse = cv
+
+    # Distances (cm) of every pixel from every origin, shape (n_origins, rows, cols)
+    d_row = (np.arange(rows)[None, :, None] - origins[:, 0, None, None]) * resolution
+    d_col = (np.arange(cols)[None, None, :] - origins[:, 1, None, None]) * resolution
+    # Components along and across the fibers
+    angle = np.deg2rad(fiber_angle)
+    d_long = d_col * np.cos(angle) + d_row * np.sin(angle)
+    d_trans = d_row * np.cos(angle) - d_col * np.sin(angle)
+    # Travel time (s to ms) from each origin, earliest one wins
+    times = np.hypot(d_long / cv, d_trans / cv_transverse) * 1000
+    times += origin_times[:, None, None]
+    return times.min(axis=0)
+
+
+class ActivationCurves(namedtuple('ActivationCurves', ['times', 'percents', 'levels', 'times_to'])):
+    """
+    Tissue activation curves of a batch of activation maps.
+
+    Attributes
+    ----------
+    times : ndarray
+        Right edges of the shared time bins (ms), the x-axis of every curve
+
+    percents : ndarray
+        (n_maps, n_bins) cumulative % of each map's tissue activated by each time
+
+    levels : tuple
+        Activation levels (%) of times_to
+
+    times_to : ndarray
+        (n_maps, n_levels) activation time (ms) by which each level of the tissue
+        is activated, NaN for maps without tissue
+    """
+    __slots__ = ()
+
+
+def _flatten_maps(act_maps):
+    # One row of activation times per map, padded with NaN if the maps differ in size
+    if isinstance(act_maps, np.ndarray):
+        act_maps = act_maps.astype(float, copy=False)
+        if act_maps.ndim == 2:
+            return act_maps.reshape(1, -1)
+        return act_maps.reshape(len(act_maps), -1)
+    flat = [np.asarray(act_map, dtype=float).ravel() for act_map in act_maps]
+    values = np.full((len(flat), max(len(row) for row in flat)), np.nan)
+    for row, act_map in zip(values, flat):
+        row[:len(act_map)] = act_map
+    return values
+
+
+def curve_bins(time_max, fps=500, time_min=0):
+    """
+    Time bin edges (ms) shared by activation curves, one bin per frame.
+
+    Parameters
+    ----------
+    time_max : float
+        Latest activation time (ms), e.g. the max of every map being compared
+
+    fps : float, optional
+        Frame rate (frames per second) of the recordings the maps came from.
+        Defaults to 500.
+
+    time_min : float, optional
+        Earliest activation time (ms).
+        Defaults to 0.
+
+    Returns
+    -------
+    bins : ndarray
+    """
+    n_bins = max(int(np.ceil((time_max - time_min) * fps / 1000)), 1)
+    return np.linspace(time_min, time_max, num=n_bins + 1)
+
+
+def activation_curves(act_maps, bins=None, fps=500, levels=(10, 50, 90)):
+    """
+    Tissue activation curves and times to activation levels of a batch of maps.
+
+    Every map is binned with the same bins in one pass, so the curves share
+    their x-axis and can be compared directly.
+
+    Parameters
+    ----------
+    act_maps : ndarray or list
+        One activation map, an (n_maps, H, W) stack or a list of maps
+
+    bins : array-like, optional
+        Time bin edges (ms), activation times outside them are not counted.
+        Defaults to curve_bins() from 0 to the latest activation time of all maps.
+
+    fps : float, optional
+        Frame rate (frames per second) used for the default bins.
+        Defaults to 500.
+
+    levels : tuple, optional
+        Activation levels (%) to report times for.
+        Defaults to (10, 50, 90).
+
+    Returns
+    -------
+    curves : ActivationCurves
+    """
+    values = _flatten_maps(act_maps)
+    n_maps = len(values)
+    valid = ~np.isnan(values)
+    n_valid = valid.sum(axis=1)
+    if bins is None:
+        bins = curve_bins(np.nanmax(values) if valid.any() else 0, fps=fps)
+    bins = np.asarray(bins, dtype=float)
+    n_bins = len(bins) - 1
+
+    # Histogram every map at once: offset each map's bin indices by its row
+    rows, cols = np.nonzero(valid)
+    times = values[rows, cols]
+    idx_bin = np.searchsorted(bins, times, side='right') - 1
+    idx_bin[times == bins[-1]] = n_bins - 1     # Last bin includes its right edge, as in np.histogram
+    inside = (idx_bin >= 0) & (idx_bin < n_bins)
+    counts = np.bincount(rows[inside] * n_bins + idx_bin[inside], minlength=n_maps * n_bins)
+    counts = counts.reshape(n_maps, n_bins)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percents = 100 * np.cumsum(counts, axis=1) / n_valid[:, None]
+
+    # Times to each level from the sorted activation times (NaN sort last)
+    levels = tuple(levels)
+    times_sorted = np.sort(values, axis=1)
+    idx_level = np.ceil(np.multiply.outer(n_valid, levels) / 100).astype(int) - 1
+    idx_level = np.clip(idx_level, 0, values.shape[1] - 1)
+    times_to = np.take_along_axis(times_sorted, idx_level, axis=1)
+    times_to[n_valid == 0] = np.nan
+    return ActivationCurves(bins[1:], percents, levels, times_to)
@@ -0,0 +1,318 @@
+"""
+Beat-to-beat alternans of APD / CaD and transient amplitude.
+
+Alternans is measured on series of per-beat values (e.g. APD80 or Ca transient
+amplitude) of every ROI or pixel at once, with the beat number along one axis:
+    even / odd : difference between the mean of even and of odd beats, and the
+    alternans ratio 1 - smaller / larger mean (used for Ca amplitude)
+    spectral : power of the beat series at 0.5 cycles / beat above the noise
+    band (0.33 - 0.48 cycles / beat), as a magnitude and a k-score (significant above 3)
+
+Per-beat values come from beats that were already segmented, so finding beats
+(beats.upstrokes(), beats.segment()) is done once and reused:
+    ROIs : beat_series() of beats.segment() windows
+    pixels : beat_maps() of a stack, at the upstrokes of a reference ROI
+
+Usage
+-----
+from AnalysisTools import alternans, beats
+upstrokes = beats.upstrokes(trace_vm, fps=500, invert=True, pcl=150)
+segments = np.stack([beats.segment(trace, upstrokes, 10, 65) for trace in traces_vm])
+series = alternans.beat_series(segments, fps=500, invert=True)        # (n_rois, n_beats)
+table = alternans.summary(series.duration, labels=['RV', 'LV'])
+series_maps = alternans.beat_maps(stack, fps=500, upstrokes=upstrokes, before=20, after=130, invert=True)
+maps = alternans.analyze(series_maps.duration, axis=0)                 # (H, W) maps
+"""
+
+import functools
+from collections import namedtuple, OrderedDict
+import numpy as np
+import pandas as pd
+from AnalysisTools import activation, durations
+
+# Noise band (cycles / beat) of the spectral method
+NOISE_BAND = (0.33, 0.48)
+
+
+class BeatSeries(namedtuple('BeatSeries', ['duration', 'amplitude'])):
+    """
+    Per-beat values of ROIs or pixels.
+
+    Attributes
+    ----------
+    duration : ndarray
+        Durations (ms) at one recovery level, e.g. APD80, with the beats along one axis
+
+    amplitude : ndarray
+        Transient amplitudes, same shape
+    """
+    __slots__ = ()
+
+
+class Alternans(namedtuple('Alternans', ['mean', 'magnitude', 'ratio', 'spectral', 'k_score'])):
+    """
+    Alternans measures of beat series.
+
+    Attributes
+    ----------
+    mean : ndarray
+        Mean of the beats
+
+    magnitude : ndarray
+        |mean of even beats - mean of odd beats|
+
+    ratio : ndarray
+        Alternans ratio, 1 - smaller / larger of the even and odd means
+
+    spectral : ndarray
+        Spectral alternans magnitude, comparable to magnitude (0 if below the noise)
+
+    k_score : ndarray
+        (alternans power - mean noise power) / noise standard deviation
+    """
+    __slots__ = ()
+
+
+def even_odd(values, axis=-1):
+    """
+    Even / odd beat alternans of beat series.
+
+    Parameters
+    ----------
+    values : array-like
+        Per-beat values, beats along axis, NaN for missing beats
+
+    axis : int, optional
+        Beat axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    magnitude : ndarray
+        |mean of even beats - mean of odd beats|
+
+    ratio : ndarray
+        1 - smaller / larger of the two means
+    """
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_even, mean_odd = np.nanmean(values[..., ::2], axis=-1), np.nanmean(values[..., 1::2], axis=-1)
+        ratio = 1 - np.minimum(mean_even, mean_odd) / np.maximum(mean_even, mean_odd)
+    return np.abs(mean_even - mean_odd), ratio
+
+
+def spectral(values, axis=-1, noise_band=NOISE_BAND):
+    """
+    Spectral alternans of beat series.
+
+    Parameters
+    ----------
+    values : array-like
+        Per-beat values, beats along axis; missing (NaN) beats are set to the series' mean
+
+    axis : int, optional
+        Beat axis.
+        Defaults to the last axis.
+
+    noise_band : tuple, optional
+        (low, high) frequencies (cycles / beat) of the noise estimate.
+        Defaults to (0.33, 0.48).
+
+    Returns
+    -------
+    magnitude : ndarray
+        2 * sqrt(alternans power - mean noise power), the even / odd difference of a
+        pure alternation, 0 if the alternans power is below the noise
+
+    k_score : ndarray
+        (alternans power - mean noise power) / noise standard deviation
+    """
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    n = values.shape[-1]
+    freqs = np.fft.rfftfreq(n)
+    noise = (freqs >= noise_band[0]) & (freqs <= noise_band[1])
+    if noise.sum() < 2:
+        raise ValueError('{} beats are too few for the noise band {}'.format(n, noise_band))
+    # Remove each series' mean and linear trend, so slow drift isn't counted
+    with np.errstate(invalid='ignore'):
+        values = values - np.nanmean(values, axis=-1, keepdims=True)
+    values = np.nan_to_num(values)
+    beat = np.arange(n) - (n - 1) / 2
+    values = values - beat * ((values * beat).sum(axis=-1, keepdims=True) / (beat ** 2).sum())
+
+    power = np.abs(np.fft.rfft(values, axis=-1)) ** 2 / n ** 2
+    # The alternans bin (0.5 cycles / beat) only exists for an even number of beats
+    alternans = power[..., -1] if n % 2 == 0 else np.abs((values * (-1) ** np.arange(n)).sum(axis=-1)) ** 2 / n ** 2
+    noise_mean, noise_std = power[..., noise].mean(axis=-1), power[..., noise].std(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        k_score = (alternans - noise_mean) / noise_std
+    return 2 * np.sqrt(np.maximum(alternans - noise_mean, 0)), k_score
+
+
+def analyze(values, axis=-1, noise_band=NOISE_BAND):
+    """
+    Every alternans measure of beat series, see even_odd() and spectral().
+
+    Parameters
+    ----------
+    values : array-like
+        Per-beat values, e.g. (n_rois, n_beats) or (n_beats, H, W)
+
+    axis : int, optional
+        Beat axis.
+        Defaults to the last axis.
+
+    noise_band : tuple, optional
+        See spectral()
+
+    Returns
+    -------
+    measures : Alternans
+        Arrays (or maps) of the shape of values without the beat axis
+    """
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid='ignore'):
+        mean = np.nanmean(values, axis=axis)
+    magnitude, ratio = even_odd(values, axis=axis)
+    magnitude_spectral, k_score = spectral(values, axis=axis, noise_band=noise_band)
+    return Alternans(mean, magnitude, ratio, magnitude_spectral, k_score)
+
+
+def beat_series(segments, fps, level=80, invert=False):
+    """
+    Per-beat duration and amplitude of segmented beats.
+
+    Parameters
+    ----------
+    segments : array-like
+        (..., n_beats, n_window) beat windows, e.g. beats.segment() of each ROI stacked
+
+    fps : float
+        Sample rate (frames per second)
+
+    level : int, optional
+        Recovery level (%) of the durations.
+        Defaults to 80.
+
+    invert : bool, optional
+        If True, the signal falls at activation (voltage dyes).
+        Defaults to False.
+
+    Returns
+    -------
+    series : BeatSeries
+        (..., n_beats) durations (ms) and amplitudes
+    """
+    signal = np.moveaxis(np.asarray(segments, dtype=float), -1, 0)
+    if invert:
+        signal = -signal
+    beat_durations, _, amplitude = durations.beat_durations(signal, fps, levels=(level,))
+    return BeatSeries(beat_durations[0], amplitude)
+
+
+def _beat_block(block, fps, offsets, n_window, level=80, invert=False, freq=None, order=5):
+    # Per-beat durations and amplitudes of one (n_frames, rows, W) block spanning every beat
+    block = activation.condition(block, fps, freq=freq, order=order, drift=False)
+    if invert:
+        block = -block
+    beat_durations, amplitude = [], []
+    for offset in offsets:
+        duration, _, beat_amplitude = durations.beat_durations(block[offset:offset + n_window], fps,
+                                                               levels=(level,))
+        beat_durations.append(duration[0])
+        amplitude.append(beat_amplitude)
+    return np.stack(beat_durations), np.stack(amplitude)
+
+
+def beat_maps(stack, fps, upstrokes, before, after, level=80, invert=False, bin_size=None, freq=None,
+              order=5, threshold=0.1, n_rows=32, processes=None):
+    """
+    Per-beat duration and amplitude maps of a stack, at already detected upstrokes.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) recording, e.g. from stacks.open_stack()
+
+    fps : float
+        Frame rate (frames per second)
+
+    upstrokes : array-like
+        Frame index of each beat's upstroke, e.g. beats.upstrokes() of a reference ROI
+
+    before, after : float
+        Window (ms) of each beat before and from its upstroke, up to the next beat
+
+    level : int, optional
+        Recovery level (%) of the durations.
+        Defaults to 80.
+
+    invert, bin_size, freq, order : optional
+        See durations.duration_maps()
+
+    threshold : float, optional
+        Pixels whose mean amplitude is below this fraction of the largest are set to NaN.
+        Defaults to 0.1.
+
+    n_rows, processes : optional
+        Blocks of rows processed at a time and worker processes, see activation.activation_map()
+
+    Returns
+    -------
+    series : BeatSeries
+        (n_beats, H, W) durations (ms) and amplitudes of the complete beats
+    """
+    n_before, n_after = int(round(before / 1000 * fps)), int(round(after / 1000 * fps))
+    upstrokes = np.asarray(upstrokes, dtype=int)
+    upstrokes = upstrokes[(upstrokes - n_before >= 0) & (upstrokes + n_after <= len(stack))]
+    if not len(upstrokes):
+        raise ValueError('No complete beat windows in the stack')
+    idx_start, idx_end = upstrokes[0] - n_before, upstrokes[-1] + n_after
+    # Filter the whole span once per block, then cut each beat from it
+    process = functools.partial(_beat_block, fps=fps, offsets=upstrokes - n_before - idx_start,
+                                n_window=n_before + n_after, level=level, invert=invert, freq=freq,
+                                order=order)
+    results = activation.map_blocks(process, activation.row_blocks(stack, idx_start, idx_end,
+                                                                   bin_size=bin_size, n_rows=n_rows),
+                                    processes=processes)
+    beat_durations = np.concatenate([result[0] for result in results], axis=1)
+    amplitude = np.concatenate([result[1] for result in results], axis=1)
+
+    mean_amplitude = amplitude.mean(axis=0)
+    background = mean_amplitude < threshold * mean_amplitude.max()
+    beat_durations[:, background], amplitude[:, background] = np.nan, np.nan
+    return BeatSeries(beat_durations, amplitude)
+
+
+def summary(values, labels=None, noise_band=NOISE_BAND, k_min=3):
+    """
+    Table of the alternans of ROI beat series.
+
+    Parameters
+    ----------
+    values : array-like
+        (n_rois, n_beats) per-beat values, e.g. BeatSeries.duration
+
+    labels : list of str, optional
+        Name of each ROI, e.g. ROI.label.
+        Defaults to the ROI numbers.
+
+    noise_band : tuple, optional
+        See spectral()
+
+    k_min : float, optional
+        k-score above which spectral alternans is significant.
+        Defaults to 3.
+
+    Returns
+    -------
+    table : pandas.DataFrame
+        One row per ROI: n_beats, mean, magnitude, ratio, spectral, k_score, significant
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    measures = analyze(values, axis=-1, noise_band=noise_band)
+    columns = OrderedDict([('roi', labels if labels is not None else np.arange(len(values))),
+                           ('n_beats', (~np.isnan(values)).sum(axis=-1))])
+    columns.update(measures._asdict())
+    columns['significant'] = measures.k_score > k_min
+    return pd.DataFrame(columns)
@@ -0,0 +1,254 @@
+"""
+Batch analysis of every activation map of a study.
+
+Activation maps are found by their ActMap-*.csv file names, which follow two
+layouts:
+
+    <date>-<animal>/[ActMaps/]ActMap-<recording>-<PCL or NSR>_<signal>.csv
+    e.g. 20190717-rata/ActMap-03-150_Vm.csv
+
+    ActMap-<date>-<animal>-<recording>.csv
+    e.g. ActMap-20180522-rata-15.csv, where the PCL isn't part of the name
+
+Each map's conduction velocity field and activation curve are summarized in
+a process pool, and the results are collected in one table with a row per map.
+
+Usage
+-----
+from AnalysisTools import batch
+results = batch.run('ConductionVelocity/data', output='ConductionVelocity_results.csv')
+
+or from the command line:
+python -m AnalysisTools.batch ConductionVelocity/data -o ConductionVelocity_results.csv
+"""
+
+import os
+import re
+import glob
+import argparse
+import functools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from AnalysisTools import actmaps, conduction, mapstore
+
+_NAME_FULL = re.compile(r'^ActMap-(?P<date>\d{8})-(?P<animal>[A-Za-z]\w*)-(?P<recording>\d+)'
+                        r'(?:-(?P<pcl>\d+|NSR))?(?:_(?P<signal>[^.]+))?\.csv$')
+_NAME_SHORT = re.compile(r'^ActMap-(?P<recording>\d+)-(?P<pcl>\d+|NSR)(?:_(?P<signal>[^.]+))?\.csv$')
+_FOLDER = re.compile(r'^(?P<date>\d{8})-(?P<animal>[A-Za-z]\w*)$')
+
+
+class MapInfo(namedtuple('MapInfo', ['path', 'date', 'animal', 'recording', 'pcl', 'signal'])):
+    """
+    An activation map file and the recording details in its name.
+
+    Attributes
+    ----------
+    path : str
+        Path of the ActMap-*.csv file
+
+    date : str
+        Study date, YYYYMMDD
+
+    animal : str
+        Animal of the study, e.g. 'rata', 'piga'
+
+    recording : int
+        Recording number
+
+    pcl : float
+        Pacing cycle length (ms), NaN for sinus rhythm (NSR) or if not in the name
+
+    signal : str
+        Signal or dye, e.g. 'Vm', 'RH237', 'Rhod-2', or '' if not in the name
+    """
+    __slots__ = ()
+
+
+def parse_name(path):
+    """
+    Parse the recording details of an activation map from its path.
+
+    Parameters
+    ----------
+    path : str
+        Path of an ActMap-*.csv file
+
+    Returns
+    -------
+    info : MapInfo or None
+        None if the name doesn't follow either layout
+    """
+    name = os.path.basename(path)
+    match = _NAME_FULL.match(name)
+    if match:
+        date, animal = match.group('date'), match.group('animal')
+    else:
+        match = _NAME_SHORT.match(name)
+        if not match:
+            return None
+        # The date and animal come from the nearest study folder, e.g. 20190322-piga/ActMaps/
+        date = animal = None
+        folder = os.path.dirname(os.path.abspath(path))
+        while folder != os.path.dirname(folder):
+            match_folder = _FOLDER.match(os.path.basename(folder))
+            if match_folder:
+                date, animal = match_folder.group('date'), match_folder.group('animal')
+                break
+            folder = os.path.dirname(folder)
+        if date is None:
+            return None
+    pcl = match.group('pcl')
+    pcl = float(pcl) if pcl and pcl != 'NSR' else np.nan
+    return MapInfo(path, date, animal, int(match.group('recording')), pcl, match.group('signal') or '')
+
+
+def find_maps(root):
+    """
+    Find every activation map below a folder.
+
+    Parameters
+    ----------
+    root : str
+        Folder to search, e.g. 'ConductionVelocity/data'
+
+    Returns
+    -------
+    maps : list of MapInfo
+        Sorted by date, animal, recording and signal. Files with other names are skipped.
+    """
+    paths = glob.glob(os.path.join(root, '**', 'ActMap-*.csv'), recursive=True)
+    maps = [info for info in map(parse_name, paths) if info is not None]
+    return sorted(maps, key=lambda info: (info.date, info.animal, info.recording, info.signal))
+
+
+def analyze_map(info, resolution=0.005, fps=500, size=7, speed_max=200, levels=(10, 50, 90)):
+    """
+    Summarize the conduction velocity and activation curve of one activation map.
+
+    Parameters
+    ----------
+    info : MapInfo
+        Activation map to analyze, see find_maps()
+
+    resolution : float, optional
+        Spatial resolution (cm/px).
+        Defaults to 0.005.
+
+    fps : float, optional
+        Frame rate (frames per second) of the activation curve bins.
+        Defaults to 500.
+
+    size : int, optional
+        Window width (px) of the conduction velocity plane fits.
+        Defaults to 7.
+
+    speed_max : float, optional
+        Pixel speeds (cm/s) above this are left out of the CV statistics.
+        Defaults to 200.
+
+    levels : tuple, optional
+        Activation levels (%) to report times for.
+        Defaults to (10, 50, 90).
+
+    Returns
+    -------
+    row : dict
+        The map's MapInfo fields and results, one entry per column
+    """
+    # Through the map store, so repeated batches reuse the parsed binary instead of the CSV text
+    act_map = np.asarray(mapstore.load(info.path), dtype=float)
+    field = conduction.velocity_field(act_map, resolution=resolution, size=size, speed_max=speed_max)
+    speeds = field.speed[~np.isnan(field.speed)]
+    curves = actmaps.activation_curves(act_map, fps=fps, levels=levels)
+
+    n_pixels = int(np.count_nonzero(~np.isnan(act_map)))
+    row = info._asdict()
+    row.update(height=act_map.shape[0], width=act_map.shape[1], n_pixels=n_pixels,
+               act_time_max=np.nanmax(act_map) if n_pixels else np.nan,
+               cv_median=np.median(speeds) if speeds.size else np.nan,
+               cv_mean=speeds.mean() if speeds.size else np.nan,
+               cv_std=speeds.std() if speeds.size else np.nan,
+               cv_n=speeds.size)
+    for level, time in zip(curves.levels, curves.times_to[0]):
+        row['time_to_{}'.format(level)] = time
+    return row
+
+
+def run(root, output=None, processes=None, **kwargs):
+    """
+    Analyze every activation map below a folder in a process pool.
+
+    On Windows, call this from a script behind an ``if __name__ == '__main__':`` guard.
+
+    Parameters
+    ----------
+    root : str
+        Folder to search, e.g. 'ConductionVelocity/data'
+
+    output : str, optional
+        File to write the results to, as .csv or .parquet (requires pyarrow).
+        Defaults to not writing the results.
+
+    processes : int, optional
+        Number of worker processes, 1 to analyze in this process.
+        Defaults to the number of CPUs.
+
+    **kwargs
+        Options of analyze_map(), e.g. resolution, fps
+
+    Returns
+    -------
+    results : pandas.DataFrame
+        One row per map
+    """
+    maps = find_maps(root)
+    print('Analyzing {} activation maps in {}'.format(len(maps), root))
+    analyze = functools.partial(analyze_map, **kwargs)
+    rows = []
+    if processes == 1:
+        results = [(info, _call(analyze, info)) for info in maps]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [(info, executor.submit(_call, analyze, info)) for info in maps]
+            results = [(info, future.result()) for info, future in futures]
+    for info, (row, error) in results:
+        if error:
+            print('Skipped {}: {}'.format(info.path, error))
+        else:
+            rows.append(row)
+
+    table = pd.DataFrame(rows)
+    if output:
+        if output.endswith('.parquet'):
+            table.to_parquet(output, index=False)
+        else:
+            table.to_csv(output, index=False)
+        print('Results saved to {}'.format(output))
+    return table
+
+
+def _call(analyze, info):
+    # Unreadable maps are reported instead of stopping the whole batch
+    try:
+        return analyze(info), None
+    except (OSError, ValueError) as error:
+        return None, error
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Analyze every ActMap-*.csv below a folder.')
+    parser.add_argument('root', help='folder to search, e.g. ConductionVelocity/data')
+    parser.add_argument('-o', '--output', default='ActMap_results.csv', help='.csv or .parquet results file')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='worker processes')
+    parser.add_argument('--resolution', type=float, default=0.005, help='spatial resolution (cm/px)')
+    parser.add_argument('--fps', type=float, default=500, help='frame rate of the recordings')
+    parser.add_argument('--size', type=int, default=7, help='window width (px) of the CV fits')
+    options = parser.parse_args(args)
+    run(options.root, output=options.output, processes=options.processes,
+        resolution=options.resolution, fps=options.fps, size=options.size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+"""
+Beat segmentation and ensemble averaging of paced or sinus traces.
+
+Beats are found at their upstrokes (maximum dF/dt), either as peaks of the
+derivative or, when the pacing cycle length (PCL) is known, as the steepest
+upstroke within each expected cycle. Beats are then cut into aligned windows
+around their upstrokes and averaged, which improves the signal to noise ratio
+of a representative transient by about the square root of the number of beats.
+
+Every function works on a batch of traces stacked as a 2-D (n_traces, n_samples)
+array. Beats of dual signals (Vm and Ca) can be aligned on the upstrokes of one
+reference trace, so their relative timing is kept.
+
+Usage
+-----
+from AnalysisTools import beats, traces
+signals = traces.process(counts, fps=408, filter_lp=True)     # (2, n_samples): Vm, Ca
+ensemble = beats.ensemble(signals, fps=408, invert=[True, False], reference=0)
+axis.plot(ensemble.times, ensemble.mean.T)
+"""
+
+from collections import namedtuple
+import numpy as np
+from scipy import signal as sps
+
+
+class Ensemble(namedtuple('Ensemble', ['times', 'mean', 'std', 'n_beats', 'upstrokes'])):
+    """
+    Ensemble average of the aligned beats of a batch of traces.
+
+    Attributes
+    ----------
+    times : ndarray
+        (n_window,) times (ms) of the window samples relative to the upstroke
+
+    mean : ndarray
+        (n_traces, n_window) mean beat of each trace
+
+    std : ndarray
+        (n_traces, n_window) standard deviation across beats
+
+    n_beats : ndarray
+        (n_traces,) number of complete beats averaged
+
+    upstrokes : list of ndarray
+        Sample indices of the upstrokes used for each trace
+    """
+    __slots__ = ()
+
+
+def upstrokes(trace, fps, invert=False, pcl=None, height=0.5, min_interval=None):
+    """
+    Sample indices of the upstrokes (max dF/dt) of the beats of one trace.
+
+    Parameters
+    ----------
+    trace : array-like
+        One trace
+
+    fps : float
+        Sample rate (frames per second)
+
+    invert : bool, optional
+        If True, upstrokes are the steepest decreases (voltage dyes, e.g. RH237).
+        Defaults to False.
+
+    pcl : float, optional
+        Pacing cycle length (ms). If given, the first upstroke is found as a peak,
+        then the steepest upstroke is taken in each following cycle (+/- half a cycle),
+        if it is above height.
+        Defaults to detecting every beat as a peak of the derivative.
+
+    height : float, optional
+        Minimum derivative of a peak, as a fraction of the largest derivative.
+        Defaults to 0.5.
+
+    min_interval : float, optional
+        Minimum time (ms) between upstrokes.
+        Defaults to half the PCL, or 50 ms.
+
+    Returns
+    -------
+    indices : ndarray
+        Index of the sample after the steepest step of each beat
+    """
+    slope = np.diff(np.asarray(trace, dtype=float))
+    if invert:
+        slope = -slope
+    if min_interval is None:
+        min_interval = pcl / 2 if pcl else 50
+    distance = max(int(min_interval / 1000 * fps), 1)
+    peaks, _ = sps.find_peaks(slope, height=height * np.nanmax(slope), distance=distance)
+    if pcl is None or not len(peaks):
+        return peaks + 1
+
+    # One window of a cycle centered on each expected upstroke, all searched at once
+    cycle = pcl / 1000 * fps
+    half = int(cycle // 2)
+    expected = np.round(peaks[0] + cycle * np.arange(int((len(slope) - peaks[0]) / cycle) + 1)).astype(int)
+    expected = expected[expected + half < len(slope)]
+    offsets = np.arange(-half, half + 1)
+    windows = np.clip(expected[:, None] + offsets, 0, len(slope) - 1)
+    indices = windows[np.arange(len(windows)), np.argmax(slope[windows], axis=1)]
+    # Cycles without a beat (e.g. after the last stimulus) have no steep upstroke
+    return indices[slope[indices] >= height * np.nanmax(slope)] + 1
+
+
+def segment(trace, indices, before, after):
+    """
+    Aligned windows of a trace around sample indices, e.g. upstrokes.
+
+    Parameters
+    ----------
+    trace : array-like
+        One trace
+
+    indices : array-like
+        Alignment sample of each beat
+
+    before, after : int
+        Number of samples kept before and from each index
+
+    Returns
+    -------
+    beats : ndarray
+        (n_beats, before + after) copies of the complete windows; beats too close to
+        the ends of the trace are left out
+    """
+    trace = np.asarray(trace)
+    indices = np.asarray(indices, dtype=int)
+    indices = indices[(indices - before >= 0) & (indices + after <= len(trace))]
+    return trace[indices[:, None] + np.arange(-before, after)]
+
+
+def ensemble(traces, fps, invert=False, pcl=None, reference=None, before=None, after=None,
+             height=0.5, min_interval=None):
+    """
+    Ensemble average the beats of each trace of a batch.
+
+    Parameters
+    ----------
+    traces : array-like
+        One trace or (n_traces, n_samples)
+
+    fps : float
+        Sample rate (frames per second)
+
+    invert : bool or list of bool, optional
+        If True, upstrokes are the steepest decreases, for all or each trace.
+        Defaults to False.
+
+    pcl : float, optional
+        Pacing cycle length (ms), see upstrokes().
+        Defaults to detecting beats as peaks of the derivative.
+
+    reference : int, optional
+        Index of the trace whose upstrokes align every trace, e.g. Vm to keep the
+        Vm - Ca delay.
+        Defaults to aligning each trace on its own upstrokes.
+
+    before, after : float, optional
+        Window (ms) kept before and from each upstroke.
+        Defaults to 20% and 80% of the PCL, or of the median interval between upstrokes.
+
+    height, min_interval : optional
+        See upstrokes()
+
+    Returns
+    -------
+    ensemble : Ensemble
+    """
+    traces = np.atleast_2d(np.asarray(traces, dtype=float))
+    invert = np.broadcast_to(invert, len(traces))
+    indices = [upstrokes(trace, fps, invert=inverted, pcl=pcl, height=height, min_interval=min_interval)
+               for trace, inverted in zip(traces, invert)]
+    if reference is not None:
+        indices = [indices[reference]] * len(traces)
+    if before is None or after is None:
+        intervals = np.concatenate([np.diff(idx) for idx in indices])
+        if pcl:
+            cycle = pcl / 1000 * fps
+        elif len(intervals):
+            cycle = np.median(intervals)
+        else:
+            raise ValueError('Less than 2 beats were found, set before and after')
+        before = 0.2 * cycle / fps * 1000 if before is None else before
+        after = 0.8 * cycle / fps * 1000 if after is None else after
+    n_before, n_after = int(round(before / 1000 * fps)), int(round(after / 1000 * fps))
+
+    n_window = n_before + n_after
+    mean, std = np.full((2, len(traces), n_window), np.nan)
+    n_beats = np.zeros(len(traces), dtype=int)
+    for idx, (trace, idx_upstrokes) in enumerate(zip(traces, indices)):
+        trace_beats = segment(trace, idx_upstrokes, n_before, n_after)
+        n_beats[idx] = len(trace_beats)
+        if len(trace_beats):
+            mean[idx], std[idx] = trace_beats.mean(axis=0), trace_beats.std(axis=0)
+    times = np.arange(-n_before, n_after) / fps * 1000
+    return Ensemble(times, mean, std, n_beats, indices)
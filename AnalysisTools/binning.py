@@ -0,0 +1,147 @@
+"""
+Spatial binning of frame stacks.
+
+Every frame is smoothed (or block averaged) with a separable kernel, one
+1-D pass along the rows and one along the columns, over chunks of frames
+at a time. Results can be written into an existing array (in place), or
+into a memory-mapped .npy file, so a recording larger than memory is never
+loaded as a whole.
+
+Kernels
+-------
+'uniform' : size x size moving average, e.g. the 15x15 and 30x30 pixel averaging of the traces
+'gaussian' : Gaussian of standard deviation sigma, truncated at size // 2
+'box' : size x size block average that also downsamples, like camera binning
+
+Usage
+-----
+from AnalysisTools import binning, stacks
+stack = stacks.open_stack('data/20190322-pigb/01-350_Vm_0001.tif')
+binned = binning.bin_stack(stack, kind='uniform', size=15)                 # in memory
+binned = binning.bin_stack(stack, kind='uniform', size=15, out='01-350_Vm_15x15.npy')  # on disk
+"""
+
+import numpy as np
+from scipy import ndimage
+
+KINDS = ('uniform', 'gaussian', 'box')
+
+
+def binned_shape(frame_shape, kind, size):
+    """(H, W) of the frames after binning."""
+    if kind == 'box':
+        return tuple(length // size for length in frame_shape)
+    return tuple(frame_shape)
+
+
+def bin_frames(frames, kind='uniform', size=3, sigma=None, mode='nearest', out=None):
+    """
+    Bin one frame or a stack of frames held in memory.
+
+    Parameters
+    ----------
+    frames : array-like
+        One (H, W) frame or an (n_frames, H, W) stack
+
+    kind : str, optional
+        'uniform', 'gaussian' or 'box', see the module docstring.
+        Defaults to 'uniform'.
+
+    size : int, optional
+        Kernel width (px).
+        Defaults to 3.
+
+    sigma : float, optional
+        Standard deviation (px) of the 'gaussian' kernel.
+        Defaults to size / 4, so the kernel is truncated at 2 sigma.
+
+    mode : str, optional
+        How the frame edges are extended, see scipy.ndimage.
+        Defaults to 'nearest'.
+
+    out : ndarray, optional
+        Array to write the result into, may be frames itself. Binning is done in
+        float, and rounded to the nearest value for an integer out.
+        Defaults to a new float32 array.
+
+    Returns
+    -------
+    binned : ndarray
+    """
+    if kind not in KINDS:
+        raise ValueError('Unknown kind {!r}, use one of {}'.format(kind, KINDS))
+    if size < 1:
+        raise ValueError('The kernel size must be >= 1, not {}'.format(size))
+    frames = np.asarray(frames)
+    single = frames.ndim == 2
+    stack = frames.reshape((-1,) + frames.shape[-2:])
+    # Filter in float (float64 only for a float64 out), whatever the dtype of frames and out
+    dtype = np.float64 if out is not None and out.dtype == np.float64 else np.float32
+
+    if kind == 'box':
+        n, height, width = stack.shape
+        rows, cols = height // size * size, width // size * size
+        # Crop to whole blocks, then average each size x size block
+        blocks = stack[:, :rows, :cols].reshape(n, rows // size, size, cols // size, size)
+        binned = blocks.mean(axis=(2, 4), dtype=np.float64)
+    else:
+        binned = stack.astype(dtype)
+        for axis in (1, 2):
+            if kind == 'uniform':
+                ndimage.uniform_filter1d(binned, size, axis=axis, mode=mode, output=binned)
+            else:
+                sigma_px = sigma if sigma is not None else size / 4
+                ndimage.gaussian_filter1d(binned, sigma_px, axis=axis, mode=mode, output=binned,
+                                          truncate=(size // 2) / sigma_px)
+    binned = binned[0] if single else binned
+    if out is None:
+        return binned.astype(np.float32, copy=False)
+    if np.issubdtype(out.dtype, np.integer):
+        # Round to the nearest count instead of truncating, e.g. binning a uint16 stack in place
+        limits = np.iinfo(out.dtype)
+        binned = np.clip(np.rint(binned), limits.min, limits.max)
+    out[...] = binned
+    return out
+
+
+def bin_stack(stack, kind='uniform', size=3, sigma=None, mode='nearest', out=None, n_frames=100):
+    """
+    Bin every frame of a stack, a chunk of frames at a time.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) frames, e.g. from stacks.open_stack() or a memory-mapped array
+
+    kind, size, sigma, mode : optional
+        See bin_frames()
+
+    out : ndarray or str, optional
+        Array to write the result into (may be stack itself, to bin in place),
+        or the path of a .npy file to create and write out-of-core.
+        Defaults to a new float32 array in memory.
+
+    n_frames : int, optional
+        Number of frames held in memory at a time.
+        Defaults to 100.
+
+    Returns
+    -------
+    binned : ndarray
+        (n_frames, H', W') array, memory-mapped if out is a path
+    """
+    shape = (len(stack),) + binned_shape(stack.shape[1:], kind, size)
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=np.float32, shape=shape)
+    elif out.shape != shape:
+        raise ValueError('out has shape {}, binned frames have shape {}'.format(out.shape, shape))
+
+    for idx_start in range(0, len(stack), n_frames):
+        chunk = np.asarray(stack[idx_start:idx_start + n_frames])
+        bin_frames(chunk, kind=kind, size=size, sigma=sigma, mode=mode,
+                   out=out[idx_start:idx_start + len(chunk)])
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
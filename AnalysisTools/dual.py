@@ -0,0 +1,300 @@
+"""
+Dual Vm / Ca analysis: activation latency and cross-correlation lag.
+
+Recordings are paired by their signal tag, the voltage dye first:
+    01-350_RH237.csv / 01-350_Rhod-2.csv     (ConductionVelocity ActMaps and Signals)
+    01-350_Vm_0001.tif / 01-350_Ca_0001.tif  (DualMapping)
+Voltage dyes (RH237) fall at depolarization, so Vm signals are inverted
+before their upstrokes are found; calcium dyes (Rhod-2) rise.
+
+Latency is the Ca activation time minus the Vm activation time (ms): per beat
+of a pair of traces, or per pixel of a pair of stacks. The cross-correlation
+lag (ms) of whole traces is found with FFTs, for every pixel of a stack at once.
+
+Usage
+-----
+from AnalysisTools import dual, stacks
+path_vm, path_ca = dual.find_pairs('data/20190322-pigb', pattern='*_0001.tif')[0]
+stack_vm, stack_ca = stacks.open_stack(path_vm), stacks.open_stack(path_ca)
+latency = dual.latency_map(stack_vm, stack_ca, fps=500, start=0.73, end=0.88, bin_size=15, freq=50)
+lags = dual.lag_map(stack_vm, stack_ca, fps=500, bin_size=15)
+"""
+
+import os
+import re
+import glob
+import functools
+import numpy as np
+from scipy.fftpack import next_fast_len
+from AnalysisTools import activation, beats
+
+# Voltage signal tags and their calcium pair
+PAIRS = {'RH237': 'Rhod-2', 'Vm': 'Ca'}
+_TAG = re.compile(r'(?<=[_-])({})(?=[_.-])'.format('|'.join(re.escape(tag) for tag in PAIRS)))
+
+
+def pair_path(path_vm):
+    """
+    Path of the calcium recording paired with a voltage recording.
+
+    Parameters
+    ----------
+    path_vm : str
+        e.g. 'ActMaps/ActMap-01-350_RH237.csv' or '01-350_Vm_0001.tif'
+
+    Returns
+    -------
+    path_ca : str
+        e.g. 'ActMaps/ActMap-01-350_Rhod-2.csv' or '01-350_Ca_0001.tif'
+    """
+    folder, name = os.path.split(path_vm)
+    matches = list(_TAG.finditer(name))
+    if not matches:
+        raise ValueError('{} has no voltage signal tag ({})'.format(name, ', '.join(PAIRS)))
+    match = matches[-1]
+    return os.path.join(folder, name[:match.start()] + PAIRS[match.group()] + name[match.end():])
+
+
+def find_pairs(root, pattern='**/*'):
+    """
+    Every voltage recording below a folder whose calcium pair exists.
+
+    Parameters
+    ----------
+    root : str
+        Folder to search
+
+    pattern : str, optional
+        Glob pattern of the files, relative to root, e.g. '**/ActMap-*.csv'.
+        Defaults to every file in every subfolder.
+
+    Returns
+    -------
+    pairs : list of tuple
+        (path_vm, path_ca), sorted by path_vm
+    """
+    pairs = []
+    for path in sorted(glob.glob(os.path.join(root, pattern), recursive=True)):
+        if not _TAG.search(os.path.basename(path)):
+            continue
+        path_ca = pair_path(path)
+        if os.path.isfile(path_ca):
+            pairs.append((path, path_ca))
+    return pairs
+
+
+def _refine(trace, indices, invert=False):
+    # Sub-sample upstroke times (samples) with a parabola through the slopes around each index
+    slope = np.diff(np.asarray(trace, dtype=float))
+    if invert:
+        slope = -slope
+    idx = np.clip(np.asarray(indices) - 1, 1, len(slope) - 2)
+    before, peak, after = slope[idx - 1], slope[idx], slope[idx + 1]
+    curvature = before - 2 * peak + after
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(curvature < 0, 0.5 * (before - after) / curvature, 0)
+    return idx + 0.5 + np.clip(offset, -0.5, 0.5)
+
+
+def beat_latency(trace_vm, trace_ca, fps, invert_vm=True, pcl=None, max_latency=None, height=0.5):
+    """
+    Vm to Ca activation latency of every beat of a pair of traces.
+
+    Parameters
+    ----------
+    trace_vm, trace_ca : array-like
+        Voltage and calcium traces of the same pixels
+
+    fps : float
+        Sample rate (frames per second)
+
+    invert_vm : bool, optional
+        If True, Vm upstrokes are the steepest decreases of trace_vm, as recorded.
+        Set to False for traces already inverted, e.g. the Signals-*_RH237.csv exports.
+        Defaults to True.
+
+    pcl : float, optional
+        Pacing cycle length (ms), see beats.upstrokes().
+        Defaults to detecting beats as peaks of the derivative.
+
+    max_latency : float, optional
+        Longest latency (ms) accepted between a Vm upstroke and the next Ca upstroke.
+        Defaults to half the PCL, or 50 ms.
+
+    height : float, optional
+        See beats.upstrokes()
+
+    Returns
+    -------
+    times : ndarray
+        (n_beats,) Vm activation times (ms) from the first sample
+
+    latency : ndarray
+        (n_beats,) Ca - Vm activation times (ms), NaN for beats without a Ca upstroke
+    """
+    if max_latency is None:
+        max_latency = pcl / 2 if pcl else 50
+    upstrokes_vm = beats.upstrokes(trace_vm, fps, invert=invert_vm, pcl=pcl, height=height)
+    upstrokes_ca = beats.upstrokes(trace_ca, fps, pcl=pcl, height=height)
+    times_vm = _refine(trace_vm, upstrokes_vm, invert=invert_vm) / fps * 1000
+    times_ca = _refine(trace_ca, upstrokes_ca) / fps * 1000
+    latency = np.full(len(times_vm), np.nan)
+    if len(times_ca):
+        # First Ca upstroke at or after each Vm upstroke (sub-sample refinement may move it 1/2 sample early)
+        idx = np.searchsorted(times_ca, times_vm - 0.5 / fps * 1000)
+        found = idx < len(times_ca)
+        delay = times_ca[np.minimum(idx, len(times_ca) - 1)] - times_vm
+        found &= delay <= max_latency
+        latency[found] = delay[found]
+    return times_vm, latency
+
+
+def latency_map(stack_vm, stack_ca, fps, start=0, end=None, **kwargs):
+    """
+    Per-pixel Vm to Ca activation latency of one beat.
+
+    Parameters
+    ----------
+    stack_vm, stack_ca : TiffStack or ndarray
+        (n_frames, H, W) voltage and calcium recordings of the same field of view
+
+    fps : float
+        Frame rate (frames per second)
+
+    start, end : float, optional
+        Beat window (s), see activation.activation_map()
+
+    **kwargs
+        bin_size, freq, threshold, n_rows, processes, ... passed to activation.activation_map()
+
+    Returns
+    -------
+    latency : ndarray
+        (H, W) Ca - Vm activation times (ms), NaN where either map is background
+
+    Notes
+    -----
+    Both maps are computed from the start of the same window (relative=False);
+    the ActMap-*.csv exports are each relative to their own earliest pixel, so
+    subtracting them only gives latency up to a constant.
+    """
+    kwargs.setdefault('relative', False)
+    act_vm = activation.activation_map(stack_vm, fps, start=start, end=end, invert=True, **kwargs)
+    act_ca = activation.activation_map(stack_ca, fps, start=start, end=end, invert=False, **kwargs)
+    return act_ca - act_vm
+
+
+def xcorr_lag(traces_a, traces_b, fps, max_lag=None, axis=-1):
+    """
+    Lag (ms) of traces_b behind traces_a at their maximum cross-correlation, computed with FFTs.
+
+    Parameters
+    ----------
+    traces_a, traces_b : array-like
+        Traces of the same length, one or a batch with time along axis, e.g. an
+        inverted Vm and a Ca trace of each pixel
+
+    fps : float
+        Sample rate (frames per second)
+
+    max_lag : float, optional
+        Largest lag (ms) searched in each direction.
+        Defaults to every lag.
+
+    axis : int, optional
+        Time axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    lag : ndarray
+        Sub-sample lag (ms), positive when traces_b lags traces_a
+
+    peak : ndarray
+        Normalized (Pearson) correlation at the lag
+    """
+    a = np.moveaxis(np.asarray(traces_a, dtype=float), axis, -1)
+    b = np.moveaxis(np.asarray(traces_b, dtype=float), axis, -1)
+    n = a.shape[-1]
+    a = a - a.mean(axis=-1, keepdims=True)
+    b = b - b.mean(axis=-1, keepdims=True)
+    # Zero padding to at least 2n - 1 samples, so the correlation isn't circular
+    n_fft = next_fast_len(2 * n - 1)
+    xcorr = np.fft.irfft(np.conj(np.fft.rfft(a, n_fft)) * np.fft.rfft(b, n_fft), n_fft)
+    max_shift = n - 1 if max_lag is None else min(int(max_lag / 1000 * fps), n - 1)
+    # Lags -max_shift .. max_shift, in order
+    xcorr = np.concatenate((xcorr[..., n_fft - max_shift:], xcorr[..., :max_shift + 1]), axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        xcorr /= np.sqrt((a ** 2).sum(axis=-1) * (b ** 2).sum(axis=-1))[..., None]
+
+    idx = np.argmax(np.where(np.isnan(xcorr), -np.inf, xcorr), axis=-1)
+    idx_inner = np.clip(idx, 1, xcorr.shape[-1] - 2)[..., None]
+    before, peak, after = (np.take_along_axis(xcorr, idx_inner + step, axis=-1)[..., 0] for step in (-1, 0, 1))
+    curvature = before - 2 * peak + after
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(curvature < 0, 0.5 * (before - after) / curvature, 0)
+    offset = np.where(idx == idx_inner[..., 0], np.clip(offset, -0.5, 0.5), 0)
+    peak = np.take_along_axis(xcorr, idx[..., None], axis=-1)[..., 0]
+    return (idx - max_shift + offset) / fps * 1000, peak
+
+
+def _lag_block(blocks, fps, max_lag=None, freq=None, order=5, drift=True):
+    # Lags of one pair of (n_frames, rows, W) blocks, the Vm block inverted
+    block_vm, block_ca = (activation.condition(block, fps, freq=freq, order=order, drift=drift)
+                          for block in blocks)
+    return xcorr_lag(-block_vm, block_ca, fps, max_lag=max_lag, axis=0)
+
+
+def lag_map(stack_vm, stack_ca, fps, start=0, end=None, max_lag=None, bin_size=None, freq=None, order=5,
+            drift=True, min_correlation=0.5, n_rows=64, processes=None):
+    """
+    Per-pixel cross-correlation lag of Ca behind Vm over a whole recording.
+
+    Parameters
+    ----------
+    stack_vm, stack_ca : TiffStack or ndarray
+        (n_frames, H, W) voltage and calcium recordings of the same field of view
+
+    fps : float
+        Frame rate (frames per second)
+
+    start, end : float, optional
+        Window (s) from the first frame.
+        Defaults to the whole recording.
+
+    max_lag : float, optional
+        Largest lag (ms) searched in each direction, e.g. half the PCL so that
+        the neighboring beats don't match.
+        Defaults to every lag.
+
+    bin_size, freq, order, drift : optional
+        See activation.activation_map()
+
+    min_correlation : float, optional
+        Pixels whose peak correlation is below this are set to NaN (background).
+        Defaults to 0.5.
+
+    n_rows, processes : optional
+        Blocks of rows processed at a time and worker processes, see activation.activation_map()
+
+    Returns
+    -------
+    lags : ndarray
+        (H, W) lag (ms), positive when Ca follows Vm
+
+    Notes
+    -----
+    The lag aligns whole transients, so it also reflects their different shapes
+    (e.g. the slower Ca rise and decay) and is usually a few ms longer than the
+    upstroke latency of latency_map().
+    """
+    idx_start = int(round(start * fps))
+    idx_end = None if end is None else int(round(end * fps))
+    pairs = zip(*(activation.row_blocks(stack, idx_start, idx_end, bin_size=bin_size, n_rows=n_rows)
+                  for stack in (stack_vm, stack_ca)))
+    process = functools.partial(_lag_block, fps=fps, max_lag=max_lag, freq=freq, order=order, drift=drift)
+    results = activation.map_blocks(process, pairs, processes=processes)
+    lags = np.concatenate([result[0] for result in results])
+    peaks = np.concatenate([result[1] for result in results])
+    lags[~(peaks >= min_correlation)] = np.nan
+    return lags
@@ -0,0 +1,257 @@
+"""
+Action potential and calcium transient duration (APD / CaD) maps.
+
+Every pixel's beat is measured at once with array operations over the
+frames of a beat window:
+    activation : maximum upstroke slope (max dF/dt), see activation.upstroke_times()
+    peak : maximum of the signal after activation
+    recovery : first time after the peak that the signal falls below
+    (100 - level) % of its amplitude above the baseline, linearly interpolated between frames
+    duration : recovery - activation, e.g. APD80 for level 80
+
+Pixels are kept in the quality mask when their amplitude is above a fraction
+of the largest amplitude, the signal recovers to every level within the
+window, and (optionally) the durations are within limits, e.g. the 100 - 300 ms
+range of the JoVE figure.
+
+Usage
+-----
+from AnalysisTools import durations, stacks
+stack = stacks.open_stack('data/20190322-pigb/01-350_Vm_0001.tif')
+maps = durations.duration_maps(stack, fps=500, start=0.73, end=1.1, invert=True, bin_size=15, freq=50)
+apd80 = maps.level(80)          # (H, W) ms, NaN outside the quality mask
+"""
+
+import functools
+from collections import namedtuple
+import numpy as np
+from AnalysisTools import activation
+
+LEVELS = (30, 50, 80, 90)
+
+
+class DurationMaps(namedtuple('DurationMaps', ['levels', 'durations', 'activation', 'amplitude', 'mask'])):
+    """
+    Duration maps of one beat at several levels of recovery.
+
+    Attributes
+    ----------
+    levels : tuple
+        Recovery levels (%), e.g. (30, 50, 80, 90)
+
+    durations : ndarray
+        (n_levels, H, W) durations (ms), NaN outside the mask
+
+    activation : ndarray
+        (H, W) activation times (ms) from the start of the window
+
+    amplitude : ndarray
+        (H, W) signal amplitude (peak - baseline)
+
+    mask : ndarray
+        (H, W) quality mask, True where every duration is valid
+    """
+    __slots__ = ()
+
+    def level(self, level):
+        """(H, W) duration map (ms) at one level, e.g. level(80) for APD80."""
+        if level not in self.levels:
+            raise ValueError('Level {} was not computed, levels are {}'.format(level, self.levels))
+        return self.durations[self.levels.index(level)]
+
+
+def recovery_times(signal, fps, levels=LEVELS, idx_peak=None):
+    """
+    Times that each pixel's signal recovers to levels of its amplitude.
+
+    Parameters
+    ----------
+    signal : array-like
+        (n_frames, ...) beat window along the first axis, rising at activation
+
+    fps : float
+        Frame rate (frames per second)
+
+    levels : tuple, optional
+        Recovery levels (%): level 80 is the time the signal falls to 20% of
+        its amplitude above the baseline.
+        Defaults to (30, 50, 80, 90).
+
+    idx_peak : ndarray, optional
+        Frame of each pixel's peak.
+        Defaults to the maximum of each pixel.
+
+    Returns
+    -------
+    times : ndarray
+        (n_levels, ...) recovery times (ms) from the first frame, NaN if the
+        signal doesn't recover to a level within the window
+
+    amplitude : ndarray
+        Peak - baseline, the baseline being the minimum before the peak
+    """
+    signal = np.asarray(signal, dtype=float)
+    frames = np.arange(len(signal)).reshape((-1,) + (1,) * (signal.ndim - 1))
+    if idx_peak is None:
+        idx_peak = np.argmax(signal, axis=0)
+    peak = np.take_along_axis(signal, idx_peak[None], axis=0)[0]
+    baseline = np.where(frames <= idx_peak, signal, np.inf).min(axis=0)
+    amplitude = peak - baseline
+
+    fractions = 1 - np.asarray(levels, dtype=float) / 100
+    thresholds = baseline + fractions.reshape((-1,) + (1,) * peak.ndim) * amplitude
+    # First frame after the peak below each threshold: (n_levels, n_frames, ...) at once
+    below = (signal[None] < thresholds[:, None]) & (frames > idx_peak)[None]
+    found = below.any(axis=1)
+    idx = np.argmax(below, axis=1)
+    idx_before = np.maximum(idx - 1, 0)
+    value = np.take_along_axis(signal[None], idx[:, None], axis=1)[:, 0]
+    value_before = np.take_along_axis(signal[None], idx_before[:, None], axis=1)[:, 0]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = (value_before - thresholds) / (value_before - value)
+    times = (idx_before + np.clip(fraction, 0, 1)) / fps * 1000
+    times[~found] = np.nan
+    return times, amplitude
+
+
+def beat_durations(signal, fps, levels=LEVELS):
+    """
+    Activation time, durations and amplitude of one beat of every pixel or trace.
+
+    Parameters
+    ----------
+    signal : array-like
+        (n_frames, ...) beat window along the first axis, rising at activation,
+        e.g. a block of frames or beats.segment() windows moved to the first axis
+
+    fps : float
+        Frame rate (frames per second)
+
+    levels : tuple, optional
+        Recovery levels (%).
+        Defaults to (30, 50, 80, 90).
+
+    Returns
+    -------
+    durations : ndarray
+        (n_levels, ...) recovery - activation times (ms), NaN if not recovered
+
+    times_act : ndarray
+        Activation times (ms) from the first frame
+
+    amplitude : ndarray
+        Peak - baseline
+    """
+    signal = np.asarray(signal, dtype=float)
+    times_act = activation.upstroke_times(signal, fps)
+    # The peak is the maximum after the upstroke
+    frames = np.arange(len(signal)).reshape((-1,) + (1,) * (signal.ndim - 1))
+    idx_act = np.floor(times_act / 1000 * fps).astype(int)
+    idx_peak = np.argmax(np.where(frames >= idx_act, signal, -np.inf), axis=0)
+    times_rec, amplitude = recovery_times(signal, fps, levels=levels, idx_peak=idx_peak)
+    return times_rec - times_act, times_act, amplitude
+
+
+def _process_block(block, fps, levels=LEVELS, invert=False, freq=None, order=5, drift=False):
+    # Activation times, durations and amplitude of one (n_frames, rows, W) block
+    block = activation.condition(block, fps, freq=freq, order=order, drift=drift)
+    if invert:
+        block = -block
+    return beat_durations(block, fps, levels=levels)
+
+
+def duration_maps(stack, fps, start=0, end=None, levels=LEVELS, invert=False, bin_size=None, freq=None,
+                  order=5, drift=False, threshold=0.1, limits=None, n_rows=64, processes=None):
+    """
+    Duration maps of a beat window of a frame stack.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) recording, e.g. from stacks.open_stack()
+
+    fps : float
+        Frame rate (frames per second)
+
+    start, end : float, optional
+        Beat window (s) from the first frame, from before the upstroke to after recovery.
+        Defaults to the whole recording.
+
+    levels : tuple, optional
+        Recovery levels (%).
+        Defaults to (30, 50, 80, 90).
+
+    invert : bool, optional
+        If True, the signal falls at activation (voltage dyes, e.g. RH237).
+        Defaults to False (e.g. Rhod-2).
+
+    bin_size, freq, order : optional
+        Spatial box blur width (px), low-pass cutoff (Hz) and order, see activation.activation_map()
+
+    drift : bool, optional
+        If True, remove a linear drift of each pixel over the window.
+        Defaults to False, since a fit over a single beat also tilts its plateau.
+
+    threshold : float, optional
+        Pixels whose amplitude is below this fraction of the largest amplitude are masked.
+        Defaults to 0.1.
+
+    limits : tuple, optional
+        (min, max) durations (ms) of every level, outside which a pixel is masked.
+        Defaults to no limits.
+
+    n_rows : int, optional
+        Number of rows of pixels processed at a time.
+        Defaults to 64.
+
+    processes : int, optional
+        Number of worker processes for the blocks of rows.
+        Defaults to processing in this process.
+
+    Returns
+    -------
+    maps : DurationMaps
+    """
+    levels = tuple(levels)
+    idx_start = int(round(start * fps))
+    idx_end = None if end is None else int(round(end * fps))
+    process = functools.partial(_process_block, fps=fps, levels=levels, invert=invert, freq=freq,
+                                order=order, drift=drift)
+    results = activation.map_blocks(process, activation.row_blocks(stack, idx_start, idx_end,
+                                                                   bin_size=bin_size, n_rows=n_rows),
+                                    processes=processes)
+    durations = np.concatenate([result[0] for result in results], axis=1)
+    times_act = np.concatenate([result[1] for result in results])
+    amplitude = np.concatenate([result[2] for result in results])
+
+    mask = (amplitude >= threshold * amplitude.max()) & np.all(np.isfinite(durations), axis=0)
+    if limits is not None:
+        mask &= np.all((durations >= limits[0]) & (durations <= limits[1]), axis=0)
+    durations[:, ~mask] = np.nan
+    return DurationMaps(levels, durations, times_act, amplitude, mask)
+
+
+def within(dur_map, duration_min=None, duration_max=None):
+    """
+    Copy of a duration map with values outside [duration_min, duration_max] (ms) set to NaN.
+
+    Parameters
+    ----------
+    dur_map : array-like
+        Duration map, e.g. loaded with mapstore.load()
+
+    duration_min, duration_max : float, optional
+        Limits of the valid durations.
+        Defaults to no limit.
+
+    Returns
+    -------
+    dur_map : ndarray
+    """
+    dur_map = np.array(dur_map, dtype=float)
+    with np.errstate(invalid='ignore'):
+        if duration_min is not None:
+            dur_map[dur_map < duration_min] = np.nan
+        if duration_max is not None:
+            dur_map[dur_map > duration_max] = np.nan
+    return dur_map
@@ -0,0 +1,256 @@
+"""
+Reader for emka iox / ecgAuto text exports.
+
+Two export layouts are supported, and the header length of each file is
+detected instead of hand-tuned skip counts:
+
+    ecgAuto "to text file" exports (e.g. ECG/data/20190517-pigA_NSR1.txt),
+    with sample frequencies, a column and a units row, a zone-start block and
+    an "end of complete data" footer.
+
+    iox exports (e.g. Electrophysiology/data/20180619-rata-T011840.txt),
+    with a Site-time (hh:mm:ss.fff) first column, converted to seconds.
+
+Parsed recordings are cached next to the source in .emka_cache/, as a
+(n_columns, n_samples) .npy that is memory-mapped on later reads and a .json
+with the header fields. A cache entry is used only while the source file has
+the same path, modification time and size.
+
+Usage
+-----
+from AnalysisTools import emka
+ecg = emka.read('data/20190517-pigA_NSR1.txt')
+ecg.sample_freqs['ECG']                 # 5000.0
+times, volts = ecg.channels['time ms'], ecg.channels['ECG']
+ecg.stack('time ms', 'ECG')             # like np.genfromtxt(..., usecols=(0, 1))
+"""
+
+import os
+import re
+import json
+from collections import namedtuple, OrderedDict
+import numpy as np
+
+# Bytes of text parsed per np.fromstring call
+CHUNK_SIZE = 2 ** 20
+# Folder, next to each source file, holding parsed recordings
+CACHE_DIR = '.emka_cache'
+CACHE_VERSION = 1
+
+_DATA_FIELD = re.compile(r'^-?(\d+:\d+:)?\d+(\.\d*)?([eE][-+]?\d+)?$')
+_TIME_OF_DAY = re.compile(r'^\d+:\d+:\d')
+
+
+class Recording(namedtuple('Recording', ['path', 'metadata', 'sample_freqs', 'units', 'channels'])):
+    """
+    A parsed emka export.
+
+    Attributes
+    ----------
+    path : str
+        Source file
+
+    metadata : OrderedDict
+        Header "key : value" fields, e.g. 'data file', 'print sample freq (Hz)'
+
+    sample_freqs : OrderedDict
+        Original sample frequency (Hz) of each recorded channel, e.g. {'ECG': 5000.0, ...}
+
+    units : OrderedDict
+        Units of each column, e.g. {'time ms': '', 'ECG': 'V'}
+
+    channels : OrderedDict
+        One float64 array per column, in file order. Unnamed columns are called
+        'column <i>' (0-based). A Site-time column is converted to seconds.
+        Read-only memory-mapped views when loaded from the cache.
+    """
+    __slots__ = ()
+
+    @property
+    def columns(self):
+        return tuple(self.channels)
+
+    def stack(self, *names):
+        """Return the named columns as one (n_samples, n_columns) array."""
+        return np.column_stack([self.channels[name] for name in names])
+
+
+def _is_data_line(line):
+    fields = line.split()
+    return bool(fields) and all(_DATA_FIELD.match(field) for field in fields)
+
+
+def _parse_header(lines):
+    metadata, sample_freqs = OrderedDict(), OrderedDict()
+    names_lines = []
+    in_freqs = False
+    for line in lines:
+        fields = [field.strip() for field in line.split('\t')]
+        stripped = line.strip()
+        # Skip blanks and the ____ / .... separator rows
+        if not stripped.strip('\t_. '):
+            in_freqs = False
+            continue
+        if in_freqs and line.startswith('\t') and _DATA_FIELD.match(fields[-1] or fields[-2]):
+            # Indented "<channel> <freq>" rows after "original sample freq (Hz) :"
+            values = [field for field in fields if field]
+            sample_freqs[values[0]] = float(values[-1])
+            continue
+        in_freqs = False
+        if any(field.endswith(' :') for field in fields):
+            # One or more "key :<tab>value" pairs, e.g. the zone-start row
+            key = None
+            for field in fields:
+                if field.endswith(' :'):
+                    key = field[:-2].strip()
+                    metadata[key] = ''
+                elif key and field:
+                    metadata[key] = ' '.join((metadata[key] + ' ' + field).split())
+            in_freqs = key == 'original sample freq (Hz)'
+            continue
+        names_lines.append(fields)
+    # The column names and units are the last two rows that aren't key : value fields
+    if len(names_lines) < 2:
+        raise ValueError('No column names and units found in the header')
+    return metadata, sample_freqs, names_lines[-2], names_lines[-1]
+
+
+def _parse_body(text, n_fields, time_of_day):
+    # Parse whitespace separated numbers in chunks that end on a line break
+    if time_of_day:
+        # hh:mm:ss.fff becomes three numeric fields
+        text = text.replace(':', '\t')
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = text.rfind('\n', start, start + CHUNK_SIZE) + 1 or len(text)
+        chunks.append(np.fromstring(text[start:end], sep=' '))
+        start = end
+    values = np.concatenate(chunks) if chunks else np.empty(0)
+    if values.size % n_fields:
+        raise ValueError('Data rows do not all have {} values'.format(n_fields))
+    values = values.reshape(-1, n_fields)
+    if time_of_day:
+        seconds = values[:, 0] * 3600 + values[:, 1] * 60 + values[:, 2]
+        values = np.column_stack((seconds, values[:, 3:]))
+    return values
+
+
+def _cache_paths(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    base = os.path.join(folder, CACHE_DIR, name)
+    return base + '.npy', base + '.json'
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'version': CACHE_VERSION}
+
+
+def _read_cache(path):
+    file_npy, file_json = _cache_paths(path)
+    try:
+        with open(file_json, 'r') as file:
+            header = json.load(file, object_pairs_hook=OrderedDict)
+        if header['source'] != _source_stamp(path):
+            return None
+        values = np.load(file_npy, mmap_mode='r')
+    except (OSError, ValueError, KeyError):
+        return None
+    channels = OrderedDict(zip(header['units'], values))
+    return Recording(path, header['metadata'], header['sample_freqs'], header['units'], channels)
+
+
+def _write_cache(recording):
+    file_npy, file_json = _cache_paths(recording.path)
+    header = OrderedDict([('source', _source_stamp(recording.path)),
+                          ('metadata', recording.metadata),
+                          ('sample_freqs', recording.sample_freqs),
+                          ('units', recording.units)])
+    # Write to temporary files first so a concurrent reader never maps a partial entry,
+    # the .json is replaced last since it marks the entry as valid
+    suffix = '.{}.tmp'.format(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(file_npy), exist_ok=True)
+        with open(file_npy + suffix, 'wb') as file:
+            np.save(file, np.vstack(list(recording.channels.values())))
+        with open(file_json + suffix, 'w') as file:
+            json.dump(header, file, indent=1)
+        os.replace(file_npy + suffix, file_npy)
+        os.replace(file_json + suffix, file_json)
+    except OSError:
+        # e.g. a read-only data folder, the recording is still returned
+        for file_tmp in (file_npy + suffix, file_json + suffix):
+            if os.path.exists(file_tmp):
+                os.remove(file_tmp)
+
+
+def read(path, cache=True):
+    """
+    Read an emka iox or ecgAuto text export.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .txt export
+
+    cache : bool, optional
+        If True, load the recording from the binary cache when it matches the
+        source, otherwise parse the text and update the cache.
+        Defaults to True.
+
+    Returns
+    -------
+    recording : Recording
+    """
+    if cache:
+        recording = _read_cache(path)
+        if recording is not None:
+            return recording
+    recording = parse(path)
+    if cache:
+        _write_cache(recording)
+    return recording
+
+
+def parse(path):
+    """
+    Parse an emka iox or ecgAuto text export, without the cache.
+
+    Parameters
+    ----------
+    path : str
+        Path of the .txt export
+
+    Returns
+    -------
+    recording : Recording
+    """
+    with open(path, 'r', encoding='latin-1') as file:
+        text = file.read()
+    lines = text.splitlines(keepends=True)
+
+    # Data starts at the first row that is only numbers, and ends before the footer
+    idx_start = next((idx for idx, line in enumerate(lines) if _is_data_line(line)), None)
+    if idx_start is None:
+        raise ValueError('No data found in {}'.format(path))
+    idx_end = len(lines)
+    while not _is_data_line(lines[idx_end - 1]):
+        idx_end -= 1
+
+    metadata, sample_freqs, names, units = _parse_header(lines[:idx_start])
+    first_row = lines[idx_start].split()
+    time_of_day = bool(_TIME_OF_DAY.match(first_row[0]))
+    n_fields = len(first_row) + (2 if time_of_day else 0)
+    body = ''.join(lines[idx_start:idx_end])
+    values = _parse_body(body, n_fields, time_of_day)
+
+    channels, channel_units = OrderedDict(), OrderedDict()
+    for idx in range(values.shape[1]):
+        name = names[idx] if idx < len(names) and names[idx] else 'column {}'.format(idx)
+        channels[name] = values[:, idx]
+        channel_units[name] = units[idx] if idx < len(units) else ''
+        if time_of_day and idx == 0:
+            channel_units[name] = 's'
+    return Recording(path, metadata, sample_freqs, channel_units, channels)
@@ -0,0 +1,111 @@
+"""
+Butterworth filters designed once and applied to whole stacks of traces.
+
+Filters are designed in second-order sections (SOS) form, which stays
+numerically stable for high orders and low cutoffs, and are cached per
+(order, cutoff, fps) so repeated calls never redesign them.
+"""
+
+import functools
+import scipy.signal as sig
+
+
+@functools.lru_cache(maxsize=None)
+def design(order, freq, fps, btype='lowpass'):
+    """
+    Design a Butterworth filter in second-order sections form.
+
+    Parameters
+    ----------
+    order : int
+        Filter order
+
+    freq : float or tuple
+        Cutoff frequency (Hz), or (low, high) for a bandpass filter
+
+    fps : float
+        Sample rate (frames per second)
+
+    btype : str, optional
+        'lowpass', 'highpass' or 'bandpass'.
+        Defaults to 'lowpass'.
+
+    Returns
+    -------
+    sos : ndarray
+        (n_sections, 6) array, shared between callers so it must not be modified
+    """
+    nyquist = fps / 2
+    if isinstance(freq, tuple):
+        wn = tuple(f / nyquist for f in freq)
+    else:
+        wn = freq / nyquist
+    return sig.butter(order, wn, btype=btype, output='sos')
+
+
+class Butterworth:
+    """
+    Zero-phase Butterworth filter for stacks of traces.
+
+    Parameters
+    ----------
+    fps : float
+        Sample rate (frames per second)
+
+    freq : float or tuple, optional
+        Cutoff frequency (Hz), or (low, high) for a bandpass filter.
+        Defaults to 75.
+
+    order : int, optional
+        Filter order.
+        Defaults to 5.
+
+    btype : str, optional
+        'lowpass', 'highpass' or 'bandpass'.
+        Defaults to 'lowpass'.
+
+    Examples
+    --------
+    filter_lp = Butterworth(fps=408)
+    traces_filtered = filter_lp(traces)     # (n_traces, n_samples)
+    stack_filtered = filter_lp(stack, axis=0)   # (n_frames, H, W)
+    """
+
+    def __init__(self, fps, freq=75, order=5, btype='lowpass'):
+        self.fps, self.freq, self.order, self.btype = fps, freq, order, btype
+        self.sos = design(order, freq, fps, btype)
+
+    def __repr__(self):
+        return 'Butterworth(fps={}, freq={}, order={}, btype={!r})'.format(
+            self.fps, self.freq, self.order, self.btype)
+
+    def __call__(self, traces, axis=-1):
+        """
+        Filter forwards and backwards along an axis, every trace in one pass.
+
+        Parameters
+        ----------
+        traces : array-like
+            One trace, an (n_traces, n_samples) batch or a frame stack
+
+        axis : int, optional
+            Time axis.
+            Defaults to the last axis.
+
+        Returns
+        -------
+        filtered : ndarray
+        """
+        return sig.sosfiltfilt(self.sos, traces, axis=axis)
+
+
+@functools.lru_cache(maxsize=None)
+def lowpass(fps, freq=75, order=5):
+    """Return a cached low-pass Butterworth filter, see Butterworth."""
+    return Butterworth(fps, freq=freq, order=order)
+
+
+@functools.lru_cache(maxsize=None)
+def bandpass(fps, freq=(1, 20), order=3):
+    """Return a cached band-pass Butterworth filter, see Butterworth."""
+    return Butterworth(fps, freq=tuple(freq), order=order, btype='bandpass')
@@ -0,0 +1,215 @@
+"""
+Binary store for activation and duration maps exported as CSV.
+
+ActMap-*.csv and APDMaps/APD-*.csv files are converted once, on their first
+load, into .map_cache/ next to the source:
+
+    <name>.npy          float32 values, NaN where there is no tissue, memory-mapped on load
+    <name>.mask.npy     tissue mask, packed 8 pixels per byte
+    <name>.json         source path, modification time and size, shape and value range
+
+Maps stay stored as exported. Orientation transforms (np.rot90, np.fliplr)
+are kept as metadata of the loaded map and applied as views, so no
+reoriented copy is ever made.
+
+Usage
+-----
+from AnalysisTools import mapstore
+act_map = mapstore.load('data/ActMap-20180619-rata-33.csv', rot90=1, fliplr=True)
+# same values as np.fliplr(np.rot90(np.loadtxt(..., delimiter=','))), as float32
+study = mapstore.load_study('data/20190717-rata')     # {relative path: map}
+"""
+
+import os
+import glob
+import json
+from collections import namedtuple, OrderedDict
+import numpy as np
+
+# Folder, next to each source file, holding converted maps
+CACHE_DIR = '.map_cache'
+CACHE_VERSION = 1
+
+
+class StoredMap(namedtuple('StoredMap', ['path', 'values', 'mask_bits', 'rot90', 'fliplr'])):
+    """
+    A map as stored, with its orientation as metadata.
+
+    Attributes
+    ----------
+    path : str
+        Source CSV file
+
+    values : ndarray
+        float32 (H, W) map as exported, read-only (memory-mapped when loaded from the store)
+
+    mask_bits : ndarray
+        Tissue mask packed with np.packbits, see mask
+
+    rot90 : int
+        Number of counter-clockwise 90 degree rotations, as in np.rot90(values, k=rot90)
+
+    fliplr : bool
+        If True, flip left to right after rotating, as in np.fliplr()
+    """
+    __slots__ = ()
+
+    def _orient(self, data):
+        data = np.rot90(data, k=self.rot90)
+        return np.fliplr(data) if self.fliplr else data
+
+    @property
+    def data(self):
+        """Oriented view of the values."""
+        return self._orient(self.values)
+
+    @property
+    def mask(self):
+        """Oriented tissue mask (True where the map has a value)."""
+        size = self.values.size
+        return self._orient(np.unpackbits(self.mask_bits)[:size].astype(bool)
+                            .reshape(self.values.shape))
+
+    def orient(self, rot90=0, fliplr=False):
+        """Return the map with another rotation and flip applied after the current ones."""
+        if self.fliplr:
+            # A flip followed by k rotations is the same as -k rotations followed by a flip
+            rot90 = -rot90
+        return self._replace(rot90=(self.rot90 + rot90) % 4, fliplr=self.fliplr != bool(fliplr))
+
+
+def _cache_paths(path):
+    folder, name = os.path.split(os.path.abspath(path))
+    base = os.path.join(folder, CACHE_DIR, os.path.splitext(name)[0])
+    return base + '.npy', base + '.mask.npy', base + '.json'
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'path': os.path.abspath(path), 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+            'version': CACHE_VERSION}
+
+
+def _read_cache(path):
+    file_values, file_mask, file_json = _cache_paths(path)
+    try:
+        with open(file_json, 'r') as file:
+            header = json.load(file)
+        if header['source'] != _source_stamp(path):
+            return None
+        values = np.load(file_values, mmap_mode='r')
+        mask_bits = np.load(file_mask)
+    except (OSError, ValueError, KeyError):
+        return None
+    return values, mask_bits
+
+
+def _write_cache(path, values, mask_bits):
+    file_values, file_mask, file_json = _cache_paths(path)
+    valid = values[~np.isnan(values)]
+    header = OrderedDict([('source', _source_stamp(path)),
+                          ('shape', list(values.shape)),
+                          ('n_pixels', int(valid.size)),
+                          ('min', float(valid.min()) if valid.size else None),
+                          ('max', float(valid.max()) if valid.size else None)])
+    # Write to temporary files first so a concurrent reader never maps a partial entry,
+    # the .json is replaced last since it marks the entry as valid
+    suffix = '.{}.tmp'.format(os.getpid())
+    try:
+        os.makedirs(os.path.dirname(file_values), exist_ok=True)
+        for file_out, array in ((file_values, values), (file_mask, mask_bits)):
+            with open(file_out + suffix, 'wb') as file:
+                np.save(file, array)
+        with open(file_json + suffix, 'w') as file:
+            json.dump(header, file, indent=1)
+        for file_out in (file_values, file_mask, file_json):
+            os.replace(file_out + suffix, file_out)
+    except OSError:
+        # e.g. a read-only data folder, the map is still returned
+        for file_out in (file_values, file_mask, file_json):
+            if os.path.exists(file_out + suffix):
+                os.remove(file_out + suffix)
+
+
+def read(path, rot90=0, fliplr=False, cache=True):
+    """
+    Read a map CSV through the store.
+
+    Parameters
+    ----------
+    path : str
+        Path of the map CSV, e.g. an ActMap-*.csv or APD-*.csv
+
+    rot90 : int, optional
+        Number of counter-clockwise 90 degree rotations, as in np.rot90().
+        Defaults to 0.
+
+    fliplr : bool, optional
+        If True, flip left to right after rotating.
+        Defaults to False.
+
+    cache : bool, optional
+        If True, load the stored binary map when it matches the source,
+        otherwise parse the CSV and update the store.
+        Defaults to True.
+
+    Returns
+    -------
+    stored : StoredMap
+    """
+    stored = _read_cache(path) if cache else None
+    if stored is None:
+        values = np.loadtxt(path, delimiter=',', ndmin=2).astype(np.float32)
+        mask_bits = np.packbits(~np.isnan(values))
+        if cache:
+            _write_cache(path, values, mask_bits)
+        values.setflags(write=False)
+        stored = values, mask_bits
+    values, mask_bits = stored
+    return StoredMap(path, values, mask_bits, rot90 % 4, bool(fliplr))
+
+
+def load(path, rot90=0, fliplr=False, cache=True):
+    """
+    Load a map CSV through the store, see read().
+
+    Returns
+    -------
+    data : ndarray
+        Read-only float32 view of the oriented map, NaN where there is no tissue
+    """
+    return read(path, rot90=rot90, fliplr=fliplr, cache=cache).data
+
+
+def load_study(root, pattern='**/*.csv', prefixes=('ActMap-', 'APD-'), rot90=0, fliplr=False,
+               cache=True):
+    """
+    Load every map below a folder.
+
+    Parameters
+    ----------
+    root : str
+        Study folder, e.g. 'data/20190717-rata'
+
+    pattern : str, optional
+        Glob pattern of the files, relative to root.
+        Defaults to every CSV in every subfolder.
+
+    prefixes : tuple, optional
+        File name prefixes of the maps to load.
+        Defaults to activation and duration maps.
+
+    rot90, fliplr, cache : optional
+        See read()
+
+    Returns
+    -------
+    maps : OrderedDict
+        {path relative to root: oriented map}, sorted by path
+    """
+    paths = sorted(glob.glob(os.path.join(root, pattern), recursive=True))
+    maps = OrderedDict()
+    for path in paths:
+        if os.path.basename(path).startswith(tuple(prefixes)):
+            maps[os.path.relpath(path, root)] = load(path, rot90=rot90, fliplr=fliplr, cache=cache)
+    return maps
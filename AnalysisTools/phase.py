@@ -0,0 +1,285 @@
+"""
+Phase maps and phase singularities of fibrillation recordings.
+
+Every pixel's signal is band-pass filtered around the activation rates and
+turned into an instantaneous phase (-pi to pi) with the Hilbert transform.
+Stacks are processed in tiles of rows and, for long recordings, of frames:
+each chunk of frames is read with overlapping frames on both sides which are
+dropped after the transform, so the whole stack is never in memory and the
+chunk edges don't distort the phase.
+
+Phase singularities (rotor cores) are where the phase winds through 2 pi around
+a loop of pixels. The topological charge of every square loop of every frame
+is computed at once, from sliding sums of the wrapped phase differences
+along its edges; singularities are then linked into trajectories across frames.
+
+Usage
+-----
+from AnalysisTools import phase, stacks
+stack = stacks.open_stack('data/20190322-piga/19-VFIB_Vm_0001.tif')
+phases = phase.phase_stack(stack, fps=500, invert=True, bin_size=5, out='19-VFIB_Vm_phase.npy')
+points = phase.singularities(phases, size=3)
+tracks = phase.track(points, max_distance=5)
+"""
+
+import functools
+import numpy as np
+from numpy.lib import recfunctions
+from scipy import ndimage, signal as sps
+from AnalysisTools import activation, filters
+
+# Duration (s) of the chunks of frames of phase_stack()
+CHUNK_TIME = 4
+# Fields of the singularities table
+POINT_DTYPE = np.dtype([('frame', int), ('row', float), ('col', float), ('charge', int)])
+
+
+def wrap(angles):
+    """Wrap angles (radians) to -pi to pi."""
+    return (np.asarray(angles) + np.pi) % (2 * np.pi) - np.pi
+
+
+def _phase_block(block, fps, band=(1, 20), order=3, invert=False, trim=(0, None)):
+    # Hilbert phase of one (n_frames, rows, W) block, without its overlapping frames
+    block = np.asarray(block, dtype=float)
+    block = block - block.mean(axis=0)
+    if band:
+        block = filters.bandpass(fps, band, order)(block, axis=0)
+    if invert:
+        block = -block
+    return np.angle(sps.hilbert(block, axis=0))[trim[0]:trim[1]].astype(np.float32)
+
+
+def phase_stack(stack, fps, band=(1, 20), order=3, invert=False, bin_size=None, mask=None,
+                n_frames=None, overlap=None, n_rows=64, out=None, processes=None):
+    """
+    Hilbert phase of every pixel of a stack.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) recording, e.g. from stacks.open_stack()
+
+    fps : float
+        Frame rate (frames per second)
+
+    band : tuple, optional
+        (low, high) band-pass cutoffs (Hz), or None for no filter.
+        Defaults to (1, 20), around the activation rates of fibrillation.
+
+    order : int, optional
+        Band-pass filter order.
+        Defaults to 3.
+
+    invert : bool, optional
+        If True, invert the signal first (voltage dyes), so phase 0 is depolarized.
+        Defaults to False.
+
+    bin_size : int, optional
+        Width (px) of a uniform spatial filter applied to every frame first.
+        Defaults to no binning.
+
+    mask : ndarray, optional
+        (H, W) tissue mask, the phase is NaN outside it.
+        Defaults to every pixel.
+
+    n_frames : int, optional
+        Number of frames processed at a time, plus the overlap on each side.
+        Defaults to 4 s of frames.
+
+    overlap : int, optional
+        Number of extra frames read on each side of a chunk of frames.
+        Defaults to 2 periods of the lowest band frequency.
+
+    n_rows : int, optional
+        Number of rows of pixels processed at a time.
+        Defaults to 64.
+
+    out : ndarray or str, optional
+        Array to write the phase into, or the path of a .npy file to create and
+        write out-of-core.
+        Defaults to a new float32 array in memory.
+
+    processes : int, optional
+        Number of worker processes for the blocks of rows.
+        Defaults to processing in this process.
+
+    Returns
+    -------
+    phases : ndarray
+        (n_frames, H, W) float32 phase (radians), memory-mapped if out is a path
+    """
+    shape = tuple(stack.shape)
+    if out is None:
+        out = np.empty(shape, dtype=np.float32)
+    elif isinstance(out, str):
+        out = np.lib.format.open_memmap(out, mode='w+', dtype=np.float32, shape=shape)
+    elif out.shape != shape:
+        raise ValueError('out has shape {}, the stack has shape {}'.format(out.shape, shape))
+    if n_frames is None:
+        n_frames = int(CHUNK_TIME * fps)
+    if n_frames >= shape[0]:
+        n_frames, overlap = shape[0], 0
+    elif overlap is None:
+        overlap = int(2 * fps / band[0]) if band else n_frames // 2
+
+    for idx_start in range(0, shape[0], n_frames):
+        idx_stop = min(idx_start + n_frames, shape[0])
+        read_start, read_stop = max(idx_start - overlap, 0), min(idx_stop + overlap, shape[0])
+        trim = (idx_start - read_start, idx_stop - read_start)
+        blocks = activation.row_blocks(stack, read_start, read_stop, bin_size=bin_size, n_rows=n_rows)
+        process = functools.partial(_phase_block, fps=fps, band=band, order=order, invert=invert, trim=trim)
+        row_start = 0
+        for result in activation.imap_blocks(process, blocks, processes=processes):
+            out[idx_start:idx_stop, row_start:row_start + result.shape[1]] = result
+            row_start += result.shape[1]
+        if mask is not None:
+            out[idx_start:idx_stop, ~mask] = np.nan
+    if isinstance(out, np.memmap):
+        out.flush()
+    return out
+
+
+def _runs(diffs, size, axis):
+    # Sums of size consecutive values along an axis from cumulative sums; NaNs are
+    # summed as zeros and counted separately, so they don't spread along the axis
+    cum = np.cumsum(np.stack((np.nan_to_num(diffs), np.isnan(diffs))), axis=axis)
+    pad = [(0, 0)] * cum.ndim
+    pad[axis] = (1, 0)
+    cum = np.pad(cum, pad, mode='constant')
+    length = cum.shape[axis]
+    return np.take(cum, np.arange(size, length), axis=axis) - np.take(cum, np.arange(length - size), axis=axis)
+
+
+def charge(phases, size=1):
+    """
+    Topological charge of every size x size loop of pixels.
+
+    Parameters
+    ----------
+    phases : array-like
+        (..., H, W) phase (radians), one frame or a stack
+
+    size : int, optional
+        Loop side (px). Larger loops are less sensitive to noise but
+        can't tell apart singularities closer than the loop.
+        Defaults to 1 (2 x 2 pixels).
+
+    Returns
+    -------
+    charges : ndarray
+        (..., H - size, W - size) winding number of the loop whose top left corner is
+        each pixel: +1 if the phase increases clockwise as displayed (rows downwards),
+        -1 if counter-clockwise, 0 for none, NaN if the loop touches a NaN pixel
+    """
+    phases = np.asarray(phases, dtype=float)
+    dx = wrap(np.diff(phases, axis=-1))     # (..., H, W - 1), to the right
+    dy = wrap(np.diff(phases, axis=-2))     # (..., H - 1, W), downwards
+    # Sums of size consecutive differences along each edge, and the number of NaNs in them
+    run_x, nan_x = _runs(dx, size, -1)       # (..., H, W - size)
+    run_y, nan_y = _runs(dy, size, -2)       # (..., H - size, W)
+    # Around the loop, clockwise as displayed: top edge right, right edge down,
+    # bottom edge left, left edge up
+    top, bottom = run_x[..., :-size, :], run_x[..., size:, :]
+    left, right = run_y[..., :, :-size], run_y[..., :, size:]
+    winding = (top + right - bottom - left) / (2 * np.pi)
+    n_nan = nan_x[..., :-size, :] + nan_x[..., size:, :] + nan_y[..., :, :-size] + nan_y[..., :, size:]
+    winding[n_nan > 0] = np.nan
+    return np.round(winding)
+
+
+def singularities(phases, size=1, n_frames=100):
+    """
+    Phase singularities of every frame of a phase stack.
+
+    Parameters
+    ----------
+    phases : array-like
+        (n_frames, H, W) phase, e.g. from phase_stack() (may be memory-mapped)
+
+    size : int, optional
+        Loop side (px), see charge().
+        Defaults to 1.
+
+    n_frames : int, optional
+        Number of frames processed at a time.
+        Defaults to 100.
+
+    Returns
+    -------
+    points : ndarray
+        Structured array with fields frame, row, col (center, px) and charge (+1 / -1),
+        one entry per singularity; loops of the same sign touching each other in a
+        frame are merged into one at their center
+    """
+    structure = np.zeros((3, 3, 3), dtype=bool)
+    structure[1] = True     # Connected within frames only
+    points = []
+    for idx_start in range(0, len(phases), n_frames):
+        charges = charge(phases[idx_start:idx_start + n_frames], size=size)
+        for sign in (1, -1):
+            labels, n_labels = ndimage.label(charges == sign, structure=structure)
+            if not n_labels:
+                continue
+            centers = np.array(ndimage.center_of_mass(np.ones_like(labels), labels, range(1, n_labels + 1)))
+            found = np.empty(n_labels, dtype=POINT_DTYPE)
+            found['frame'] = np.round(centers[:, 0]).astype(int) + idx_start
+            found['row'], found['col'] = centers[:, 1] + size / 2, centers[:, 2] + size / 2
+            found['charge'] = sign
+            points.append(found)
+    points = np.concatenate(points) if points else np.empty(0, dtype=POINT_DTYPE)
+    return np.sort(points, order=['frame', 'row', 'col'])
+
+
+def track(points, max_distance=3, max_gap=1):
+    """
+    Link singularities of the same charge into trajectories across frames.
+
+    Parameters
+    ----------
+    points : ndarray
+        Singularities, from singularities()
+
+    max_distance : float, optional
+        Largest movement (px) of a singularity between frames.
+        Defaults to 3.
+
+    max_gap : int, optional
+        Number of frames a singularity may be missing from a trajectory.
+        Defaults to 1.
+
+    Returns
+    -------
+    tracks : ndarray
+        points with an extra 'track' field, the trajectory number of each singularity
+    """
+    ids = np.full(len(points), -1)
+    frames = points['frame']
+    bounds = np.searchsorted(frames, np.arange(frames.min(), frames.max() + 2)) if len(points) else []
+    last = np.empty(0, dtype=int)       # Index of the last point of each trajectory
+    for idx_start, idx_stop in zip(bounds[:-1], bounds[1:]):
+        current = np.arange(idx_start, idx_stop)
+        if not len(current):
+            continue
+        frame = frames[idx_start]
+        active = last[frames[last] >= frame - 1 - max_gap]
+        if len(active):
+            distance = np.hypot(points['row'][current, None] - points['row'][active],
+                                points['col'][current, None] - points['col'][active])
+            distance[points['charge'][current, None] != points['charge'][active]] = np.inf
+            # Greedy assignment, shortest moves first, skipping points already linked
+            linked_current = np.zeros(len(current), dtype=bool)
+            linked_active = np.zeros(len(active), dtype=bool)
+            for flat in np.argsort(distance, axis=None):
+                idx_current, idx_active = np.unravel_index(flat, distance.shape)
+                if distance[idx_current, idx_active] > max_distance:
+                    break
+                if linked_current[idx_current] or linked_active[idx_active]:
+                    continue
+                ids[current[idx_current]] = ids[active[idx_active]]
+                last[last == active[idx_active]] = current[idx_current]
+                linked_current[idx_current], linked_active[idx_active] = True, True
+        new = current[ids[current] == -1]
+        ids[new] = ids.max() + 1 + np.arange(len(new))
+        last = np.concatenate((last, new))
+    return recfunctions.append_fields(points, 'track', ids, usemask=False)
@@ -0,0 +1,318 @@
+"""
+Restitution curves: APD / CaD as a function of the diastolic interval (DI).
+
+Every curve of a batch (ROIs, pixels, recordings or animals) is fit at once, with
+curves stacked as (n_curves, n_points) arrays padded with NaN:
+    'linear' : APD = a + b * DI, closed-form least squares
+    'exponential' : APD = a - b * exp(-DI / tau), fit by variable projection: for a
+    fixed tau the model is linear in a and b, so a and b are solved in closed form
+    for a grid of taus for every curve at once, then tau is refined with
+    vectorized Levenberg-Marquardt steps
+
+The maximum slope (dAPD / dDI) is the slope at the shortest DI of each curve
+for the exponential model (b / tau * exp(-DI_min / tau)), or b for the linear model.
+Exponential fits whose tau ends at a bound of the grid are flagged at_bound and
+have no maximum slope: the data has no curvature the model can resolve, and a
+linear fit describes it as well.
+
+Usage
+-----
+from AnalysisTools import restitution
+di, apd = restitution.pairs(act_times, apd_beats)          # dynamic: (..., n_beats - 1)
+di = restitution.di_from_pcl(pcl, apd)                     # steady state, e.g. APD_binned2.csv
+fits = restitution.fit(di, apd, model='exponential')
+table = restitution.fit_table(beat_table, by=['group', 'animal'])
+restitution.max_slope_summary(table, by='group')
+"""
+
+from collections import namedtuple, OrderedDict
+import numpy as np
+import pandas as pd
+
+MODELS = ('exponential', 'linear')
+
+
+class Fit(namedtuple('Fit', ['model', 'params', 'sse', 'r2', 'max_slope', 'di_min', 'n_points', 'at_bound'])):
+    """
+    Restitution fits of a batch of curves.
+
+    Attributes
+    ----------
+    model : str
+        'exponential' or 'linear'
+
+    params : ndarray
+        (n_curves, 3) a, b, tau (tau is NaN for the linear model)
+
+    sse : ndarray
+        (n_curves,) sum of squared residuals (ms^2)
+
+    r2 : ndarray
+        (n_curves,) coefficient of determination
+
+    max_slope : ndarray
+        (n_curves,) largest dAPD / dDI within the fitted DIs, NaN for fits at_bound
+
+    di_min : ndarray
+        (n_curves,) shortest DI (ms) of each curve
+
+    n_points : ndarray
+        (n_curves,) number of valid points
+
+    at_bound : ndarray
+        (n_curves,) True where the exponential fit's tau ended at a bound of the
+        tau grid, i.e. the curve has no exponential restitution within the grid
+        (nearly linear or flat data); always False for the linear model
+    """
+    __slots__ = ()
+
+    def predict(self, di):
+        """APD (ms) of every curve at DIs, broadcast as (n_curves, n_di) or (n_curves, ...)."""
+        return predict(self.model, self.params, di)
+
+
+def predict(model, params, di):
+    """
+    APD (ms) of restitution models.
+
+    Parameters
+    ----------
+    model : str
+        'exponential' or 'linear'
+
+    params : array-like
+        (n_curves, 3) a, b, tau, see Fit
+
+    di : array-like
+        DIs (ms), one set for every curve or (n_curves, n_di)
+
+    Returns
+    -------
+    apd : ndarray
+        (n_curves, n_di)
+    """
+    params = np.atleast_2d(params)
+    a, b, tau = (params[:, idx, None] for idx in range(3))
+    di = np.atleast_1d(np.asarray(di, dtype=float))
+    if model == 'linear':
+        return a + b * di
+    return a - b * np.exp(-di / tau)
+
+
+def pairs(act_times, durations, axis=-1):
+    """
+    Dynamic restitution pairs of consecutive beats: DI of a beat and APD of the next.
+
+    Parameters
+    ----------
+    act_times : array-like
+        Activation times (ms) of the beats, beats along axis
+
+    durations : array-like
+        APD / CaD (ms) of the beats, same shape
+
+    axis : int, optional
+        Beat axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    di : ndarray
+        (..., n_beats - 1) next activation - (activation + duration) (ms)
+
+    apd : ndarray
+        (..., n_beats - 1) duration of the next beat (ms)
+    """
+    act_times = np.moveaxis(np.asarray(act_times, dtype=float), axis, -1)
+    durations = np.moveaxis(np.asarray(durations, dtype=float), axis, -1)
+    di = act_times[..., 1:] - act_times[..., :-1] - durations[..., :-1]
+    return di, durations[..., 1:]
+
+
+def di_from_pcl(pcl, durations):
+    """Steady-state DIs (ms) of paced recordings: PCL - APD, broadcast."""
+    return np.asarray(pcl, dtype=float) - np.asarray(durations, dtype=float)
+
+
+def _linear(x, y, valid):
+    # Closed-form least squares of y = a + b * x of every row, over valid points
+    n = valid.sum(axis=-1)
+    x, y = np.where(valid, x, 0), np.where(valid, y, 0)
+    sx, sy = x.sum(axis=-1), y.sum(axis=-1)
+    sxx, sxy = (x * x).sum(axis=-1), (x * y).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        b = (n * sxy - sx * sy) / (n * sxx - sx ** 2)
+        a = (sy - b * sx) / n
+    return a, b
+
+
+def _sse(params, di, apd, valid):
+    # Sum of squared residuals of exponential fits over valid points
+    a, b, tau = (params[:, idx, None] for idx in range(3))
+    with np.errstate(invalid='ignore', over='ignore'):
+        sse = np.where(valid, (apd - (a - b * np.exp(-di / tau))) ** 2, 0).sum(axis=-1)
+    return np.where(np.isnan(sse), np.inf, sse)
+
+
+def fit(di, apd, model='exponential', taus=None, n_iterations=10):
+    """
+    Fit restitution curves, every curve at once.
+
+    Parameters
+    ----------
+    di, apd : array-like
+        (n_curves, n_points) DIs and APDs (ms), NaN for missing points; 1-D for one curve
+
+    model : str, optional
+        'exponential' or 'linear'.
+        Defaults to 'exponential'.
+
+    taus : array-like, optional
+        Grid of time constants (ms) searched before refining.
+        Defaults to 60 values log-spaced from 5 to 2000 ms.
+
+    n_iterations : int, optional
+        Levenberg-Marquardt refinements of a, b and tau.
+        Defaults to 10.
+
+    Returns
+    -------
+    fits : Fit
+    """
+    if model not in MODELS:
+        raise ValueError('Unknown model {!r}, use one of {}'.format(model, MODELS))
+    di = np.atleast_2d(np.asarray(di, dtype=float))
+    apd = np.atleast_2d(np.asarray(apd, dtype=float))
+    di, apd = np.broadcast_arrays(di, apd)
+    valid = ~(np.isnan(di) | np.isnan(apd))
+    n_points = valid.sum(axis=-1)
+    with np.errstate(invalid='ignore'):
+        di_min = np.nanmin(np.where(valid, di, np.nan), axis=-1) if di.size else np.empty(0)
+
+    if model == 'linear':
+        a, b = _linear(di, apd, valid)
+        tau = np.full_like(a, np.nan)
+        max_slope = b
+        at_bound = np.zeros(len(a), dtype=bool)
+    else:
+        if taus is None:
+            taus = np.logspace(np.log10(5), np.log10(2000), 60)
+        taus = np.asarray(taus, dtype=float)
+        # Closed-form a, b for every (curve, tau): (n_curves, n_taus)
+        basis = -np.exp(-di[:, None, :] / taus[None, :, None])
+        a_grid, b_grid = _linear(basis, apd[:, None, :], valid[:, None, :])
+        residuals = np.where(valid[:, None, :], apd[:, None, :] - a_grid[..., None] - b_grid[..., None] * basis, 0)
+        idx = np.nanargmin(np.where(np.isnan(a_grid), np.inf, (residuals ** 2).sum(axis=-1)), axis=1)
+        tau = taus[idx]
+        a, b = a_grid[np.arange(len(tau)), idx], b_grid[np.arange(len(tau)), idx]
+        # Levenberg-Marquardt on (a, b, tau) of every curve at once, as batched 3 x 3 systems;
+        # each curve's step is only taken if it lowers that curve's SSE
+        params = np.stack((a, b, tau), axis=-1)
+        sse = _sse(params, di, apd, valid)
+        damping = np.full(len(params), 1e-3)
+        for _ in range(n_iterations):
+            a, b, tau = params.T
+            decay = np.exp(-di / tau[:, None])
+            residual = np.where(valid, apd - (a[:, None] - b[:, None] * decay), 0)
+            jacobian = np.stack((np.ones_like(di), -decay, -b[:, None] * decay * di / tau[:, None] ** 2), axis=-1)
+            jacobian = np.where(valid[..., None], jacobian, 0)
+            normal = np.einsum('cpi,cpj->cij', jacobian, jacobian)
+            normal += damping[:, None, None] * normal * np.eye(3)
+            gradient = np.einsum('cpi,cp->ci', jacobian, residual)
+            solvable = np.isfinite(normal).all(axis=(1, 2)) & (np.abs(np.linalg.det(normal)) > 1e-12)
+            step = np.zeros_like(gradient)
+            if solvable.any():
+                step[solvable] = np.linalg.solve(normal[solvable], gradient[solvable][..., None])[..., 0]
+            trial = params + step
+            trial[:, 2] = np.clip(trial[:, 2], taus.min(), taus.max())
+            sse_trial = _sse(trial, di, apd, valid)
+            better = sse_trial < sse
+            params[better], sse[better] = trial[better], sse_trial[better]
+            damping = np.where(better, damping / 10, damping * 10)
+        a, b, tau = params.T
+        # A tau pinned at the grid's ends is an artifact of the bound, not a fitted time constant
+        at_bound = np.isclose(tau, taus.min(), rtol=1e-6) | np.isclose(tau, taus.max(), rtol=1e-6)
+        max_slope = np.where(at_bound, np.nan, b / tau * np.exp(-di_min / tau))
+
+    params = np.stack((a, b, tau), axis=-1)
+    predicted = predict(model, params, di)
+    sse = np.where(valid, (apd - predicted) ** 2, 0).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(np.where(valid, apd, np.nan), axis=-1)
+        sst = np.where(valid, (apd - mean[:, None]) ** 2, 0).sum(axis=-1)
+        r2 = 1 - sse / sst
+    too_few = n_points < (2 if model == 'linear' else 3)
+    params[too_few], sse[too_few], r2[too_few], max_slope[too_few] = np.nan, np.nan, np.nan, np.nan
+    at_bound[too_few] = False
+    return Fit(model, params, sse, r2, max_slope, di_min, n_points, at_bound)
+
+
+def fit_table(table, by, di='di', apd='apd', model='exponential', **kwargs):
+    """
+    Fit one restitution curve per group of rows of a long table.
+
+    Parameters
+    ----------
+    table : pandas.DataFrame
+        One row per beat or per recording, with DI and APD columns
+
+    by : str or list of str
+        Columns defining a curve, e.g. ['group', 'animal'] or ['animal', 'roi']
+
+    di, apd : str, optional
+        Names of the DI and APD columns.
+        Defaults to 'di' and 'apd'.
+
+    model : str, optional
+        See fit()
+
+    **kwargs
+        Passed to fit()
+
+    Returns
+    -------
+    fits : pandas.DataFrame
+        One row per curve: the by columns, a, b, tau, sse, r2, max_slope, di_min, n_points, at_bound
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    groups = table.groupby(by, sort=True)
+    keys = list(groups.groups)
+    n_max = groups.size().max() if len(keys) else 0
+    # Pad every curve to the longest with NaN, then fit them all at once
+    di_padded, apd_padded = np.full((2, len(keys), n_max), np.nan)
+    for idx, (_, rows) in enumerate(groups):
+        di_padded[idx, :len(rows)] = rows[di].values
+        apd_padded[idx, :len(rows)] = rows[apd].values
+    fits = fit(di_padded, apd_padded, model=model, **kwargs)
+
+    columns = OrderedDict()
+    index = pd.MultiIndex.from_tuples([key if isinstance(key, tuple) else (key,) for key in keys], names=by)
+    for name in by:
+        columns[name] = index.get_level_values(name)
+    for idx, name in enumerate(('a', 'b', 'tau')):
+        columns[name] = fits.params[:, idx]
+    for name in ('sse', 'r2', 'max_slope', 'di_min', 'n_points', 'at_bound'):
+        columns[name] = getattr(fits, name)
+    return pd.DataFrame(columns)
+
+
+def max_slope_summary(fits, by='group'):
+    """
+    Mean, standard deviation and number of the maximum slopes of fit_table() curves,
+    leaving out fits at_bound (their max_slope is NaN).
+
+    Parameters
+    ----------
+    fits : pandas.DataFrame
+        From fit_table(), e.g. one curve per animal
+
+    by : str or list of str, optional
+        Columns to summarize over, e.g. 'group' for Ctrl vs MEHP.
+        Defaults to 'group'.
+
+    Returns
+    -------
+    summary : pandas.DataFrame
+        max_slope mean, std and count per group
+    """
+    return fits.groupby(by)['max_slope'].agg(['mean', 'std', 'count'])
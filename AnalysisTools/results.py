@@ -0,0 +1,354 @@
+"""
+Content-addressed cache of intermediate results (parsed and filtered traces,
+maps, curve fits), so re-running a figure script after a layout change
+skips the signal processing.
+
+An entry is keyed on the SHA-256 of:
+    the name of the function that produced it, and a version: by default the
+    source file defining the function, so editing it (or a helper in the same
+    module) invalidates earlier results
+    the contents of its input files (not their paths or modification times,
+    so copied or touched files still hit)
+    its other parameters, in a canonical form (arrays by their bytes, dicts sorted)
+
+Entries are files in .results_cache/ of the working directory:
+
+    <key>.npy           ndarray results, loaded into memory (or memory-mapped)
+    <key>.pkl           any other result, pickled (tuples, namedtuples, DataFrames)
+
+A hit refreshes the entry's modification time, which orders entries for
+least-recently-used eviction once the folder grows above a size cap.
+File hashes are remembered for this process by path, modification time
+and size, so an unchanged input is only read once.
+
+Usage
+-----
+from AnalysisTools import results
+cache = results.Cache(max_bytes=2 * 1024 ** 3)
+load_csv = cache.memoize(np.genfromtxt, inputs=['fname'])
+signals = load_csv('data/Signals-01-350.csv', delimiter=',', skip_header=1)
+
+key = cache.key('apd_maps', inputs=[path_stack], version=1, params={'fps': 500, 'levels': (30, 80)})
+maps = cache.get(key, results.MISSING)
+if maps is results.MISSING:
+    maps = cache.put(key, durations.duration_maps(stack, fps=500, levels=(30, 80)))
+"""
+
+import os
+import json
+import pickle
+import hashlib
+import inspect
+import functools
+import numpy as np
+
+# Folder, in the working directory, holding cached results
+CACHE_DIR = '.results_cache'
+CACHE_VERSION = 1
+# Size cap (bytes) of a cache folder
+MAX_BYTES = 2 * 1024 ** 3
+# Bytes read per update of a file hash
+BLOCK_SIZE = 2 ** 20
+
+_EXTENSIONS = ('.npy', '.pkl')
+# Default of get(), to tell a missing entry from a cached None
+MISSING = object()
+# {absolute path: (mtime_ns, size, sha256 hex digest)}
+_file_hashes = {}
+
+
+def file_hash(path):
+    """
+    SHA-256 hex digest of a file's contents, remembered while the file is unchanged.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file
+
+    Returns
+    -------
+    digest : str
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    known = _file_hashes.get(path)
+    if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+        return known[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(functools.partial(file.read, BLOCK_SIZE), b''):
+            digest.update(block)
+    _file_hashes[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def source_hash(function):
+    """
+    SHA-256 hex digest of the source file defining a function.
+
+    Falls back to the version of its package for functions without Python
+    source (e.g. ufuncs and other compiled functions).
+    """
+    while isinstance(function, functools.partial):
+        function = function.func
+    try:
+        return file_hash(inspect.getsourcefile(inspect.unwrap(function)))
+    except (OSError, TypeError):
+        package = (getattr(function, '__module__', None) or '').split('.')[0]
+        version = getattr(__import__(package), '__version__', None) if package else None
+        return '{}-{}'.format(package, version)
+
+
+def _canonical(value):
+    # JSON-serializable form of a parameter that is equal for equal values
+    if isinstance(value, np.ndarray):
+        data = np.ascontiguousarray(value)
+        return {'ndarray': [str(data.dtype), list(data.shape), hashlib.sha256(data.tobytes()).hexdigest()]}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        return {'dict': [[_canonical(key), _canonical(value[key])] for key in sorted(value, key=repr)]}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return {'set': sorted(repr(item) for item in value)}
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        # repr keeps every digit, and NaN / inf as strings
+        return {'float': repr(value)}
+    if callable(value):
+        return {'callable': '{}.{}'.format(getattr(value, '__module__', ''),
+                                           getattr(value, '__qualname__', repr(value)))}
+    return {'repr': repr(value)}
+
+
+class Cache(object):
+    """
+    Folder of cached results with a size cap and least-recently-used eviction.
+
+    Parameters
+    ----------
+    root : str, optional
+        Cache folder.
+        Defaults to .results_cache in the working directory.
+
+    max_bytes : int, optional
+        Size cap of the folder; the least recently used entries are removed
+        after a write that exceeds it.
+        Defaults to 2 GiB.
+
+    mmap : bool, optional
+        If True, ndarray results are memory-mapped read-only instead of loaded.
+        Defaults to False, since figure scripts often modify loaded arrays.
+
+    enabled : bool, optional
+        If False, nothing is read or written and every function is recomputed.
+        Defaults to True.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_BYTES, mmap=False, enabled=True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.mmap = mmap
+        self.enabled = enabled
+
+    def key(self, name, inputs=(), version=None, params=None):
+        """
+        Key of a result.
+
+        Parameters
+        ----------
+        name : str
+            Name of the computation, e.g. 'apd_maps' or a function's qualified name
+
+        inputs : str or list of str, optional
+            Input files, hashed by their contents
+
+        version : optional
+            Changed to invalidate earlier entries of name, e.g. after editing its code
+
+        params : dict, optional
+            Other parameters of the computation
+
+        Returns
+        -------
+        key : str
+            SHA-256 hex digest
+        """
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        description = {'cache_version': CACHE_VERSION, 'name': name, 'version': _canonical(version),
+                       'inputs': [file_hash(path) for path in inputs],
+                       'params': _canonical(params or {})}
+        text = json.dumps(description, sort_keys=True, separators=(',', ':'))
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def _path(self, key, extension):
+        return os.path.join(self.root, key + extension)
+
+    def get(self, key, default=None):
+        """
+        Cached result of a key, or default if there is none.
+
+        A hit marks the entry as the most recently used. Pass MISSING as default
+        to cache results that may be None.
+        """
+        if not self.enabled:
+            return default
+        for extension in _EXTENSIONS:
+            path = self._path(key, extension)
+            try:
+                if extension == '.npy':
+                    value = np.load(path, mmap_mode='r' if self.mmap else None)
+                else:
+                    with open(path, 'rb') as file:
+                        value = pickle.load(file)
+            except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+                continue
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return value
+        return default
+
+    def put(self, key, value):
+        """
+        Store the result of a key, then evict entries above the size cap.
+
+        Returns
+        -------
+        value
+            The result, unchanged
+        """
+        if not self.enabled:
+            return value
+        is_array = type(value) is np.ndarray and not value.dtype.hasobject
+        path = self._path(key, '.npy' if is_array else '.pkl')
+        # Write to a temporary file first so a concurrent reader never loads a partial entry
+        suffix = '.{}.tmp'.format(os.getpid())
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(path + suffix, 'wb') as file:
+                if is_array:
+                    np.save(file, value)
+                else:
+                    pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(path + suffix, path)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError):
+            # e.g. a read-only folder or an unpicklable result, the result is still returned
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+            return value
+        self.evict()
+        return value
+
+    def entries(self):
+        """List of (path, size, last use) of the entries, least recently used first."""
+        entries = []
+        try:
+            scanned = list(os.scandir(self.root))
+        except OSError:
+            return entries
+        for entry in scanned:
+            if entry.name.endswith(_EXTENSIONS):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((entry.path, stat.st_size, stat.st_mtime_ns))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def size(self):
+        """Total size (bytes) of the entries."""
+        return sum(entry[1] for entry in self.entries())
+
+    def evict(self, max_bytes=None):
+        """
+        Remove the least recently used entries until the folder is within a size cap.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Size cap.
+            Defaults to the cache's max_bytes.
+
+        Returns
+        -------
+        n_removed : int
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        n_removed = 0
+        for path, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            n_removed += 1
+        return n_removed
+
+    def clear(self):
+        """Remove every entry, returning the number removed."""
+        return self.evict(max_bytes=0)
+
+    def memoize(self, function, inputs=(), version=None, name=None):
+        """
+        Wrap a function so its results are cached.
+
+        Parameters
+        ----------
+        function : callable
+            Function of input files and other picklable / hashable parameters,
+            with a deterministic result
+
+        inputs : list of str, optional
+            Names of the arguments that are input file paths (or lists of paths),
+            hashed by their contents instead of their values, e.g. ['fname'] for np.genfromtxt
+
+        version : optional
+            See key().
+            Defaults to a hash of the source file defining function, so results
+            are recomputed after that module is edited; set it explicitly when the
+            result also depends on code elsewhere.
+
+        name : str, optional
+            Name of the computation in the key.
+            Defaults to the function's module and qualified name.
+
+        Returns
+        -------
+        cached : callable
+            Same signature as function
+        """
+        signature = inspect.signature(function)
+        name = name or '{}.{}'.format(function.__module__, function.__qualname__)
+        if version is None:
+            version = source_hash(function)
+
+        @functools.wraps(function)
+        def cached(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            paths = []
+            for argument in inputs:
+                value = arguments.pop(argument, None)
+                if value is not None:
+                    paths.extend([value] if isinstance(value, (str, os.PathLike)) else value)
+            if not self.enabled:
+                return function(*args, **kwargs)
+            key = self.key(name, inputs=[os.fspath(path) for path in paths], version=version,
+                           params=arguments)
+            value = self.get(key, MISSING)
+            if value is MISSING:
+                value = self.put(key, function(*args, **kwargs))
+            return value
+
+        return cached
@@ -0,0 +1,227 @@
+"""
+Mean traces of regions of interest (ROIs) of a frame stack.
+
+Every ROI of a stack is extracted in one pass over its frames, instead of
+exporting one trace at a time from ImageJ. The ROIs are turned into
+precomputed weights once, so adding ROIs costs almost nothing:
+    'indices': only the pixels inside any ROI are gathered from each frame,
+    then averaged by one sparse (n_rois, n_pixels) weights matrix product
+    'sat': 4 corner lookups per square ROI in each frame's summed-area table,
+    whose cost doesn't depend on the number or size of the ROIs
+
+Usage
+-----
+from AnalysisTools import rois, stacks
+stack = stacks.open_stack('data/20190322-pigb/01-350_Vm_0001.tif')
+roi_list = rois.from_dicts([{'y': 206, 'x': 398, 'r': [15, 30]}])     # the JoVE-Paced ROI dicts
+traces = rois.extract(stack, roi_list)      # (n_rois, n_frames) mean counts
+"""
+
+from collections import namedtuple
+import numpy as np
+from scipy import sparse
+
+
+class ROI(namedtuple('ROI', ['x', 'y', 'size', 'shape'])):
+    """
+    A square or circular region of interest.
+
+    Attributes
+    ----------
+    x, y : int
+        Center column and row (px)
+
+    size : int
+        Width of a square, or radius of a circle (px)
+
+    shape : str
+        'square' or 'circle'
+
+    Notes
+    -----
+    A square covers columns x - size // 2 to x - size // 2 + size - 1 (and the
+    same for rows), so odd sizes are centered. A circle covers the pixels whose
+    centers are within its radius. Pixels outside the frame are left out.
+    """
+    __slots__ = ()
+
+    @property
+    def label(self):
+        """Label in the style of the ImageJ exports, e.g. '15x15-398x206'."""
+        if self.shape == 'square':
+            return '{0}x{0}-{1}x{2}'.format(self.size, self.x, self.y)
+        return 'r{}-{}x{}'.format(self.size, self.x, self.y)
+
+    def bounds(self, frame_shape):
+        """Row and column slices of the ROI's bounding box, clipped to the frame."""
+        height, width = frame_shape
+        half = self.size // 2 if self.shape == 'square' else self.size
+        extent = self.size if self.shape == 'square' else 2 * self.size + 1
+        row_start, col_start = self.y - half, self.x - half
+        return (slice(max(row_start, 0), min(row_start + extent, height)),
+                slice(max(col_start, 0), min(col_start + extent, width)))
+
+    def indices(self, frame_shape):
+        """Flat (row * W + column) indices of the ROI's pixels, in ascending order."""
+        rows, cols = self.bounds(frame_shape)
+        yy, xx = np.ogrid[rows, cols]
+        indices = yy * frame_shape[1] + xx
+        if self.shape == 'circle':
+            return indices[(yy - self.y) ** 2 + (xx - self.x) ** 2 <= self.size ** 2]
+        return indices.ravel()
+
+    def mask(self, frame_shape):
+        """Boolean (H, W) mask of the ROI."""
+        mask = np.zeros(frame_shape, dtype=bool)
+        mask.flat[self.indices(frame_shape)] = True
+        return mask
+
+
+def square(x, y, size):
+    """Square ROI of width size (px) centered on column x, row y."""
+    return ROI(int(x), int(y), int(size), 'square')
+
+
+def circle(x, y, radius):
+    """Circular ROI of a radius (px) centered on column x, row y."""
+    return ROI(int(x), int(y), int(radius), 'circle')
+
+
+def from_dicts(roi_dicts, shape='square'):
+    """
+    ROIs from the figure scripts' dicts, e.g. {'y': 206, 'x': 398, 'r': [15, 30]}.
+
+    Parameters
+    ----------
+    roi_dicts : list of dict
+        Each with a center 'x', 'y' and one size or a list of sizes 'r'
+
+    shape : str, optional
+        'square' (r is the width) or 'circle' (r is the radius).
+        Defaults to 'square'.
+
+    Returns
+    -------
+    roi_list : list of ROI
+        One ROI per size of each dict, in order
+    """
+    make = {'square': square, 'circle': circle}[shape]
+    return [make(roi['x'], roi['y'], size)
+            for roi in roi_dicts for size in np.atleast_1d(roi['r'])]
+
+
+class Extractor:
+    """
+    Mean traces of a fixed set of ROIs, with their weights precomputed for a frame shape.
+
+    Parameters
+    ----------
+    roi_list : list of ROI
+
+    frame_shape : tuple
+        (H, W) of the frames
+
+    method : str, optional
+        'indices', 'sat' (squares only) or 'auto' to use summed-area tables only
+        when the ROIs add up to more than twice the frame's area.
+        Defaults to 'auto'.
+
+    Examples
+    --------
+    extractor = Extractor(roi_list, stack.shape[1:])
+    traces = extractor(frames)      # (n_rois, n_frames)
+    """
+
+    def __init__(self, roi_list, frame_shape, method='auto'):
+        self.rois = list(roi_list)
+        self.frame_shape = tuple(frame_shape)
+        if any(roi.shape not in ('square', 'circle') for roi in self.rois):
+            raise ValueError('ROI shapes must be \'square\' or \'circle\'')
+        indices = [roi.indices(self.frame_shape) for roi in self.rois]
+        self.n_pixels = np.array([len(idx) for idx in indices])
+        weights = sparse.csr_matrix((np.ones(self.n_pixels.sum()), np.concatenate(indices),
+                                     np.concatenate(([0], np.cumsum(self.n_pixels)))),
+                                    shape=(len(self.rois), int(np.prod(self.frame_shape))))
+        if np.any(self.n_pixels == 0):
+            raise ValueError('ROIs {} are outside the frame'.format(
+                [roi.label for roi, n in zip(self.rois, self.n_pixels) if n == 0]))
+
+        squares = all(roi.shape == 'square' for roi in self.rois)
+        if method == 'auto':
+            method = 'sat' if squares and weights.nnz > 2 * np.prod(self.frame_shape) else 'indices'
+        if method == 'sat' and not squares:
+            raise ValueError('Summed-area tables only work for square ROIs')
+        if method not in ('sat', 'indices'):
+            raise ValueError('Unknown method {!r}, use \'indices\', \'sat\' or \'auto\''.format(method))
+        self.method = method
+        if method == 'sat':
+            # Corners in a summed-area table padded with a leading row and column of zeros
+            bounds = [roi.bounds(self.frame_shape) for roi in self.rois]
+            self._rows = np.array([(rows.start, rows.stop) for rows, _ in bounds]).reshape(-1, 2)
+            self._cols = np.array([(cols.start, cols.stop) for _, cols in bounds]).reshape(-1, 2)
+        else:
+            # Gather only the pixels inside any ROI, then average with the weights of those columns
+            self._indices = np.unique(weights.indices)
+            self._weights = (sparse.diags(1 / self.n_pixels) @ weights)[:, self._indices].tocsr()
+
+    def __call__(self, frames):
+        """
+        Mean of every ROI in every frame.
+
+        Parameters
+        ----------
+        frames : array-like
+            One (H, W) frame or an (n_frames, H, W) stack
+
+        Returns
+        -------
+        traces : ndarray
+            (n_rois, n_frames), or (n_rois,) for one frame
+        """
+        frames = np.asarray(frames)
+        single = frames.ndim == 2
+        frames = frames.reshape((-1,) + self.frame_shape)
+        if self.method == 'sat':
+            sat = np.zeros((len(frames), self.frame_shape[0] + 1, self.frame_shape[1] + 1))
+            np.cumsum(frames, axis=1, out=sat[:, 1:, 1:])
+            np.cumsum(sat[:, 1:, 1:], axis=2, out=sat[:, 1:, 1:])
+            (r0, r1), (c0, c1) = self._rows.T, self._cols.T
+            sums = sat[:, r1, c1] - sat[:, r0, c1] - sat[:, r1, c0] + sat[:, r0, c0]
+            traces = (sums / self.n_pixels).T
+        else:
+            pixels = frames.reshape(len(frames), -1)[:, self._indices].astype(float)
+            traces = np.asarray(self._weights @ pixels.T)
+        return traces[:, 0] if single else traces
+
+
+def extract(stack, roi_list, n_frames=100, method='auto'):
+    """
+    Mean traces of many ROIs in one pass over a stack.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) frames, e.g. from stacks.open_stack()
+
+    roi_list : list of ROI
+        e.g. from from_dicts(), square() or circle()
+
+    n_frames : int, optional
+        Number of frames read and processed at a time.
+        Defaults to 100.
+
+    method : str, optional
+        See Extractor.
+        Defaults to 'auto'.
+
+    Returns
+    -------
+    traces : ndarray
+        (n_rois, n_frames) mean counts, in the order of roi_list
+    """
+    extractor = Extractor(roi_list, stack.shape[1:], method=method)
+    traces = np.empty((len(extractor.rois), len(stack)))
+    for idx_start in range(0, len(stack), n_frames):
+        chunk = stack[idx_start:idx_start + n_frames]
+        traces[:, idx_start:idx_start + len(chunk)] = extractor(chunk)
+    return traces
@@ -0,0 +1,223 @@
+"""
+Dominant frequency (DF) and regularity index (RI) maps.
+
+The power spectrum of every pixel is computed in one batched transform, with
+either a Hann-windowed rfft of the whole recording or Welch's averaged
+periodogram. The DF is the frequency of the largest power within a band of
+activation rates (refined between frequency bins with a parabola), and the RI is
+the fraction of the band's power within a narrow width around the DF (and its
+harmonics): close to 1 for a regular, periodic signal, lower for fibrillation.
+
+Stacks are processed in tiles of rows with every frame, so memory stays bounded
+by the tile size; tiles can run in a thread pool, since the transforms release
+the GIL.
+
+Usage
+-----
+from AnalysisTools import spectra, stacks
+stack = stacks.open_stack('data/20190322-piga/19-VFIB_Vm_0001.tif')
+maps = spectra.df_map(stack, fps=500, band=(3, 15), bin_size=5, threads=4)
+df_map = np.rot90(maps.df)      # Hz, NaN for background, e.g. for plot_map() in JoVE-Paced.py
+"""
+
+import functools
+from collections import namedtuple
+import numpy as np
+from scipy import signal as sps
+from AnalysisTools import activation
+
+
+class SpectralMaps(namedtuple('SpectralMaps', ['df', 'ri', 'power'])):
+    """
+    Dominant frequency and regularity index maps.
+
+    Attributes
+    ----------
+    df : ndarray
+        (H, W) dominant frequency (Hz), NaN for background
+
+    ri : ndarray
+        (H, W) regularity index (0 - 1), NaN for background
+
+    power : ndarray
+        (H, W) total power within the band
+    """
+    __slots__ = ()
+
+
+def spectrum(traces, fps, method='fft', nperseg=None, axis=-1):
+    """
+    Power spectra of a batch of traces.
+
+    Parameters
+    ----------
+    traces : array-like
+        One trace, (n_traces, n_samples) or a frame stack, with time along axis
+
+    fps : float
+        Sample rate (frames per second)
+
+    method : str, optional
+        'fft' for a Hann-windowed rfft of the whole traces, or 'welch' for Welch's
+        method (less noisy, coarser frequency resolution).
+        Defaults to 'fft'.
+
+    nperseg : int, optional
+        Samples per Welch segment.
+        Defaults to 2 s of samples, or the whole traces if shorter.
+
+    axis : int, optional
+        Time axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    freqs : ndarray
+        (n_freqs,) frequencies (Hz)
+
+    power : ndarray
+        Power spectra, with frequency along axis
+    """
+    traces = np.asarray(traces, dtype=float)
+    n = traces.shape[axis]
+    if method == 'welch':
+        nperseg = min(nperseg or int(2 * fps), n)
+        return sps.welch(traces, fs=fps, nperseg=nperseg, detrend='constant', axis=axis)
+    if method != 'fft':
+        raise ValueError('Unknown method {!r}, use \'fft\' or \'welch\''.format(method))
+    shape = [1] * traces.ndim
+    shape[axis] = n
+    window = np.hanning(n).reshape(shape)
+    traces = traces - traces.mean(axis=axis, keepdims=True)
+    power = np.abs(np.fft.rfft(traces * window, axis=axis)) ** 2
+    return np.fft.rfftfreq(n, 1 / fps), power
+
+
+def dominant_frequency(freqs, power, band=(3, 15), width=1.0, harmonics=True, axis=-1):
+    """
+    Dominant frequency and regularity index of power spectra.
+
+    Parameters
+    ----------
+    freqs : ndarray
+        (n_freqs,) frequencies (Hz), from spectrum()
+
+    power : ndarray
+        Power spectra, with frequency along axis
+
+    band : tuple, optional
+        (low, high) frequencies (Hz) searched for the DF, also the total power of the RI.
+        Defaults to (3, 15), activation rates of fibrillation.
+
+    width : float, optional
+        Width (Hz) of the peak around the DF counted by the RI.
+        Defaults to 1.
+
+    harmonics : bool, optional
+        If True, the RI also counts the peaks at multiples of the DF within the band.
+        Defaults to True.
+
+    axis : int, optional
+        Frequency axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    df : ndarray
+        Dominant frequencies (Hz)
+
+    ri : ndarray
+        Regularity indices (0 - 1)
+
+    band_power : ndarray
+        Total power within the band
+    """
+    power = np.moveaxis(np.asarray(power, dtype=float), axis, -1)
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    if in_band.sum() < 2:
+        raise ValueError('{} frequencies are too few for the band {}, use a longer window or a wider band'
+                         .format(in_band.sum(), band))
+    freqs_band, power_band = freqs[in_band], power[..., in_band]
+    band_power = power_band.sum(axis=-1)
+
+    idx = np.argmax(power_band, axis=-1)
+    idx_inner = np.clip(idx, 1, len(freqs_band) - 2)[..., None]
+    before, peak, after = (np.take_along_axis(power_band, idx_inner + step, axis=-1)[..., 0]
+                           for step in (-1, 0, 1))
+    curvature = before - 2 * peak + after
+    with np.errstate(invalid='ignore', divide='ignore'):
+        offset = np.where(curvature < 0, 0.5 * (before - after) / curvature, 0)
+    offset = np.where(idx == idx_inner[..., 0], np.clip(offset, -0.5, 0.5), 0)
+    df = freqs_band[idx] + offset * (freqs_band[1] - freqs_band[0])
+
+    # Power within width / 2 of the DF, and of its harmonics, as a (..., n_freqs) mask
+    orders = np.arange(1, int(band[1] // max(band[0], 1e-9)) + 1 if harmonics else 2)
+    distance = np.abs(freqs_band - df[..., None, None] * orders[:, None]).min(axis=-2)
+    peak_power = np.where(distance <= width / 2, power_band, 0).sum(axis=-1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ri = peak_power / band_power
+    return df, ri, band_power
+
+
+def _spectral_block(block, fps, method='fft', nperseg=None, band=(3, 15), width=1.0, harmonics=True):
+    # DF, RI and band power of one (n_frames, rows, W) block
+    freqs, power = spectrum(block, fps, method=method, nperseg=nperseg, axis=0)
+    return dominant_frequency(freqs, power, band=band, width=width, harmonics=harmonics, axis=0)
+
+
+def df_map(stack, fps, start=0, end=None, band=(3, 15), method='fft', nperseg=None, width=1.0,
+           harmonics=True, bin_size=None, threshold=0.05, n_rows=32, threads=None):
+    """
+    Dominant frequency and regularity index maps of a frame stack.
+
+    Parameters
+    ----------
+    stack : TiffStack or ndarray
+        (n_frames, H, W) recording, e.g. from stacks.open_stack()
+
+    fps : float
+        Frame rate (frames per second)
+
+    start, end : float, optional
+        Window (s) from the first frame.
+        Defaults to the whole recording.
+
+    band, width, harmonics : optional
+        See dominant_frequency()
+
+    method, nperseg : optional
+        See spectrum()
+
+    bin_size : int, optional
+        Width (px) of a uniform spatial filter applied to every frame first.
+        Defaults to no binning.
+
+    threshold : float, optional
+        Pixels whose band power is below this fraction of the largest band power
+        (background) are set to NaN.
+        Defaults to 0.05.
+
+    n_rows : int, optional
+        Number of rows of pixels (with every frame) processed at a time.
+        Defaults to 32.
+
+    threads : int, optional
+        Number of threads for the tiles of rows.
+        Defaults to processing in this thread.
+
+    Returns
+    -------
+    maps : SpectralMaps
+        (H, W) maps in the orientation of the frames
+    """
+    idx_start = int(round(start * fps))
+    idx_end = None if end is None else int(round(end * fps))
+    blocks = activation.row_blocks(stack, idx_start, idx_end, bin_size=bin_size, n_rows=n_rows)
+    process = functools.partial(_spectral_block, fps=fps, method=method, nperseg=nperseg, band=band,
+                                width=width, harmonics=harmonics)
+    results = activation.map_blocks(process, blocks, threads=threads)
+    df, ri, power = (np.concatenate([result[idx] for result in results]) for idx in range(3))
+
+    background = ~(power >= threshold * np.nanmax(power))
+    df[background], ri[background] = np.nan, np.nan
+    return SpectralMaps(df, ri, power)
@@ -0,0 +1,288 @@
+"""
+Memory-mapped reader for TIFF recordings from the camera.
+
+Recordings are uncompressed 16-bit TIFFs (640 x 512 per frame), either
+    a multi-page TIFF or an ImageJ stack (one file, many frames), or
+    an image sequence of single-frame files, e.g. 01-350_Vm_0001.tif, 01-350_Vm_0002.tif, ...
+
+Frames are never read as a whole: the files are memory-mapped, and frames
+come as (n_frames, H, W) views or are streamed in chunks, so recordings
+larger than memory can be processed frame by frame.
+
+Usage
+-----
+from AnalysisTools import stacks
+stack = stacks.open_stack('data/20190322-pigb/01-350_Vm_0001.tif')
+stack.shape                     # (n_frames, 512, 640)
+frame = stack[0]                # same as plt.imread('..._0001.tif')
+for idx_start, chunk in stack.chunks(100):
+    ...                         # (<= 100, 512, 640) native uint16 arrays
+"""
+
+import os
+import re
+import glob
+import struct
+import numpy as np
+
+# Tags used to locate the image data of a page
+_TAGS = {256: 'width', 257: 'height', 258: 'bits', 259: 'compression', 270: 'description',
+         273: 'offsets', 277: 'samples', 279: 'byte_counts', 339: 'sample_format'}
+# TIFF field types: (struct format, size)
+_TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('I', 4), 6: ('b', 1), 7: ('B', 1),
+          8: ('h', 2), 9: ('i', 4), 11: ('f', 4), 12: ('d', 8), 16: ('Q', 8), 17: ('q', 8)}
+_SAMPLE_KINDS = {1: 'u', 2: 'i', 3: 'f'}
+_SEQUENCE = re.compile(r'^(?P<prefix>.*_)(?P<number>\d+)(?P<ext>\.tiff?)$', re.IGNORECASE)
+
+
+def _read_pages(path):
+    # Parse the image file directories (IFDs) of a classic or Big TIFF:
+    # [(offset, (height, width), dtype), ...] and the first page's description
+    with open(path, 'rb') as file:
+        header = file.read(16)
+        order = {b'II': '<', b'MM': '>'}.get(header[:2])
+        if order is None:
+            raise ValueError('{} is not a TIFF file'.format(path))
+        version = struct.unpack(order + 'H', header[2:4])[0]
+        if version == 42:
+            offset_format, count_format, entry_size = 'I', 'H', 12
+            offset = struct.unpack(order + 'I', header[4:8])[0]
+        elif version == 43:
+            offset_format, count_format, entry_size = 'Q', 'Q', 20
+            offset = struct.unpack(order + 'Q', header[8:16])[0]
+        else:
+            raise ValueError('{} is not a TIFF file'.format(path))
+        offset_size = struct.calcsize(offset_format)
+        count_size = struct.calcsize(count_format)
+
+        pages, description = [], ''
+        while offset:
+            file.seek(offset)
+            n_entries = struct.unpack(order + count_format, file.read(count_size))[0]
+            entries = file.read(n_entries * entry_size)
+            fields = {}
+            for idx in range(n_entries):
+                entry = entries[idx * entry_size:(idx + 1) * entry_size]
+                tag, field_type = struct.unpack(order + 'HH', entry[:4])
+                if tag not in _TAGS or field_type not in _TYPES:
+                    continue
+                count = struct.unpack(order + offset_format, entry[4:4 + offset_size])[0]
+                value_format, value_size = _TYPES[field_type]
+                value = entry[4 + offset_size:]
+                if count * value_size > offset_size:
+                    # Values that don't fit in the entry are stored elsewhere
+                    position = file.tell()
+                    file.seek(struct.unpack(order + offset_format, value)[0])
+                    value = file.read(count * value_size)
+                    file.seek(position)
+                if field_type == 2:
+                    fields[_TAGS[tag]] = value[:count].decode('latin-1').rstrip('\x00')
+                else:
+                    fields[_TAGS[tag]] = struct.unpack(order + value_format * count, value[:count * value_size])
+            offset = struct.unpack(order + offset_format, file.read(offset_size))[0]
+
+            if fields.get('compression', (1,))[0] != 1:
+                raise ValueError('{} is compressed, only uncompressed TIFFs can be mapped'.format(path))
+            if fields.get('samples', (1,))[0] != 1:
+                raise ValueError('{} has more than one sample per pixel'.format(path))
+            offsets, byte_counts = fields['offsets'], fields['byte_counts']
+            if any(start + count != start_next for start, count, start_next
+                   in zip(offsets, byte_counts, offsets[1:])):
+                raise ValueError('{} has non-contiguous strips'.format(path))
+            kind = _SAMPLE_KINDS[fields.get('sample_format', (1,))[0]]
+            dtype = np.dtype(order + kind + str(fields['bits'][0] // 8))
+            if not pages:
+                description = fields.get('description', '')
+            pages.append((offsets[0], (fields['height'][0], fields['width'][0]), dtype))
+    return pages, description
+
+
+class TiffStack:
+    """
+    A TIFF recording as a read-only (n_frames, H, W) stack of memory-mapped frames.
+
+    Parameters
+    ----------
+    paths : list of str
+        TIFF files in frame order, each with one or many frames
+
+    Attributes
+    ----------
+    shape : tuple
+        (n_frames, H, W)
+
+    dtype : numpy.dtype
+        Data type of the pixels, in the byte order of the files
+
+    Notes
+    -----
+    Indexing returns views of the files (e.g. stack[0], stack[10:20]) when the
+    frames are contiguous in one file, and copies otherwise. read() and
+    chunks() always return arrays in native byte order.
+    """
+
+    def __init__(self, paths):
+        self.paths = list(paths)
+        self._frames = []       # (file index, offset) of each frame
+        self._maps = [None] * len(self.paths)
+        self.frame_shape = self.dtype = None
+        for idx_file, path in enumerate(self.paths):
+            pages, description = _read_pages(path)
+            offset, frame_shape, dtype = pages[0]
+            if self.frame_shape is None:
+                self.frame_shape, self.dtype = frame_shape, dtype
+            if any(page[1:] != (self.frame_shape, self.dtype) for page in pages):
+                raise ValueError('Frames of {} differ in size or type from {}'.format(path, self.paths[0]))
+            # ImageJ stacks larger than 4 GB list only the first frame, the rest follow it
+            images = re.search(r'^images=(\d+)', description, re.MULTILINE)
+            n_images = int(images.group(1)) if images else len(pages)
+            if n_images > len(pages):
+                pages = [(offset + idx * self.frame_bytes, frame_shape, dtype) for idx in range(n_images)]
+            self._frames.extend((idx_file, page[0]) for page in pages)
+
+    def __getstate__(self):
+        # Send the file paths and frame offsets to other processes, not the mapped files
+        state = self.__dict__.copy()
+        state['_maps'] = [None] * len(self.paths)
+        return state
+
+    def __repr__(self):
+        return 'TiffStack({!r}, shape={})'.format(self.paths[0], self.shape)
+
+    @property
+    def frame_bytes(self):
+        return int(np.prod(self.frame_shape)) * self.dtype.itemsize
+
+    @property
+    def shape(self):
+        return (len(self._frames),) + tuple(self.frame_shape)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def _map(self, idx_file):
+        if self._maps[idx_file] is None:
+            self._maps[idx_file] = np.memmap(self.paths[idx_file], dtype=np.uint8, mode='r')
+        return self._maps[idx_file]
+
+    def _contiguous(self, start, stop):
+        # Frames start:stop as one view, if they are back to back in one file
+        idx_file, offset = self._frames[start]
+        last_file, last_offset = self._frames[stop - 1]
+        if last_file != idx_file or last_offset != offset + (stop - 1 - start) * self.frame_bytes:
+            return None
+        return np.ndarray((stop - start,) + tuple(self.frame_shape), dtype=self.dtype,
+                          buffer=self._map(idx_file), offset=offset)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            frames, pixels = key[0], key[1:]
+        else:
+            frames, pixels = key, ()
+        if isinstance(frames, slice):
+            start, stop, step = frames.indices(len(self))
+            stack = self._contiguous(start, stop) if step == 1 and stop > start else None
+            if stack is None:
+                stack = self._gather(range(start, stop, step))
+            return stack[(slice(None),) + pixels]
+        if np.ndim(frames) == 0:
+            idx = int(frames)
+            if idx < 0:
+                idx += len(self)
+            if not 0 <= idx < len(self):
+                raise IndexError('Frame {} is out of range for {} frames'.format(frames, len(self)))
+            return self._contiguous(idx, idx + 1)[0][pixels]
+        return self._gather(np.arange(len(self))[frames])[(slice(None),) + pixels]
+
+    def _gather(self, indices):
+        stack = np.empty((len(indices),) + tuple(self.frame_shape), dtype=self.dtype)
+        for idx_out, idx in enumerate(indices):
+            stack[idx_out] = self._contiguous(idx, idx + 1)[0]
+        return stack
+
+    def read(self, start=0, stop=None):
+        """
+        Read frames start:stop into memory.
+
+        Returns
+        -------
+        frames : ndarray
+            (n_frames, H, W) in native byte order
+        """
+        return np.ascontiguousarray(self[start:stop], dtype=self.dtype.newbyteorder('='))
+
+    def chunks(self, n_frames=100, start=0, stop=None):
+        """
+        Stream the frames in chunks.
+
+        Parameters
+        ----------
+        n_frames : int, optional
+            Number of frames per chunk.
+            Defaults to 100.
+
+        start, stop : int, optional
+            Range of frames to stream.
+            Defaults to every frame.
+
+        Yields
+        ------
+        idx_start : int
+            Index of the chunk's first frame
+
+        chunk : ndarray
+            (<= n_frames, H, W) in native byte order
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        for idx_start in range(start, stop, n_frames):
+            yield idx_start, self.read(idx_start, min(idx_start + n_frames, stop))
+
+
+def sequence_paths(path):
+    """
+    Every file of the image sequence that a numbered file belongs to.
+
+    Parameters
+    ----------
+    path : str
+        One file of the sequence, e.g. '01-350_Vm_0001.tif'
+
+    Returns
+    -------
+    paths : list of str
+        Files with the same prefix and number of digits, sorted by number,
+        or just [path] if its name isn't numbered
+    """
+    folder, name = os.path.split(path)
+    match = _SEQUENCE.match(name)
+    if not match:
+        return [path]
+    digits = len(match.group('number'))
+    pattern = glob.escape(match.group('prefix')) + '[0-9]' * digits + match.group('ext')
+    return sorted(glob.glob(os.path.join(folder, pattern)))
+
+
+def open_stack(path, sequence=True):
+    """
+    Open a TIFF recording.
+
+    Parameters
+    ----------
+    path : str
+        Multi-page TIFF, ImageJ stack, or any file of an image sequence
+
+    sequence : bool, optional
+        If True and path is a single-frame file, e.g. '..._0001.tif', open every
+        file of its image sequence, see sequence_paths().
+        Defaults to True.
+
+    Returns
+    -------
+    stack : TiffStack
+    """
+    stack = TiffStack([path])
+    if sequence and len(stack) == 1:
+        paths = sequence_paths(path)
+        if len(paths) > 1:
+            stack = TiffStack(paths)
+    return stack
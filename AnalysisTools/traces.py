@@ -0,0 +1,199 @@
+"""
+Processing of fluorescence traces without plotting.
+
+Every function works on a single trace or on a batch of traces stacked as
+a 2-D (n_traces, n_samples) array, processing along the last axis by default.
+"""
+
+import numpy as np
+from AnalysisTools import filters
+
+
+def imagej_window(data, x_span, x_end=None):
+    """
+    Slice the frames and counts of an ImageJ ROI trace export.
+
+    Parameters
+    ----------
+    data : ndarray
+        ImageJ export with columns: frame index, fluorescence (counts).
+        The first row is the X,Y header row (nan, nan).
+
+    x_span : int
+        Number of frames in the window
+
+    x_end : int, optional
+        Index of the row after the window (the header row counts as a row).
+        Defaults to the end of the trace.
+
+    Returns
+    -------
+    frames : ndarray
+        Frame indices of the window, counted from the start of the export (1-based)
+
+    counts : ndarray
+        Fluorescence counts of the window, as integers
+    """
+    if not x_end:
+        x_end = len(data)  # Includes X,Y header row (nan,nan)
+    x_start = x_end - x_span
+    frames = data[1:x_span + 1, 0]  # Skip X,Y header row
+    counts = data[x_start:x_end, 1].astype(int)
+    return frames, counts
+
+
+def frames_to_ms(frames, fps):
+    """Convert 1-based frame indices to times (ms) starting at 0."""
+    return ((np.asarray(frames) - 1) / fps) * 1000
+
+
+def frac_change(counts, f_0=None, axis=-1):
+    """
+    Convert fluorescence counts to fractional change dF / F0: (F_t - F0) / F0.
+
+    Parameters
+    ----------
+    counts : array-like
+        Fluorescence counts, one trace or (n_traces, n_samples)
+
+    f_0 : float or array-like, optional
+        Baseline fluorescence, broadcast against counts.
+        Defaults to the minimum of each trace.
+
+    axis : int, optional
+        Time axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    frac : ndarray
+    """
+    counts = np.asarray(counts, dtype=float)
+    if f_0 is None:
+        f_0 = np.nanmin(counts, axis=axis, keepdims=True)
+    return (counts - f_0) / f_0
+
+
+def shift_zero(counts, axis=-1):
+    """Shift each trace so that its minimum is zero."""
+    counts = np.asarray(counts, dtype=float)
+    return counts - np.nanmin(counts, axis=axis, keepdims=True)
+
+
+def filter_lowpass(traces, fps, freq=75, order=5, axis=-1):
+    """
+    Zero-phase low-pass Butterworth filter of every trace, see filters.Butterworth.
+
+    Parameters
+    ----------
+    traces : array-like
+        One trace or (n_traces, n_samples)
+
+    fps : float
+        Sample rate (frames per second)
+
+    freq : float, optional
+        Cutoff frequency (Hz).
+        Defaults to 75.
+
+    order : int, optional
+        Filter order.
+        Defaults to 5.
+
+    axis : int, optional
+        Time axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    filtered : ndarray
+    """
+    return filters.lowpass(fps, freq, order)(traces, axis=axis)
+
+
+def normalize(traces, invert=False, axis=-1):
+    """
+    Normalize each trace to the range 0 - 1.
+
+    Parameters
+    ----------
+    traces : array-like
+        One trace or (n_traces, n_samples)
+
+    invert : bool, optional
+        If True, invert the normalized traces (1 - trace), e.g. for voltage dyes.
+        Defaults to False.
+
+    axis : int, optional
+        Time axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    normalized : ndarray
+    """
+    traces = np.asarray(traces, dtype=float)
+    data_min = np.nanmin(traces, axis=axis, keepdims=True)
+    data_max = np.nanmax(traces, axis=axis, keepdims=True)
+    normalized = np.clip((traces - data_min) / (data_max - data_min), 0, 1)
+    if invert:
+        normalized = 1 - normalized
+    return normalized
+
+
+def process(counts, fps=None, frac=True, filter_lp=False, norm=False, invert=False,
+            freq=75, order=5, axis=-1):
+    """
+    Process fluorescence counts the same way the figure trace plots do.
+
+    Steps, in order: dF / F0 (or shift to zero), low-pass filter, normalize (and invert).
+
+    Parameters
+    ----------
+    counts : array-like
+        Fluorescence counts, one trace or (n_traces, n_samples)
+
+    fps : float, optional
+        Sample rate (frames per second), required if filter_lp is True
+
+    frac : bool, optional
+        If True, convert counts to dF / F0, otherwise shift them to start at zero.
+        Defaults to True.
+
+    filter_lp : bool, optional
+        If True, low-pass filter the traces.
+        Defaults to False.
+
+    norm : bool, optional
+        If True, normalize each trace to 0 - 1.
+        Defaults to False.
+
+    invert : bool, optional
+        If True, invert the normalized traces. Requires norm.
+        Defaults to False.
+
+    freq, order : optional
+        Low-pass filter cutoff (Hz) and order, see filter_lowpass()
+
+    axis : int, optional
+        Time axis.
+        Defaults to the last axis.
+
+    Returns
+    -------
+    processed : ndarray
+    """
+    if invert and not norm:
+        raise ValueError('Can\'t invert a non-normalized trace')
+    if filter_lp and not fps:
+        raise ValueError('fps is required to filter traces')
+
+    if frac:
+        processed = frac_change(counts, axis=axis)
+    else:
+        processed = shift_zero(counts, axis=axis)
+    if filter_lp:
+        processed = filter_lowpass(processed, fps, freq=freq, order=order, axis=axis)
+    if norm:
+        processed = normalize(processed, invert=invert, axis=axis)
+    return processed
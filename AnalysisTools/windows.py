@@ -0,0 +1,164 @@
+"""
+Time-window slicing of sampled signals.
+
+Window boundaries are found with a binary search (np.searchsorted) on the
+sorted time column, and windows are returned as views of the data instead
+of copies wherever possible.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+
+def first_index(times, time):
+    """
+    Index of the first sample at or after a time.
+
+    Parameters
+    ----------
+    times : array-like
+        Sorted (ascending) sample times
+
+    time : float or array-like
+        Time(s) to search for, same units as times
+
+    Returns
+    -------
+    idx : int or ndarray
+        len(times) if every sample is before the time
+    """
+    return np.searchsorted(times, time, side='left')
+
+
+def window_indices(times, time_start, time_window=None):
+    """
+    Start and end indices of one or many time windows.
+
+    Parameters
+    ----------
+    times : array-like
+        Sorted (ascending) sample times
+
+    time_start : float or array-like
+        Start time of each window
+
+    time_window : float or array-like, optional
+        Duration of each window, broadcast against time_start.
+        Defaults to windows that run to the end of the samples.
+
+    Returns
+    -------
+    idx_start, idx_end : int or ndarray
+        Window i covers samples idx_start[i]:idx_end[i]
+    """
+    idx_start = first_index(times, time_start)
+    if time_window is None:
+        idx_end = np.full_like(idx_start, len(times))
+    else:
+        idx_end = first_index(times, np.add(time_start, time_window))
+    return idx_start, idx_end
+
+
+def slice_windows(data, idx_start, idx_end, axis=0):
+    """
+    Views of data for windows of any length.
+
+    Parameters
+    ----------
+    data : ndarray
+        Sampled data, e.g. (n_samples, n_columns)
+
+    idx_start, idx_end : array-like
+        Window boundaries, see window_indices()
+
+    axis : int, optional
+        Time axis of data.
+        Defaults to 0 (rows), the layout of the exported text files.
+
+    Returns
+    -------
+    windows : list of ndarray
+        One view of data per window
+    """
+    slices = [slice(None)] * data.ndim
+    windows = []
+    for start, end in zip(np.atleast_1d(idx_start), np.atleast_1d(idx_end)):
+        slices[axis] = slice(start, end)
+        windows.append(data[tuple(slices)])
+    return windows
+
+
+def sliding_windows(data, n_samples, axis=0):
+    """
+    Read-only view of every window of n_samples consecutive samples.
+
+    Parameters
+    ----------
+    data : ndarray
+        Sampled data
+
+    n_samples : int
+        Number of samples in each window
+
+    axis : int, optional
+        Time axis of data.
+        Defaults to 0.
+
+    Returns
+    -------
+    windows : ndarray
+        View with shape (n_positions, ...), where the time axis of data now has
+        length n_samples and window i starts at sample i
+    """
+    axis = axis % data.ndim
+    n_positions = data.shape[axis] - n_samples + 1
+    if n_positions < 1:
+        raise ValueError('Windows of {} samples are longer than the data ({} samples)'
+                         .format(n_samples, data.shape[axis]))
+    shape = (n_positions,) + data.shape[:axis] + (n_samples,) + data.shape[axis + 1:]
+    strides = (data.strides[axis],) + data.strides
+    return as_strided(data, shape=shape, strides=strides, writeable=False)
+
+
+def window_stack(data, idx_start, n_samples, axis=0):
+    """
+    Stack of equal-length windows, e.g. one per beat.
+
+    Evenly spaced windows (e.g. at a fixed pacing cycle length) are returned as
+    a zero-copy view, other windows are gathered into a new array.
+
+    Parameters
+    ----------
+    data : ndarray
+        Sampled data
+
+    idx_start : array-like
+        Start index of each window
+
+    n_samples : int
+        Number of samples in each window
+
+    axis : int, optional
+        Time axis of data.
+        Defaults to 0.
+
+    Returns
+    -------
+    windows : ndarray
+        Shape (n_windows, ...), where the time axis of data now has length n_samples
+    """
+    idx_start = np.atleast_1d(idx_start)
+    windows = sliding_windows(data, n_samples, axis=axis)
+    if idx_start.min() < 0 or idx_start.max() >= len(windows):
+        raise IndexError('Windows must start between 0 and {}'.format(len(windows) - 1))
+    steps = np.diff(idx_start)
+    if len(idx_start) == 1 or (steps[0] > 0 and np.all(steps == steps[0])):
+        step = steps[0] if len(steps) else 1
+        return windows[idx_start[0]:idx_start[-1] + 1:step]
+    return windows[idx_start]
+
+
+def round_up(value, decimals=3):
+    """Round away from zero to a number of decimals, e.g. to tidy float times for axis limits."""
+    scale = 10 ** decimals
+    return float(np.sign(value) * np.ceil(abs(value) * scale) / scale)
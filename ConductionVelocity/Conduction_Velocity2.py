@@ -8,6 +8,7 @@ import matplotlib.ticker as ticker
 from scipy import stats
 import cv2
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+from AnalysisTools import conduction
 
 
 plt.rcParams.update({'font.size': 9})
@@ -87,6 +88,12 @@ ax.text(xl[0] - (xr * 0.01), yr * 0.01, 'B', ha='center', va='bottom', fontsize=
 r1=(126,173) # Pacing Site
 r2=(180,128) # Distal Site
 dist=np.sqrt((r2[0]-r1[0])**2+(r2[1]-r1[1])**2)
+# Spatial resolution (cm/px)
+resolution = 0.004761626  # cm_px of the rat recordings, see data/20180522-rata-CV.csv
+# Conduction velocity of every pixel, from local plane fits, instead of only along R1 - R2
+cv_field = conduction.velocity_field(data, resolution=resolution, size=7, speed_max=200)
+ax.text(0.98, 0.02, 'CV {:.0f} cm/s'.format(np.nanmedian(cv_field.speed)), transform=ax.transAxes,
+        ha='right', va='bottom', fontsize=8)
 
 # Baseline PCL 200
 data = np.loadtxt('ActMaps/ActMap-20180910-06-140.csv',delimiter=',',skiprows=0)
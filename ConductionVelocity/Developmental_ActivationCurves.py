@@ -2,13 +2,13 @@
 Plots activation maps and activation curves of murine epicardial tissue.
 """
 
-import math
 import random
 import numpy as np
 from matplotlib import ticker
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+from AnalysisTools import actmaps, mapstore
 import ScientificColourMaps5 as SCMaps
 
 colors_actcurves = ['b', 'r', 'k']
@@ -30,28 +30,13 @@ def generate_ActMap(conduction_v):
     # Dimensions of model data (px)
     HEIGHT = 400
     WIDTH = 200
-    # Allocate space for the Activation Map
-    act_map = np.zeros(shape=(HEIGHT, WIDTH))
     # Spatial resolution (cm/px)
     resolution = 0.005  # 4 cm / 200 px
     # resolution = 0.0149  # pig video resolution
 
-    # Convert conduction velocity from cm/s to px/s
-    conduction_v_px = conduction_v / resolution
-    # # Convert dimensions to cm
-    # HEIGHT = HEIGHT * resolution
-    # WIDTH = WIDTH * resolution
-
-    # Generate an isotropic activation map, radiating from the center
-    origin_x, origin_y = WIDTH / 2, HEIGHT / 2
-    # Assign an activation time to each pixel
-    for ix, iy in np.ndindex(act_map.shape):
-        # Compute the distance from the center (cm)
-        d = math.sqrt((abs(origin_x - ix) ** 2 + abs((origin_y - iy) ** 2)))
-        # Assign the time associated with that distance from the point of activation
-        act_map[ix, iy] = d / conduction_v_px
-        # Convert time from s to ms
-        act_map[ix, iy] = act_map[ix, iy] * 1000
+    # Generate an isotropic activation map (ms), radiating from the center
+    act_map = actmaps.generate(shape=(HEIGHT, WIDTH), cv=conduction_v, origins=[(WIDTH / 2, HEIGHT / 2)],
+                               resolution=resolution)
     print('Isotropic act. map generated. CV = ', conduction_v, ' cm/s')
     return act_map
 
@@ -80,33 +65,6 @@ def plot_map(axis, actmap, cmap, norm):
     return img
 
 
-def generate_actcurve(actmap, actmap_max):
-    # Flatten the activation map data into a 1-D array
-    actmap_flat = actmap.ravel()
-    # Remove the `nan` values
-    actmap_flat = actmap_flat[~np.isnan(actmap_flat)]
-
-    # Frame rate (FPS)
-    fps = 500
-    # Convert to frames / ms
-    fpms = fps / 1000
-    # Number of frames represented in this activation map
-    frames = int((np.nanmax(actmap_flat) - np.nanmin(actmap_flat)) * (1 / fpms))
-
-    # Create the bins for histogram calculation
-    xbins = np.linspace(start=0, stop=actmap_flat.max(), num=frames)
-    # Calculate the histogram
-    hist = np.histogram(actmap_flat, xbins)
-    # a = np.hstack((rng.normal(size=1000), rng.normal(loc=5, scale=2, size=1000)))
-    # tissueact = 100 * np.cumsum(hist(tim,xbins))/allpts;
-
-    # Calculate cumulative sum % of tissue activation times
-    tissueact = 100 * np.cumsum(hist[0]) / actmap_flat.size
-    # An array for the x-axis while plotting the activation curve
-    x_axes = np.linspace(start=0, stop=actmap_flat.max(), num=frames - 1)
-    return x_axes, tissueact
-
-
 # Setup the figure
 fig = plt.figure()  # _ x _ inch page
 # General layout
@@ -151,15 +109,11 @@ actMap_Ages_ASlow = generate_ActMap(conduction_v=35)
 # ret, heart_thresh = cv2.threshold(heart, 150, np.nan, cv2.THRESH_TOZERO)
 
 # Import Activation Maps
-actMap_Pacing_Fast = np.loadtxt('data/20190718-rata/ActMap-02-250_Vm.csv',
-                               delimiter=',', skiprows=0)
-actMap_Pacing_Slow = np.loadtxt('data/20190718-rata/ActMap-04-150_Vm.csv',
-                               delimiter=',', skiprows=0)
+actMap_Pacing_Fast = mapstore.load('data/20190718-rata/ActMap-02-250_Vm.csv')
+actMap_Pacing_Slow = mapstore.load('data/20190718-rata/ActMap-04-150_Vm.csv')
 
-actMap_Ages_PFast = np.loadtxt('data/20190717-rata/ActMap-01-250_Vm.csv',
-                               delimiter=',', skiprows=0)
-actMap_Ages_PSlow = np.loadtxt('data/20190717-rata/ActMap-03-150_Vm.csv',
-                               delimiter=',', skiprows=0)
+actMap_Ages_PFast = mapstore.load('data/20190717-rata/ActMap-01-250_Vm.csv')
+actMap_Ages_PSlow = mapstore.load('data/20190717-rata/ActMap-03-150_Vm.csv')
 
 
 actMaps = [actMap_Pacing_Slow, actMap_Pacing_Fast,
@@ -199,23 +153,21 @@ cb1.ax.xaxis.set_major_locator(ticker.LinearLocator(3))
 cb1.ax.xaxis.set_minor_locator(ticker.LinearLocator(5))
 cb1.ax.tick_params(labelsize=fontsize4)
 
-# Generate activation curves
+# Generate activation curves, binned the same from 0 to the latest activation time
 # Red: Fast, Black: Slow
-# Pacing section (both adult)
-actCurve_Fast_x, actCurve_Fast = generate_actcurve(actMap_Pacing_Fast, actMapMax)
-actCurve_Slow_x, actCurve_Slow = generate_actcurve(actMap_Pacing_Slow, actMapMax)
-# Age comparison section
-actCurve_Ages_PFast_x, actCurve_Ages_PFast = generate_actcurve(actMap_Ages_PFast, actMapMax)
-actCurve_Ages_PSlow_x, actCurve_Ages_PSlow = generate_actcurve(actMap_Ages_PSlow, actMapMax)
-actCurve_Ages_AFast_x, actCurve_Ages_AFast = generate_actcurve(actMap_Ages_AFast, actMapMax)
-actCurve_Ages_ASlow_x, actCurve_Ages_ASlow = generate_actcurve(actMap_Ages_ASlow, actMapMax)
+actCurves = actmaps.activation_curves(actMaps, bins=actmaps.curve_bins(actMapMax, fps=500))
+print('Times to {} % activation (ms):'.format(actCurves.levels))
+print(np.round(actCurves.times_to, 1))
+actCurve_x = actCurves.times
+(actCurve_Slow, actCurve_Fast,
+ actCurve_Ages_PSlow, actCurve_Ages_PFast, actCurve_Ages_ASlow, actCurve_Ages_AFast) = actCurves.percents
 
 # Plot Pacing activation curves
 axActCurve_Pacing.set_ylabel('Tissue Activation (%)', fontsize=10)
 axActCurve_Pacing.spines['top'].set_visible(False)
 axActCurve_Pacing.spines['right'].set_visible(False)
-axActCurve_Pacing.plot(actCurve_Fast_x, actCurve_Fast, 'r')
-axActCurve_Pacing.plot(actCurve_Slow_x, actCurve_Slow, 'k')
+axActCurve_Pacing.plot(actCurve_x, actCurve_Fast, 'r')
+axActCurve_Pacing.plot(actCurve_x, actCurve_Slow, 'k')
 axActCurve_Pacing.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed')
 axActCurve_Pacing.xaxis.set_major_locator(ticker.MultipleLocator(10))
 axActCurve_Pacing.xaxis.set_minor_locator(ticker.MultipleLocator(5))
@@ -223,10 +175,10 @@ axActCurve_Pacing.xaxis.set_minor_locator(ticker.MultipleLocator(5))
 axActCurve_Ages.set_ylabel('Tissue Activation (%)', fontsize=10)
 axActCurve_Ages.spines['top'].set_visible(False)
 axActCurve_Ages.spines['right'].set_visible(False)
-axActCurve_Ages.plot(actCurve_Ages_PFast_x, actCurve_Ages_PFast, 'r-.')
-axActCurve_Ages.plot(actCurve_Ages_PSlow_x, actCurve_Ages_PSlow, 'k--', )
-axActCurve_Ages.plot(actCurve_Ages_AFast_x, actCurve_Ages_AFast, 'r')
-axActCurve_Ages.plot(actCurve_Ages_ASlow_x, actCurve_Ages_ASlow, 'k')
+axActCurve_Ages.plot(actCurve_x, actCurve_Ages_PFast, 'r-.')
+axActCurve_Ages.plot(actCurve_x, actCurve_Ages_PSlow, 'k--', )
+axActCurve_Ages.plot(actCurve_x, actCurve_Ages_AFast, 'r')
+axActCurve_Ages.plot(actCurve_x, actCurve_Ages_ASlow, 'k')
 axActCurve_Ages.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed')
 axActCurve_Ages.xaxis.set_major_locator(ticker.MultipleLocator(10))
 axActCurve_Ages.xaxis.set_minor_locator(ticker.MultipleLocator(5))
@@ -2,7 +2,6 @@
 Plots activation maps and activation curves of murine epicardial tissue, exploratory.
 """
 
-import math
 import random
 import numpy as np
 from matplotlib import ticker
@@ -10,6 +9,7 @@ import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 from matplotlib.lines import Line2D
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+from AnalysisTools import actmaps, mapstore
 import ScientificColourMaps5 as SCMaps
 
 colors_actcurves = ['r', 'k']
@@ -33,28 +33,13 @@ def generate_ActMap(conduction_v):
     # Dimensions of model data (px)
     HEIGHT = 400
     WIDTH = 200
-    # Allocate space for the Activation Map
-    act_map = np.zeros(shape=(HEIGHT, WIDTH))
     # Spatial resolution (cm/px)
     resolution = 0.005  # 4 cm / 200 px
     # resolution = 0.0149  # pig video resolution
 
-    # Convert conduction velocity from cm/s to px/s
-    conduction_v_px = conduction_v / resolution
-    # # Convert dimensions to cm
-    # HEIGHT = HEIGHT * resolution
-    # WIDTH = WIDTH * resolution
-
-    # Generate an isotropic activation map, radiating from the center
-    origin_x, origin_y = WIDTH / 2, HEIGHT / 2
-    # Assign an activation time to each pixel
-    for ix, iy in np.ndindex(act_map.shape):
-        # Compute the distance from the center (cm)
-        d = math.sqrt((abs(origin_x - ix) ** 2 + abs((origin_y - iy) ** 2)))
-        # Assign the time associated with that distance from the point of activation
-        act_map[ix, iy] = d / conduction_v_px
-        # Convert time from s to ms
-        act_map[ix, iy] = act_map[ix, iy] * 1000
+    # Generate an isotropic activation map (ms), radiating from the center
+    act_map = actmaps.generate(shape=(HEIGHT, WIDTH), cv=conduction_v, origins=[(WIDTH / 2, HEIGHT / 2)],
+                               resolution=resolution)
     print('Isotropic act. map generated. CV = ', conduction_v, ' cm/s')
     return act_map
 
@@ -83,33 +68,6 @@ def plot_map(axis, actmap, cmap, norm):
     return img
 
 
-def generate_actcurve(actmap, actmap_max):
-    # Flatten the activation map data into a 1-D array
-    actmap_flat = actmap.ravel()
-    # Remove the `nan` values
-    actmap_flat = actmap_flat[~np.isnan(actmap_flat)]
-
-    # Frame rate (FPS)
-    fps = 500
-    # Convert to frames / ms
-    fpms = fps / 1000
-    # Number of frames represented in this activation map
-    frames = int((np.nanmax(actmap_flat) - np.nanmin(actmap_flat)) * (1 / fpms))
-
-    # Create the bins for histogram calculation
-    xbins = np.linspace(start=0, stop=actmap_max.max(), num=frames)
-    # Calculate the histogram
-    hist = np.histogram(actmap_flat, xbins)
-    # a = np.hstack((rng.normal(size=1000), rng.normal(loc=5, scale=2, size=1000)))
-    # tissueact = 100 * np.cumsum(hist(tim,xbins))/allpts;
-
-    # Calculate cumulative sum % of tissue activation times
-    tissueact = 100 * np.cumsum(hist[0]) / actmap_flat.size
-    # An array for the x-axis while plotting the activation curve
-    x_axes = np.linspace(start=0, stop=actmap_max.max(), num=frames - 1)
-    return x_axes, tissueact
-
-
 def plot_actcurve(axis, x, y, color, ls='-', label=None, x_labels=False):
     axis.spines['top'].set_visible(False)
     axis.spines['right'].set_visible(False)
@@ -188,22 +146,16 @@ fast, slow = 95, 75
 # actMap_Young3_150 = generate_ActMap(conduction_v=45)
 # Import maps
 axActMap_Young1_250.set_ylabel('P1')
-actMap_Young1_250 = np.loadtxt('data/20190717-rata/ActMap-01-250_Vm.csv',
-                               delimiter=',', skiprows=0)   # P1
-actMap_Young1_150 = np.loadtxt('data/20190717-rata/ActMap-03-150_Vm.csv',
-                               delimiter=',', skiprows=0)   # P1
+actMap_Young1_250 = mapstore.load('data/20190717-rata/ActMap-01-250_Vm.csv')   # P1
+actMap_Young1_150 = mapstore.load('data/20190717-rata/ActMap-03-150_Vm.csv')   # P1
 
 axActMap_Young2_250.set_ylabel('P1')
-actMap_Young2_250 = np.loadtxt('data/20190730-rata/ActMap-02-250_Vm.csv',
-                               delimiter=',', skiprows=0)   # P1
-actMap_Young2_150 = np.loadtxt('data/20190730-rata/ActMap-04-150_Vm.csv',
-                               delimiter=',', skiprows=0)   # P1
+actMap_Young2_250 = mapstore.load('data/20190730-rata/ActMap-02-250_Vm.csv')   # P1
+actMap_Young2_150 = mapstore.load('data/20190730-rata/ActMap-04-150_Vm.csv')   # P1
 
 axActMap_Young3_250.set_ylabel('P2')
-actMap_Young3_250 = np.loadtxt('data/20190718-rata/ActMap-02-250_Vm.csv',
-                               delimiter=',', skiprows=0)   # P2
-actMap_Young3_150 = np.loadtxt('data/20190718-rata/ActMap-04-150_Vm.csv',
-                               delimiter=',', skiprows=0)   # P2
+actMap_Young3_250 = mapstore.load('data/20190718-rata/ActMap-02-250_Vm.csv')   # P2
+actMap_Young3_150 = mapstore.load('data/20190718-rata/ActMap-04-150_Vm.csv')   # P2
 
 # Oldish section
 # actMap_Old1_250 = generate_ActMap(conduction_v=55)
@@ -214,23 +166,17 @@ actMap_Young3_150 = np.loadtxt('data/20190718-rata/ActMap-04-150_Vm.csv',
 # actMap_Old3_150 = generate_ActMap(conduction_v=slow)
 # Import maps
 axActMap_Old1_250.set_ylabel('P9')
-actMap_Old1_250 = np.loadtxt('data/20190725-rata/ActMap-02-250_Vm.csv',
-                               delimiter=',', skiprows=0)   # P9
-actMap_Old1_150 = np.loadtxt('data/20190725-rata/ActMap-04-150_Vm.csv',
-                               delimiter=',', skiprows=0)   # P9
+actMap_Old1_250 = mapstore.load('data/20190725-rata/ActMap-02-250_Vm.csv')   # P9
+actMap_Old1_150 = mapstore.load('data/20190725-rata/ActMap-04-150_Vm.csv')   # P9
 
 
 axActMap_Old2_250.set_ylabel('P10')
-actMap_Old2_250 = np.loadtxt('data/20190404-ratb/ActMap-01-250_Vm.csv',
-                               delimiter=',', skiprows=0)   # P9
-actMap_Old2_150 = np.loadtxt('data/20190404-ratb/ActMap-11-150_Vm.csv',
-                               delimiter=',', skiprows=0)   # P9
+actMap_Old2_250 = mapstore.load('data/20190404-ratb/ActMap-01-250_Vm.csv')   # P9
+actMap_Old2_150 = mapstore.load('data/20190404-ratb/ActMap-11-150_Vm.csv')   # P9
 
 axActMap_Old3_250.set_ylabel('P14')
-actMap_Old3_250 = np.loadtxt('data/20190404-rata/ActMap-02-250_Vm.csv',
-                               delimiter=',', skiprows=0)   # P9
-actMap_Old3_150 = np.loadtxt('data/20190404-rata/ActMap-12-150_Vm.csv',
-                               delimiter=',', skiprows=0)   # P9
+actMap_Old3_250 = mapstore.load('data/20190404-rata/ActMap-02-250_Vm.csv')   # P9
+actMap_Old3_150 = mapstore.load('data/20190404-rata/ActMap-12-150_Vm.csv')   # P9
 
 
 # Import heart image
@@ -295,49 +241,45 @@ cb1.ax.xaxis.set_major_locator(ticker.LinearLocator(3))
 cb1.ax.xaxis.set_minor_locator(ticker.LinearLocator(5))
 cb1.ax.tick_params(labelsize=fontsize4)
 
-# Generate activation curves
-# Youngish section
-actCurve_Young1_250_x, actCurve_Young1_250 = generate_actcurve(actMap_Young1_250, actMapMax)
-actCurve_Young1_150_x, actCurve_Young1_150 = generate_actcurve(actMap_Young1_150, actMapMax)
-actCurve_Young2_250_x, actCurve_Young2_250 = generate_actcurve(actMap_Young2_250, actMapMax)
-actCurve_Young2_150_x, actCurve_Young2_150 = generate_actcurve(actMap_Young2_150, actMapMax)
-actCurve_Young3_250_x, actCurve_Young3_250 = generate_actcurve(actMap_Young3_250, actMapMax)
-actCurve_Young3_150_x, actCurve_Young3_150 = generate_actcurve(actMap_Young3_150, actMapMax)
-# Oldish section
-actCurve_Old1_250_x, actCurve_Old1_250 = generate_actcurve(actMap_Old1_250, actMapMax)
-actCurve_Old1_150_x, actCurve_Old1_150 = generate_actcurve(actMap_Old1_150, actMapMax)
-actCurve_Old2_250_x, actCurve_Old2_250 = generate_actcurve(actMap_Old2_250, actMapMax)
-actCurve_Old2_150_x, actCurve_Old2_150 = generate_actcurve(actMap_Old2_150, actMapMax)
-actCurve_Old3_250_x, actCurve_Old3_250 = generate_actcurve(actMap_Old3_250, actMapMax)
-actCurve_Old3_150_x, actCurve_Old3_150 = generate_actcurve(actMap_Old3_150, actMapMax)
+# Generate activation curves, binned the same from 0 to the latest activation time
+actCurves = actmaps.activation_curves(actMaps, bins=actmaps.curve_bins(actMapMax, fps=500))
+print('Times to {} % activation (ms):'.format(actCurves.levels))
+print(np.round(actCurves.times_to, 1))
+actCurve_x = actCurves.times
+(actCurve_Young1_250, actCurve_Young1_150,
+ actCurve_Young2_250, actCurve_Young2_150,
+ actCurve_Young3_250, actCurve_Young3_150,
+ actCurve_Old1_250, actCurve_Old1_150,
+ actCurve_Old2_250, actCurve_Old2_150,
+ actCurve_Old3_250, actCurve_Old3_150) = actCurves.percents
 
 # Plot Pacing activation curves
 # Red: Fast, Black: Slow
 # Youngish section
-plot_actcurve(axis=axActCurve_Young1, x=actCurve_Young1_250_x, y=actCurve_Young1_250, color=colors_actcurves[0])
-plot_actcurve(axis=axActCurve_Young1, x=actCurve_Young1_150_x, y=actCurve_Young1_150, color=colors_actcurves[1])
+plot_actcurve(axis=axActCurve_Young1, x=actCurve_x, y=actCurve_Young1_250, color=colors_actcurves[0])
+plot_actcurve(axis=axActCurve_Young1, x=actCurve_x, y=actCurve_Young1_150, color=colors_actcurves[1])
 axActCurve_Young1.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed', lw=0.5)
 
-plot_actcurve(axis=axActCurve_Young2, x=actCurve_Young2_250_x, y=actCurve_Young2_250, color=colors_actcurves[0])
-plot_actcurve(axis=axActCurve_Young2, x=actCurve_Young2_150_x, y=actCurve_Young2_150, color=colors_actcurves[1])
+plot_actcurve(axis=axActCurve_Young2, x=actCurve_x, y=actCurve_Young2_250, color=colors_actcurves[0])
+plot_actcurve(axis=axActCurve_Young2, x=actCurve_x, y=actCurve_Young2_150, color=colors_actcurves[1])
 axActCurve_Young2.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed', lw=0.5)
 
-plot_actcurve(axis=axActCurve_Young3, x=actCurve_Young3_250_x, y=actCurve_Young3_250, color=colors_actcurves[0])
-plot_actcurve(axis=axActCurve_Young3, x=actCurve_Young3_150_x, y=actCurve_Young3_150, color=colors_actcurves[1])
+plot_actcurve(axis=axActCurve_Young3, x=actCurve_x, y=actCurve_Young3_250, color=colors_actcurves[0])
+plot_actcurve(axis=axActCurve_Young3, x=actCurve_x, y=actCurve_Young3_150, color=colors_actcurves[1])
 axActCurve_Young3.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed', lw=0.5)
 
 # Oldish section
-plot_actcurve(axis=axActCurve_Old1, x=actCurve_Old1_250_x, y=actCurve_Old1_250, color=colors_actcurves[0])
-plot_actcurve(axis=axActCurve_Old1, x=actCurve_Old1_150_x, y=actCurve_Old1_150, color=colors_actcurves[1])
+plot_actcurve(axis=axActCurve_Old1, x=actCurve_x, y=actCurve_Old1_250, color=colors_actcurves[0])
+plot_actcurve(axis=axActCurve_Old1, x=actCurve_x, y=actCurve_Old1_150, color=colors_actcurves[1])
 axActCurve_Old1.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed', lw=0.5)
 
-plot_actcurve(axis=axActCurve_Old2, x=actCurve_Old2_250_x, y=actCurve_Old2_250, color=colors_actcurves[0])
-plot_actcurve(axis=axActCurve_Old2, x=actCurve_Old2_150_x, y=actCurve_Old2_150, color=colors_actcurves[1])
+plot_actcurve(axis=axActCurve_Old2, x=actCurve_x, y=actCurve_Old2_250, color=colors_actcurves[0])
+plot_actcurve(axis=axActCurve_Old2, x=actCurve_x, y=actCurve_Old2_150, color=colors_actcurves[1])
 axActCurve_Old2.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed', lw=0.5)
 
-plot_actcurve(axis=axActCurve_Old3, x=actCurve_Old3_250_x, y=actCurve_Old3_250, color=colors_actcurves[0],
+plot_actcurve(axis=axActCurve_Old3, x=actCurve_x, y=actCurve_Old3_250, color=colors_actcurves[0],
               x_labels=True)
-plot_actcurve(axis=axActCurve_Old3, x=actCurve_Old3_150_x, y=actCurve_Old3_150, color=colors_actcurves[1],
+plot_actcurve(axis=axActCurve_Old3, x=actCurve_x, y=actCurve_Old3_150, color=colors_actcurves[1],
               x_labels=True)
 axActCurve_Old3.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed', lw=0.5)
 
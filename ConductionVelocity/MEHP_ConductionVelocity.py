@@ -1,4 +1,5 @@
 import numpy as np
+from AnalysisTools import mapstore
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 from matplotlib import ticker
@@ -25,24 +26,15 @@ context_colors = ['0.8', '0.45']
 context_pal = sns.color_palette(context_colors)
 
 # Load activation maps
-actMapsCTRLpost = {140: np.fliplr(np.rot90(np.loadtxt('data/ActMap-20180619-rata-33.csv',
-                                                      delimiter=',', skiprows=0))),
-                   190: np.fliplr(np.rot90(np.loadtxt('data/ActMap-20180619-rata-28.csv',
-                                                      delimiter=',', skiprows=0))),
-                   240: np.fliplr(np.rot90(np.loadtxt('data/ActMap-20180619-rata-23.csv',
-                                                      delimiter=',', skiprows=0)))}
-actMapsMEHPbase = {140: np.loadtxt('data/ActMap-20180522-rata-15.csv',
-                                   delimiter=',', skiprows=0),
-                   190: np.loadtxt('data/ActMap-20180522-rata-10.csv',
-                                   delimiter=',', skiprows=0),
-                   240: np.loadtxt('data/ActMap-20180522-rata-05.csv',
-                                   delimiter=',', skiprows=0)}
-actMapsMEHPpost = {140: np.loadtxt('data/ActMap-20180522-rata-38.csv',
-                                   delimiter=',', skiprows=0),
-                   190: np.loadtxt('data/ActMap-20180522-rata-33.csv',
-                                   delimiter=',', skiprows=0),
-                   240: np.loadtxt('data/ActMap-20180522-rata-28.csv',
-                                   delimiter=',', skiprows=0)}
+actMapsCTRLpost = {140: mapstore.load('data/ActMap-20180619-rata-33.csv', rot90=1, fliplr=True),
+                   190: mapstore.load('data/ActMap-20180619-rata-28.csv', rot90=1, fliplr=True),
+                   240: mapstore.load('data/ActMap-20180619-rata-23.csv', rot90=1, fliplr=True)}
+actMapsMEHPbase = {140: mapstore.load('data/ActMap-20180522-rata-15.csv'),
+                   190: mapstore.load('data/ActMap-20180522-rata-10.csv'),
+                   240: mapstore.load('data/ActMap-20180522-rata-05.csv')}
+actMapsMEHPpost = {140: mapstore.load('data/ActMap-20180522-rata-38.csv'),
+                   190: mapstore.load('data/ActMap-20180522-rata-33.csv'),
+                   240: mapstore.load('data/ActMap-20180522-rata-28.csv')}
 
 # Determine max value across all activation maps
 actMapMax = 0
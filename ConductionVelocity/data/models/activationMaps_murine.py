@@ -2,12 +2,12 @@
 Generates model activation maps and activation curves of murine epicardial tissue.
 """
 
-import math
 import random
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
+from AnalysisTools import actmaps
 import ScientificColourMaps5 as scm
 
 
@@ -28,52 +28,16 @@ def generate_ActMap(conduction_v):
     # Dimensions of model data (px)
     HEIGHT = 200
     WIDTH = 200
-    # Allocate space for the Activation Map
-    act_map = np.zeros(shape=(WIDTH, HEIGHT))
     # Spatial resolution (cm/px)
     resolution = 0.005   # 4 cm / 200 px
 
-    # Convert conduction velocity from cm/s to px/s
-    conduction_v = conduction_v / resolution
-    # # Convert dimensions to cm
-    # HEIGHT = HEIGHT * resolution
-    # WIDTH = WIDTH * resolution
-
-    # Generate an isotropic activation map, radiating from the center
-    origin_x, origin_y = WIDTH / 2, HEIGHT / 2
-    # Assign an activation time to each pixel
-    for ix, iy in np.ndindex(act_map.shape):
-        # Compute the distance from the center (cm)
-        d = math.sqrt((abs(origin_x - ix) ** 2 + abs((origin_y - iy) ** 2)))
-        # Assign the time associated with that distance from the point of activation
-        act_map[ix, iy] = d / conduction_v
-        # Convert time from s to ms
-        act_map[ix, iy] = act_map[ix, iy] * 1000
+    # Generate an isotropic activation map (ms), radiating from the center
+    act_map = actmaps.generate(shape=(WIDTH, HEIGHT), cv=conduction_v, origins=[(WIDTH / 2, HEIGHT / 2)],
+                               resolution=resolution)
     print('Isotropic act. map generated')
     return act_map
 
 
-def generate_ActCurve(actMap):
-    # Frame rate (FPS)
-    fps = 500
-    # frames / ms
-    fpms = fps / 1000
-    # Number of frames
-    frames = int((np.nanmax(actMap) - np.nanmin(actMap)) * (1 / fpms))
-
-    # Bins for histogram calculation
-    xbins = np.linspace(start=0, stop=actMap.max(), num=frames)
-    hist = np.histogram(actMap, xbins)
-    # a = np.hstack((rng.normal(size=1000), rng.normal(loc=5, scale=2, size=1000)))
-    # tissueact = 100 * np.cumsum(hist(tim,xbins))/allpts;
-
-    tissueact = 100 * np.cumsum(hist[0]) / actMap.size
-
-    # A array for plotting the activation curve
-    x_axes = np.linspace(start=0, stop=actMap.max(), num=frames-1)
-    return x_axes, tissueact
-
-
 # Setup the figure
 fig = plt.figure()  # _ x _ inch page
 # fig = plt.figure(figsize=(8, 5))  # _ x _ inch page
@@ -138,15 +102,18 @@ cb1 = plt.colorbar(img_actMap_Slow, cax=ax_ins1, orientation="horizontal")
 cb1.set_label('Activation Time (ms)', fontsize=8)
 
 # Generate activation curves
-actCurve_Fast_x, actCurve_Fast = generate_ActCurve(actMap_Fast)
-actCurve_Slow_x, actCurve_Slow = generate_ActCurve(actMap_Slow)
+actCurves = actmaps.activation_curves([actMap_Fast, actMap_Slow], fps=500)
+print('Times to {} % activation (ms):'.format(actCurves.levels))
+print(np.round(actCurves.times_to, 1))
+actCurve_x = actCurves.times
+actCurve_Fast, actCurve_Slow = actCurves.percents
 # Plot activation curves
 axis_actCurve = fig.add_subplot(gs0[2])
 axis_actCurve.set_ylabel('Tissue Activation (%)', fontsize=10)
 axis_actCurve.spines['top'].set_visible(False)
 axis_actCurve.spines['right'].set_visible(False)
-axis_actCurve.plot(actCurve_Fast_x, actCurve_Fast, 'k')
-axis_actCurve.plot(actCurve_Slow_x, actCurve_Slow, 'r')
+axis_actCurve.plot(actCurve_x, actCurve_Fast, 'k')
+axis_actCurve.plot(actCurve_x, actCurve_Slow, 'r')
 axis_actCurve.hlines(50, xmin=0, xmax=actMapMax, linestyles='dashed')
 
 fig.show()
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.signal as sig
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 import matplotlib.image as mpimg
@@ -10,6 +9,7 @@ from matplotlib.patches import Circle, Rectangle
 from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
 import matplotlib.font_manager as fm
+from AnalysisTools import traces, mapstore, durations, beats, results
 import ScientificColourMaps5 as SCMaps
 
 MAX_COUNTS_16BIT = 65536
@@ -28,6 +28,10 @@ fontsize1, fontsize2, fontsize3, fontsize4 = [14, 10, 8, 6]
 X_CROP = [40, 20]   # to cut from left, right
 Y_CROP = [80, 50]   # to cut from bottom, top
 SCALE_cm_px = 0.016373
+# Parsed traces and ensembles are cached by content, so layout edits don't reprocess them
+cache = results.Cache()
+load_csv = cache.memoize(np.genfromtxt, inputs=['fname'])
+ensemble_beats = cache.memoize(beats.ensemble)
 
 
 def plot_heart(axis, heart_image, scale=True, scale_text=True, rois=None):
@@ -105,62 +109,23 @@ def plot_trace(axis, data, imagej=False, fps=None, x_span=0, x_end=None,
     data_x, data_y = 0, 0
 
     if imagej:
-        if not x_end:
-            x_end = len(data)   # Includes X,Y header row (nan,nan)
-        x_start = x_end - x_span
-
-        # data_x = data[x_start:x_end, 0]             # All rows of the first column (skip X,Y header row)
-        data_x = data[1:x_span + 1, 0]             # All rows of the first column (skip X,Y header row)
+        data_x, data_y_counts = traces.imagej_window(data, x_span, x_end)
         if fps:
             # convert to ms
-            data_x = ((data_x - 1) / fps) * 1000    # ensure range is 0 - max
-            # data_x = data_x.astype(int)
+            data_x = traces.frames_to_ms(data_x, fps)    # ensure range is 0 - max
             # axis.xaxis.set_major_locator(ticker.IndexLocator(base=1000, offset=500))
         # axis.xaxis.set_major_locator(ticker.AutoLocator())
         # axis.xaxis.set_minor_locator(ticker.AutoMinorLocator())
 
-        data_y_counts = data[x_start:x_end, 1].astype(int)     # rows of the first column (skip X,Y header row)
-        counts_min = data_y_counts.min()
-        # data_y_counts_delta = data_y.max() - data_y_.min()
-        # MAX_COUNTS_16BIT
-
         if frac:
-            # # convert y-axis from counts to percentage range of max counts
-            # data_y = data_y_counts / MAX_COUNTS_16BIT * 100
-            # axis.yaxis.set_major_formatter(ticker.FormatStrFormatter('%.2f'))
-
             # Convert y-axis from counts to dF / F: (F_t - F0) / F0
             axis.yaxis.set_major_formatter(ticker.FormatStrFormatter('%.2f'))
-            # Get max and min
-            # data_min, data_max = np.nanmin(data_y_counts), np.nanmax(data_y_counts)
-            f_0 = counts_min
-            f_t = data_y_counts
-            data_y = (f_t - f_0) / f_0
-        else:
-            # Shift y-axis counts to start at zero
-            data_y = data_y_counts - counts_min
-
         if filter_lp:
             print('* Filtering data: Low Pass')
-            dt = 1 / 408
-            freq = 75
-
-            fs = 1 / dt
-            wn = (freq / (fs / 2))
-            [b, a] = sig.butter(5, wn)
-            data_y = sig.filtfilt(b, a, data_y)
-            print('* Data Filtered')
-
-        if norm:
-            # Normalize each trace
-            # Get max and min
-            data_min, data_max = np.nanmin(data_y), np.nanmax(data_y)
-            data_y = np.interp(data_y, (data_min, data_max), (0, 1))
-            if invert:
-                data_y = 1 - data_y  # Invert a normalized signal
-        else:
-            if invert:
-                print('!***! Can\'t invert a non-normalized trace!')
+        if invert and not norm:
+            print('!***! Can\'t invert a non-normalized trace!')
+        data_y = traces.process(data_y_counts, fps=fps or 408, frac=frac,
+                                filter_lp=filter_lp, norm=norm, invert=invert and norm)
 
         axis.tick_params(labelsize=fontsize4)
         if x_ticks:
@@ -194,27 +159,18 @@ def plot_trace(axis, data, imagej=False, fps=None, x_span=0, x_end=None,
 
 
 def plot_trace_overlay(axis, trace_vm, trace_ca):
-    # Normalize, Filter, and Plot a Vm and a Ca trace on the same plot
-    idx_end = len(trace_vm) - 60
-    idx_span = 180    # 280 ~= 2 paced transients
-    # idx_span = 120
-    # idx_span = idx_end-512
-    # Zoom
-
-    # idx_end = len(trace_vm) - 120
-    # idx_span = 128
-
-    trace_vm_x, trace_vm_y = plot_trace(axis, trace_vm, imagej=True, fps=408, x_span=idx_span, x_end=idx_end,
-                                        norm=True, invert=True, filter_lp=True,
-                                        )
-    trace_ca_x, trace_ca_y = plot_trace(axis, trace_ca, imagej=True, fps=408, x_span=idx_span, x_end=idx_end,
-                                        norm=True, filter_lp=True,
-                                        )
-    # Set the linewidth of each trace
-    for idx, line in enumerate(axis.get_lines()):
-        line.set_linewidth(0.5)
-        line.set_color(colors_signals[idx])
-        line.set_linestyle(lines_signals[idx])
+    # Filter, ensemble average, normalize, and plot a Vm and a Ca trace on the same plot
+    # Beats of both signals are aligned on the Vm upstrokes to keep the Vm - Ca delay
+    counts = np.vstack([trace_vm[1:, 1], trace_ca[1:, 1]])   # Skip X,Y header row
+    signals = traces.process(counts, fps=408, filter_lp=True)
+    ensemble = ensemble_beats(signals, fps=408, invert=[True, False], reference=0)
+    print('* Ensemble averaged {} Vm and {} Ca beats'.format(*ensemble.n_beats))
+    traces_norm = traces.normalize(ensemble.mean)
+    traces_norm[0] = 1 - traces_norm[0]     # Invert Vm
+    times = ensemble.times - ensemble.times[0]
+    trace_vm_y, trace_ca_y = traces_norm
+    for idx, trace_y in enumerate(traces_norm):
+        axis.plot(times, trace_y, color=colors_signals[idx], linestyle=lines_signals[idx], linewidth=0.5)
 
     # axis.xaxis.set_major_locator(ticker.MultipleLocator(100))
     # axis.xaxis.set_minor_locator(ticker.MultipleLocator((int(100/4))))
@@ -366,15 +322,15 @@ axImage_Ca.text(axImage_label_x, axImage_label_y, 'Ca', transform=axImage_Ca.tra
 
 # Import Traces
 # Load signal data, columns: index, fluorescence (counts)
-Trace_Vm_RV = {1: np.genfromtxt('data/20190322-pigb/01-350_Vm_15x15-398x206.csv', delimiter=','),
-               5: np.genfromtxt('data/20190322-pigb/01-350_Vm_30x30-398x206.csv', delimiter=',')}
-Trace_Vm_LV = {1: np.genfromtxt('data/20190322-pigb/01-350_Vm_15x15-198x324.csv', delimiter=','),
-               5: np.genfromtxt('data/20190322-pigb/01-350_Vm_30x30-198x324.csv', delimiter=',')}
-
-Trace_Ca_RV = {1: np.genfromtxt('data/20190322-pigb/01-350_Ca_15x15-398x206.csv', delimiter=','),
-               5: np.genfromtxt('data/20190322-pigb/01-350_Ca_30x30-398x206.csv', delimiter=',')}
-Trace_Ca_LV = {1: np.genfromtxt('data/20190322-pigb/01-350_Ca_15x15-198x324.csv', delimiter=','),
-               5: np.genfromtxt('data/20190322-pigb/01-350_Ca_30x30-198x324.csv', delimiter=',')}
+Trace_Vm_RV = {1: load_csv('data/20190322-pigb/01-350_Vm_15x15-398x206.csv', delimiter=','),
+               5: load_csv('data/20190322-pigb/01-350_Vm_30x30-398x206.csv', delimiter=',')}
+Trace_Vm_LV = {1: load_csv('data/20190322-pigb/01-350_Vm_15x15-198x324.csv', delimiter=','),
+               5: load_csv('data/20190322-pigb/01-350_Vm_30x30-198x324.csv', delimiter=',')}
+
+Trace_Ca_RV = {1: load_csv('data/20190322-pigb/01-350_Ca_15x15-398x206.csv', delimiter=','),
+               5: load_csv('data/20190322-pigb/01-350_Ca_30x30-398x206.csv', delimiter=',')}
+Trace_Ca_LV = {1: load_csv('data/20190322-pigb/01-350_Ca_15x15-198x324.csv', delimiter=','),
+               5: load_csv('data/20190322-pigb/01-350_Ca_30x30-198x324.csv', delimiter=',')}
 # Plot paced traces
 axTraces_Vm_RV.set_title('15x15 Pixel', fontsize=fontsize2, weight='semibold')
 axTraces_Vm_RV_5x5.set_title('30x30 Pixel', fontsize=fontsize2, weight='semibold')
@@ -412,22 +368,18 @@ plot_trace(axTraces_Ca_LV_5x5, Trace_Ca_LV[5], imagej=True, fps=408, x_span=axTr
 # Plot Analysis Section
 # Plot trace overlay
 axTracesOverlay.set_title('Dual Signals', fontsize=fontsize2, weight='semibold')
-Trace_overlay = {'Vm': np.genfromtxt('data/20190322-pigb/20-NSR_Vm_30x30-231x317.csv', delimiter=','),
-                 'Ca': np.genfromtxt('data/20190322-pigb/20-NSR_Ca_30x30-931x317.csv', delimiter=',')}
+Trace_overlay = {'Vm': load_csv('data/20190322-pigb/20-NSR_Vm_30x30-231x317.csv', delimiter=','),
+                 'Ca': load_csv('data/20190322-pigb/20-NSR_Ca_30x30-931x317.csv', delimiter=',')}
 plot_trace_overlay(axTracesOverlay, trace_vm=Trace_overlay['Vm'], trace_ca=Trace_overlay['Ca'])
 # Import heart images
 heartAnalysis_Vm = heart_Vm
 heartAnalysis_Ca = heart_Ca
 # Import activation maps
-actMapVm = np.rot90(np.loadtxt('data/20190322-pigb/ActMaps/ActMap-01-350_Vm.csv',
-                               delimiter=',', skiprows=0))
-actMapCa = np.rot90(np.loadtxt('data/20190322-pigb/ActMaps/ActMap-01-350_Ca.csv',
-                               delimiter=',', skiprows=0))
+actMapVm = mapstore.load('data/20190322-pigb/ActMaps/ActMap-01-350_Vm.csv', rot90=1)
+actMapCa = mapstore.load('data/20190322-pigb/ActMaps/ActMap-01-350_Ca.csv', rot90=1)
 # Import duration maps
-durMapVm = np.rot90(np.loadtxt('data/20190322-pigb/APDMaps/APD-01-350_Vm.csv',
-                               delimiter=',', skiprows=0))
-durMapCa = np.rot90(np.loadtxt('data/20190322-pigb/APDMaps/APD-01-350_Ca.csv',
-                               delimiter=',', skiprows=0))
+durMapVm = mapstore.load('data/20190322-pigb/APDMaps/APD-01-350_Vm.csv', rot90=1)
+durMapCa = mapstore.load('data/20190322-pigb/APDMaps/APD-01-350_Ca.csv', rot90=1)
 # Import restitution curve image
 # restitution_img = mpimg.imread('data/Pigs_RestitutionCurve_APD80_CAD80.png')
 
@@ -437,12 +389,8 @@ durMapCa = np.rot90(np.loadtxt('data/20190322-pigb/APDMaps/APD-01-350_Ca.csv',
 # Mask  low-high durations, replace with NaNs
 durMap_min = 100    # ms
 durMap_max = 300    # ms
-durMapVm = np.ma.masked_less(durMapVm, durMap_min)
-durMapVm = np.ma.masked_greater(durMapVm, durMap_max)
-durMapVm.filled(np.nan)
-durMapCa = np.ma.masked_less(durMapCa, durMap_min)
-durMapCa = np.ma.masked_greater(durMapCa, durMap_max)
-durMapCa.filled(np.nan)
+durMapVm = durations.within(durMapVm, durMap_min, durMap_max)
+durMapCa = durations.within(durMapCa, durMap_min, durMap_max)
 
 # Determine max value across all activation maps
 print('Activation Map max values:')
@@ -1,5 +1,4 @@
 import numpy as np
-import scipy.signal as sig
 from decimal import *
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
@@ -10,6 +9,7 @@ from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
 import matplotlib.font_manager as fm
 import colorsys
+from AnalysisTools import traces
 import ScientificColourMaps5 as scm
 import warnings
 
@@ -97,62 +97,23 @@ def plot_trace(axis, data, imagej=False, fps=None, x_span=0, x_end=None,
     data_x, data_y = 0, 0
 
     if imagej:
-        if not x_end:
-            x_end = len(data)   # Includes X,Y header row (nan,nan)
-        x_start = x_end - x_span
-
-        # data_x = data[x_start:x_end, 0]             # All rows of the first column (skip X,Y header row)
-        data_x = data[1:x_span + 1, 0]             # All rows of the first column (skip X,Y header row)
+        data_x, data_y_counts = traces.imagej_window(data, x_span, x_end)
         if fps:
             # convert to ms
-            data_x = ((data_x - 1) / fps) * 1000    # ensure range is 0 - max
-            # data_x = data_x.astype(int)
+            data_x = traces.frames_to_ms(data_x, fps)    # ensure range is 0 - max
             # axis.xaxis.set_major_locator(ticker.IndexLocator(base=1000, offset=500))
         # axis.xaxis.set_major_locator(ticker.AutoLocator())
         # axis.xaxis.set_minor_locator(ticker.AutoMinorLocator())
 
-        data_y_counts = data[x_start:x_end, 1].astype(int)     # rows of the first column (skip X,Y header row)
-        counts_min = data_y_counts.min()
-        # data_y_counts_delta = data_y.max() - data_y_.min()
-        # MAX_COUNTS_16BIT
-
         if frac:
-            # # convert y-axis from counts to percentage range of max counts
-            # data_y = data_y_counts / MAX_COUNTS_16BIT * 100
-            # axis.yaxis.set_major_formatter(ticker.FormatStrFormatter('%.2f'))
-
             # Convert y-axis from counts to dF / F: (F_t - F0) / F0
             axis.yaxis.set_major_formatter(ticker.FormatStrFormatter('%.2f'))
-            # Get max and min
-            # data_min, data_max = np.nanmin(data_y_counts), np.nanmax(data_y_counts)
-            f_0 = counts_min
-            f_t = data_y_counts
-            data_y = (f_t - f_0) / f_0
-        else:
-            # Shift y-axis counts to start at zero
-            data_y = data_y_counts - counts_min
-
         if filter_lp:
             print('* Filtering data: Low Pass')
-            dt = 1 / 408
-            freq = 75
-
-            fs = 1 / dt
-            wn = (freq / (fs / 2))
-            [b, a] = sig.butter(5, wn)
-            data_y = sig.filtfilt(b, a, data_y)
-            print('* Data Filtered')
-
-        if norm:
-            # Normalize each trace
-            # Get max and min
-            data_min, data_max = np.nanmin(data_y), np.nanmax(data_y)
-            data_y = np.interp(data_y, (data_min, data_max), (0, 1))
-            if invert:
-                data_y = 1 - data_y  # Invert a normalized signal
-        else:
-            if invert:
-                print('!***! Can\'t invert a non-normalized trace!')
+        if invert and not norm:
+            print('!***! Can\'t invert a non-normalized trace!')
+        data_y = traces.process(data_y_counts, fps=fps or 408, frac=frac,
+                                filter_lp=filter_lp, norm=norm, invert=invert and norm)
 
         axis.tick_params(labelsize=fontsize4)
         if x_ticks:
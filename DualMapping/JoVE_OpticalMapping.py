@@ -1,6 +1,5 @@
 import cv2
 import numpy as np
-from decimal import *
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 from matplotlib import ticker
@@ -9,6 +8,7 @@ from mpl_toolkits.axes_grid1.inset_locator import inset_axes
 from mpl_toolkits.axes_grid1.anchored_artists import AnchoredSizeBar
 import matplotlib.font_manager as fm
 import colorsys
+from AnalysisTools import traces, windows, mapstore
 import ScientificColourMaps5 as scm
 import warnings
 
@@ -166,33 +166,20 @@ def plot_ActMapCa(axis, actMap):
 
 def plot_TracesVm(axis, data, time_start=0.0, idx_start=None, time_window=None, time_end=None, idx_end=None):
     # Setup data and time (ms) variables
-    data_Vm = []
-    traces_count = data.shape[1] - 1  # Number of columns after time column
     times_Vm = (data[:, 0]) * 1000  # seconds to ms
     time_start, time_window = time_start * 1000, time_window * 1000
     # Find index of first value after start time
-    for trace_idx, time in enumerate(times_Vm):
-        if time < time_start:
-            pass
-        else:
-            idx_start = trace_idx
-            break
+    idx_start = windows.first_index(times_Vm, time_start)
 
     if time_window:
         # Find index of first value after end time
-        for trace_idx, time in enumerate(times_Vm):
-            if time < time_start + time_window:
-                pass
-            else:
-                idx_end = trace_idx
-                break
-        # Convert possibly strange floats to rounded Decimals
-        time_start, time_window = Decimal(time_start).quantize(Decimal('.001'), rounding=ROUND_UP), \
-                                  Decimal(time_window).quantize(Decimal('.001'), rounding=ROUND_UP)
+        idx_end = windows.first_index(times_Vm, time_start + time_window)
+        # Round possibly strange floats up to 0.001 ms
+        time_start, time_window = windows.round_up(time_start), windows.round_up(time_window)
         # Slice time array based on indices
         times_Vm = times_Vm[idx_start:idx_end]
         time_end = time_start + time_window
-        axis.set_xlim([float(time_start), float(time_end)])
+        axis.set_xlim([time_start, time_end])
 
     # Prepare axis for plotting
     axis.spines['right'].set_visible(False)
@@ -236,24 +223,16 @@ def plot_TracesVm(axis, data, time_start=0.0, idx_start=None, time_window=None,
     # Plot each trace
     # BUT cutoff all but the first trace after a chose time
     extra_trace_cutoff = 335
-    extra_trace_cutoff_idx = None
     # Find index of first value after end time
-    for idx, time in enumerate(times_Vm):
-        if time < time_start + extra_trace_cutoff:
-            pass
-        else:
-            extra_trace_cutoff_idx = idx
-            break
-
-    for trace_idx in range(traces_count):
-        trace = data[:, trace_idx + 1]
-        if time_window:
-            trace = trace[idx_start:idx_end]
-        # Normalize each trace
-        data_min, data_max = np.nanmin(trace), np.nanmax(trace)
-        trace = np.interp(trace, (data_min, data_max), (0, 1))
-        data_Vm.append(trace)
+    extra_trace_cutoff_idx = windows.first_index(times_Vm, time_start + extra_trace_cutoff)
 
+    traces_window = data[:, 1:].T
+    if time_window:
+        traces_window = traces_window[:, idx_start:idx_end]
+    # Normalize each trace
+    data_Vm = traces.normalize(traces_window)
+
+    for trace_idx, trace in enumerate(data_Vm):
         if trace_idx is 0:
             axis.plot(times_Vm, trace,
                       color=colorsROI_VmRAW[trace_idx], linewidth=2, label='Base')
@@ -264,33 +243,20 @@ def plot_TracesVm(axis, data, time_start=0.0, idx_start=None, time_window=None,
 
 def plot_TracesCa(axis, data, time_start=0.0, idx_start=None, time_window=None, time_end=None, idx_end=None):
     # Setup data and time (ms) variables
-    data_Ca = []
-    traces_count = data.shape[1] - 1  # Number of columns after time column
     times_Ca = (data[:, 0]) * 1000  # seconds to ms
     time_start, time_window = time_start * 1000, time_window * 1000
     # Find index of first value after start time
-    for idx, time in enumerate(times_Ca):
-        if time < time_start:
-            pass
-        else:
-            idx_start = idx
-            break
+    idx_start = windows.first_index(times_Ca, time_start)
 
     if time_window:
         # Find index of first value after end time
-        for idx, time in enumerate(times_Ca):
-            if time < time_start + time_window:
-                pass
-            else:
-                idx_end = idx
-                break
-        # Convert possibly strange floats to rounded Decimals
-        time_start, time_window = Decimal(time_start).quantize(Decimal('.001'), rounding=ROUND_UP), \
-                                  Decimal(time_window).quantize(Decimal('.001'), rounding=ROUND_UP)
+        idx_end = windows.first_index(times_Ca, time_start + time_window)
+        # Round possibly strange floats up to 0.001 ms
+        time_start, time_window = windows.round_up(time_start), windows.round_up(time_window)
         # Slice time array based on indices
         times_Ca = times_Ca[idx_start:idx_end]
         time_end = time_start + time_window
-        axis.set_xlim([float(time_start), float(time_end)])
+        axis.set_xlim([time_start, time_end])
 
     # Prepare axis for plotting
     axis.spines['right'].set_visible(False)
@@ -315,26 +281,18 @@ def plot_TracesCa(axis, data, time_start=0.0, idx_start=None, time_window=None,
     # Plot each trace
     # BUT cutoff all but the first trace after a chose time
     extra_trace_cutoff = 335
-    extra_trace_cutoff_idx = None
     # Find index of first value after end time
-    for idx, time in enumerate(times_Ca):
-        if time < time_start + extra_trace_cutoff:
-            pass
-        else:
-            extra_trace_cutoff_idx = idx
-            break
-
-    for trace_idx in range(traces_count):
-        trace = data[:, trace_idx + 1]
-        if time_window:
-            trace = trace[idx_start:idx_end]
-        # Normalize each trace
-        data_min, data_max = np.nanmin(trace), np.nanmax(trace)
-        trace = np.interp(trace, (data_min, data_max), (0, 1))
-        trace = 1 - trace  # Need to invert, accidentally exported as voltage??
-        data_Ca.append(trace)
-        # Plot each trace
+    extra_trace_cutoff_idx = windows.first_index(times_Ca, time_start + extra_trace_cutoff)
 
+    traces_window = data[:, 1:].T
+    if time_window:
+        traces_window = traces_window[:, idx_start:idx_end]
+    # Normalize each trace
+    # Need to invert, accidentally exported as voltage??
+    data_Ca = traces.normalize(traces_window, invert=True)
+
+    for trace_idx, trace in enumerate(data_Ca):
+        # Plot each trace
         if trace_idx is 0:
             axis.plot(times_Ca, trace,
                       color=colorsROI_CaRAW[trace_idx], linewidth=2, label='Base')
@@ -395,10 +353,8 @@ heart = np.fliplr(np.rot90(plt.imread('data/20190322-pigb/06-300_RH237_0001.tif'
 # ret, heart_thresh = cv2.threshold(heart, 150, np.nan, cv2.THRESH_TOZERO)
 
 # Import Activation Maps
-actMapsVm = {300: np.fliplr(np.rot90(np.loadtxt('data/20190322-pigb/ActMaps/ActMap-06-300_RH237.csv',
-                                                delimiter=',', skiprows=0)))}
-actMapsCa = {300: np.fliplr(np.rot90(np.loadtxt('data/20190322-pigb/ActMaps/ActMap-06-300_Rhod-2.csv',
-                                                delimiter=',', skiprows=0)))}
+actMapsVm = {300: mapstore.load('data/20190322-pigb/ActMaps/ActMap-06-300_RH237.csv', rot90=1, fliplr=True)}
+actMapsCa = {300: mapstore.load('data/20190322-pigb/ActMaps/ActMap-06-300_Rhod-2.csv', rot90=1, fliplr=True)}
 # Determine max value across all activation maps
 actMapMax = 0
 print('Activation Map max values:')
@@ -2,11 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import numpy as np
-from decimal import *
 import matplotlib.pyplot as plt
 import pandas as pd
 from scipy import stats
 from matplotlib import rcParams
+from AnalysisTools import emka, windows
 import warnings
 
 warnings.filterwarnings('ignore')
@@ -38,30 +38,20 @@ def plot_Traces(axis, data, time_start=0.0, idx_start=None, time_window=None, sc
     time_start, time_window = time_start * 1000, time_window * 1000  # seconds to ms
 
     # Find index of first value after start time
-    for idx, time in enumerate(times):
-        if time < time_start:
-            pass
-        else:
-            idx_start = idx
-            break
+    idx_start = windows.first_index(times, time_start)
 
     if time_window:
         # Find index of first value after end time
-        for idx, time in enumerate(times):
-            if time < time_start + time_window:
-                pass
-            else:
-                idx_end = idx
-                break
-        # Convert possibly strange floats to rounded Decimals
-        time_start_dec = Decimal(time_start).quantize(Decimal('.001'), rounding=ROUND_UP)
-        time_window_dec = Decimal(time_window).quantize(Decimal('.001'), rounding=ROUND_UP)
+        idx_end = windows.first_index(times, time_start + time_window)
+        # Round possibly strange floats up to 0.001 ms
+        time_start_rnd = windows.round_up(time_start)
+        time_window_rnd = windows.round_up(time_window)
         # Slice time array based on indices
         # times = times[idx_start:idx_end]
-        time_end = time_start_dec + time_window_dec
+        time_end = time_start_rnd + time_window_rnd
 
         # Limit x-axis to times of idx_start and (idx_start + time_window)
-        axis.set_xlim([float(time_start_dec), float(time_end)])
+        axis.set_xlim([time_start_rnd, time_end])
 
     # if time_window:
     #     trace = trace[idx_start:idx_end]
@@ -124,27 +114,17 @@ def plot_paces(axis, data, s1_num, s1_pcl, s2_pcl=None, time_start=0.0, time_win
                site=None, capture=None):
     times = (data[:, 0])  # ms
     trace = data[:, 1]
-    idx_start = 0
     idx_end = len(trace - 1)
     time_start = time_start * 1000  # seconds to ms
     time_end = times[-1]
 
     # Find index of first time value after first pace
-    for idx, time in enumerate(times):
-        if time < time_start:
-            pass
-        else:
-            idx_start = idx
-            break
+    idx_start = windows.first_index(times, time_start)
     if time_window:
         # Find index of first value after end time
-        for idx, time in enumerate(times):
-            if time < time_start + time_window:
-                pass
-            else:
-                idx_end = idx
-                time_end = times[idx_end]
-                break
+        idx_end = windows.first_index(times, time_start + time_window)
+        if idx_end < len(times):
+            time_end = times[idx_end]
     # Normalize each trace
     data_min, data_max = np.nanmin(trace[idx_start:idx_end]), np.nanmax(trace[idx_start:idx_end])
     print('*** Normalizing')
@@ -195,14 +175,8 @@ def plot_paces(axis, data, s1_num, s1_pcl, s2_pcl=None, time_start=0.0, time_win
     else:
         # Draw arrow to show S1-S2 pacing spike
         pace_start = paceArrowX[-1] + s2_pcl
-        idx_pace = 0
         # Find index of first value after last pace time
-        for idx, time in enumerate(times):
-            if time < pace_start:
-                pass
-            else:
-                idx_pace = idx
-                break
+        idx_pace = windows.first_index(times, pace_start)
         axis.text(0, paceLabel_Y, 'S1-S1: ' + str(s1_pcl) + ' ms\n'
                                                             'S1-S2: ' + str(s2_pcl) + ' ms',
                   ha='left', fontsize=fontsize_PaceLabel, transform=axis.transAxes)
@@ -269,26 +243,18 @@ axECG_AVNERP1.set_title('AVNERP', fontsize=fontsize_TraceTitle)
 
 # Import ECG Traces
 
-# Skip header and import columns: times (ms), ECG (mV)
-ECG_NSR1 = np.genfromtxt('data/20190517-pigA_NSR1.txt',
-                         skip_header=31, usecols=(0, 1), skip_footer=2)
-ECG_NSR2 = np.genfromtxt('data/20190517-pigA_LV0.txt',
-                         skip_header=31, usecols=(0, 1), skip_footer=2)
-
-ECG_VERP1 = np.genfromtxt('data/20190517-pigA_LV2.txt',
-                          skip_header=31, usecols=(0, 1), skip_footer=2)
-ECG_VERP2 = np.genfromtxt('data/20190517-pigA_LV3.txt',
-                          skip_header=31, usecols=(0, 1), skip_footer=2)
-
-ECG_WBCL1 = np.genfromtxt('data/20190517-pigA_RA2.txt',
-                          skip_header=31, usecols=(0, 1), skip_footer=2)
-ECG_WBCL2 = np.genfromtxt('data/20190517-pigA_RA3.txt',
-                          skip_header=31, usecols=(0, 1), skip_footer=2)
-
-ECG_AVNERP1 = np.genfromtxt('data/20190517-pigA_RA5.txt',
-                            skip_header=31, usecols=(0, 1), skip_footer=2)
-ECG_AVNERP2 = np.genfromtxt('data/20190517-pigA_RA6.txt',
-                            skip_header=31, usecols=(0, 1), skip_footer=2)
+# Import columns: times (ms), ECG (mV)
+ECG_NSR1 = emka.read('data/20190517-pigA_NSR1.txt').stack('time ms', 'ECG')
+ECG_NSR2 = emka.read('data/20190517-pigA_LV0.txt').stack('time ms', 'ECG')
+
+ECG_VERP1 = emka.read('data/20190517-pigA_LV2.txt').stack('time ms', 'ECG')
+ECG_VERP2 = emka.read('data/20190517-pigA_LV3.txt').stack('time ms', 'ECG')
+
+ECG_WBCL1 = emka.read('data/20190517-pigA_RA2.txt').stack('time ms', 'ECG')
+ECG_WBCL2 = emka.read('data/20190517-pigA_RA3.txt').stack('time ms', 'ECG')
+
+ECG_AVNERP1 = emka.read('data/20190517-pigA_RA5.txt').stack('time ms', 'ECG')
+ECG_AVNERP2 = emka.read('data/20190517-pigA_RA6.txt').stack('time ms', 'ECG')
 
 # Plot Traces
 # NSR/Pacing
@@ -2,6 +2,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.ticker as ticker
 import pandas as pandas
+from AnalysisTools import emka
 
 # from scipy import stats
 
@@ -17,11 +18,9 @@ axECGMEHP = fig.add_subplot(gs1[1])
 
 # Control and MEHP ECG traces
 # axECGControl.text(-40, 96, 'A', ha='center', va='bottom', fontsize=16, fontweight='bold')
-# Skip header and import columns: times (ms), ECG (mV)
-ECGControl = np.genfromtxt('data/20171024-ratb_PR _length.txt',
-                           skip_header=28, usecols=(1, 2), skip_footer=2)
-ECGMEHP = np.genfromtxt('data/20171024-rata_PR_length.txt',
-                        skip_header=27, usecols=(1, 2), skip_footer=2)
+# Import columns: times (ms), ECG (mV)
+ECGControl = emka.read('data/20171024-ratb_PR _length.txt').stack('time ms', 'ECG')
+ECGMEHP = emka.read('data/20171024-rata_PR_length.txt').stack('time ms', 'ECG')
 ECGwindow = 250
 
 for idx, ax in enumerate([axECGControl, axECGMEHP]):
@@ -18,6 +18,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from scipy import stats
 from matplotlib import rcParams
+from AnalysisTools import emka
 
 # Common parameters
 colorBase = 'indianred'
@@ -32,9 +33,9 @@ rcParams.update({'figure.autolayout': True})
 snrt = pd.read_csv('data/mehp_snrt_ngp.csv')
 wbcl = pd.read_csv('data/mehp_wbcl_ngp.csv')
 avnerp = pd.read_csv('data/mehp_avnerp_ngp.csv')
-# Skip header and import columns: times (ms), ECG (mV)
-ECGControl = np.genfromtxt('data/20180619-rata-T011840.txt', skip_header=8, usecols=(1, 2), skip_footer=4)
-ECGMEHP = np.genfromtxt('data/20180720T012007-rata-ecg.txt', skip_header=8, usecols=(1, 2), skip_footer=4)
+# Import columns: times (ms), ECG (mV)
+ECGControl = emka.read('data/20180619-rata-T011840.txt').stack('A1-I1-ECG (Smoothed)', 'column 2')
+ECGMEHP = emka.read('data/20180720T012007-rata-ecg.txt').stack('A1-I1-ECG (Smoothed)', 'column 2')
 ECGControl = np.fliplr(ECGControl)
 ECGMEHP = np.fliplr(ECGMEHP)
 # %% Organize all the data frames. You can control the outliers by changing the value property (BOOL)
@@ -11,6 +11,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.lines as mlines
 from scipy.interpolate import interp1d
+from AnalysisTools import restitution
 
 from matplotlib import rcParams
 rcParams.update({'figure.autolayout': True})
@@ -30,6 +31,26 @@ ax = fig.add_subplot(1, 1, 1)
 # standard error bars
 ax.errorbar(bcl,c_mean, yerr=np.array(c_std)/np.sqrt(3), ls='solid', color='indianred',marker='o',ms=8)
 ax.errorbar(bcl, m_mean, yerr=np.array(m_std)/np.sqrt(3), ls=ls, color='midnightblue',marker='s',ms=8)
+
+# Exponential restitution fits, APD80 = a - b * exp(-DI / tau), with DI = BCL - APD80;
+# curves without a resolvable tau (at the grid's bound) are fit with a line instead
+di = restitution.di_from_pcl(bcl, [c_mean, m_mean])
+fits = restitution.fit(di, [c_mean, m_mean])
+fits_linear = restitution.fit(di, [c_mean, m_mean], model='linear')
+di_fit = np.linspace(np.nanmin(fits.di_min), np.nanmax(bcl - np.minimum(c_mean, m_mean)), 100)
+for idx, (name, color, line) in enumerate(zip(['Ctrl', 'MEHP'], ['indianred', 'midnightblue'], ['solid', ls])):
+    if fits.at_bound[idx]:
+        params, r2, max_slope = fits_linear.params[idx], fits_linear.r2[idx], fits_linear.max_slope[idx]
+        print('{}: no exponential restitution (tau at the bound {:.0f} ms), linear fit '
+              'APD80 = {:.1f} + {:.3f} * DI, R^2 {:.2f}, slope {:.2f}'.format(
+                  name, fits.params[idx, 2], params[0], params[1], r2, max_slope))
+        apd_fit = fits_linear.predict(di_fit)[idx]
+    else:
+        params, r2, max_slope = fits.params[idx], fits.r2[idx], fits.max_slope[idx]
+        print('{}: APD80 = {:.1f} - {:.1f} * exp(-DI / {:.1f}), R^2 {:.2f}, max slope {:.2f}'.format(
+            name, params[0], params[1], params[2], r2, max_slope))
+        apd_fit = fits.predict(di_fit)[idx]
+    ax.plot(di_fit + apd_fit, apd_fit, ls=line, color=color, lw=1)
 plt.ylim(ymin=45,ymax=81)
 plt.xlim(xmin=60,xmax=290)
 plt.rc('xtick', labelsize=16) 
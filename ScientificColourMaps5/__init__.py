@@ -5,26 +5,262 @@
     -----
     import ScientificColourMaps5 as SCM5
     plt.imshow(data, cmap=SCM5.berlin)
+    plt.imshow(data, cmap=SCM5.get('lajolla', N=16, reversed=True))
+    rgba = SCM5.apply(act_maps, 'lajolla', vmin=0, vmax=100)  # uint8, no matplotlib axis
 
     Available colourmaps
     ---------------------
     acton, bamako, batlow, berlin, bilbao, broc, buda, cork, davos, devon,
     grayC, hawaii, imola, lajolla, lapaz, lisbon, nuuk, oleron, oslo, roma,
     tofino, tokyo, turku, vik
+
+    All colour tables are read from one memory-mapped float32 bundle
+    (ScientificColourMaps5.npy), built from the <name>/<name>.txt files by
+    build_bundle(). Colourmaps are built the first time they are requested.
+    apply() colours whole arrays (or stacks of maps) through cached uint8
+    lookup tables, without going through Colormap.__call__.
 """
 import os
+import functools
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.colors import Colormap, LinearSegmentedColormap, ListedColormap, to_rgba
 
 folder = os.path.abspath(os.path.dirname(os.path.abspath(__file__)))
+bundle_file = os.path.join(folder, 'ScientificColourMaps5.npy')
 
 __all__ = {'acton', 'bamako', 'batlow', 'berlin', 'bilbao', 'broc', 'buda',
            'cork', 'davos', 'devon', 'grayC', 'hawaii', 'imola', 'lajolla',
            'lapaz', 'lisbon', 'nuuk', 'oleron', 'oslo', 'roma', 'tofino',
            'tokyo', 'turku', 'vik'}
+# Order of the colour tables in the bundle
+names = tuple(sorted(__all__))
+_index = {name: idx for idx, name in enumerate(names)}
+_bundle = None
+
+
+def build_bundle():
+    """
+    Parse every <name>/<name>.txt colour table and write the binary bundle.
+
+    Returns
+    -------
+    bundle : ndarray
+        Colour tables with shape (len(names), 256, 3), float32 RGB in [0, 1]
+    """
+    bundle = np.stack([np.loadtxt(_table_file(name))
+                       for name in names]).astype(np.float32)
+    # Write to a temporary file first so a concurrent reader never maps a partial bundle
+    bundle_tmp = bundle_file + '.{}.tmp'.format(os.getpid())
+    try:
+        np.save(bundle_tmp, bundle)
+        os.replace(bundle_tmp + '.npy', bundle_file)
+    except OSError:
+        # e.g. a read-only install, keep working from the parsed tables
+        if os.path.exists(bundle_tmp + '.npy'):
+            os.remove(bundle_tmp + '.npy')
+    return bundle
+
+
+def _table_file(name):
+    return os.path.join(folder, name, name + '.txt')
+
+
+def _bundle_is_current():
+    # The bundle is stale if it is missing or older than any colour table
+    if not os.path.isfile(bundle_file):
+        return False
+    bundle_mtime = os.path.getmtime(bundle_file)
+    return all(os.path.getmtime(_table_file(name)) <= bundle_mtime for name in names)
+
+
+def _tables():
+    global _bundle
+    if _bundle is None:
+        if _bundle_is_current():
+            _bundle = np.load(bundle_file, mmap_mode='r')
+        if _bundle is None or _bundle.shape[0] != len(names):
+            _bundle = build_bundle()
+    return _bundle
+
+
+def table(name):
+    """
+    Return the colour table of a colourmap.
+
+    Parameters
+    ----------
+    name : str
+        Name of the colourmap, e.g. 'lajolla'
+
+    Returns
+    -------
+    cm_data : ndarray
+        Read-only view of shape (256, 3), float32 RGB in [0, 1]
+    """
+    if name not in _index:
+        raise ValueError('Unknown colourmap {!r}, available: {}'.format(name, ', '.join(names)))
+    return _tables()[_index[name]]
+
+
+@functools.lru_cache(maxsize=None)
+def get(name, N=256, reversed=False, listed=False):
+    """
+    Return a cached colourmap.
+
+    Parameters
+    ----------
+    name : str
+        Name of the colourmap, e.g. 'lajolla'
+
+    N : int, optional
+        Number of RGB quantization levels.
+        Defaults to 256, the size of the colour tables.
+
+    reversed : bool, optional
+        If True, return the reversed colourmap (named <name>_r).
+        Defaults to False.
+
+    listed : bool, optional
+        If True, return a `~matplotlib.colors.ListedColormap` of N colours
+        sampled from the table, otherwise a `~matplotlib.colors.LinearSegmentedColormap`.
+        Defaults to False.
+
+    Returns
+    -------
+    cmap : `~matplotlib.colors.Colormap`
+        The same object is returned for repeated calls with the same arguments.
+    """
+    cm_data = np.asarray(table(name), dtype=float)
+    if reversed:
+        cm_data = cm_data[::-1]
+        name = name + '_r'
+    if listed:
+        if N != len(cm_data):
+            # Resample each channel at N evenly spaced positions
+            x_table = np.linspace(0, 1, len(cm_data))
+            x_n = np.linspace(0, 1, N)
+            cm_data = np.column_stack([np.interp(x_n, x_table, channel) for channel in cm_data.T])
+        return ListedColormap(cm_data, name=name, N=N)
+    return LinearSegmentedColormap.from_list(name, cm_data, N=N)
+
+
+def lut(cmap, N=256, reversed=False, bad=(0, 0, 0, 0)):
+    """
+    Return a uint8 RGBA lookup table for a colourmap.
+
+    Parameters
+    ----------
+    cmap : str or `~matplotlib.colors.Colormap`
+        Name of a colourmap in this package (the table is cached), or any
+        colourmap object (sampled at N points, so limited to its own number of levels).
+
+    N : int, optional
+        Number of entries, e.g. 256 or 4096.
+        Defaults to 256.
+
+    reversed : bool, optional
+        If True, use the reversed colourmap. Only used with a colourmap name.
+        Defaults to False.
+
+    bad : color, optional
+        Colour for invalid (NaN or masked) values, stored as the last entry.
+        Defaults to transparent, matching matplotlib.
+
+    Returns
+    -------
+    table : ndarray
+        Read-only uint8 array of shape (N + 1, 4), entry N is the bad colour
+    """
+    bad = to_rgba(bad)
+    if isinstance(cmap, str):
+        return _lut_cached(cmap, N, reversed, bad)
+    if isinstance(cmap, Colormap):
+        return _lut_table(cmap(np.linspace(0, 1, N), bytes=True), bad)
+    raise TypeError('cmap must be a colourmap name or a Colormap, not {}'.format(type(cmap).__name__))
+
+
+@functools.lru_cache(maxsize=None)
+def _lut_cached(name, N, reversed, bad):
+    return _lut_table(get(name, N=N, reversed=reversed)(np.arange(N), bytes=True), bad)
+
+
+def _lut_table(colours, bad):
+    bad_colour = np.round(np.array(bad) * 255).astype(np.uint8)
+    table = np.vstack((colours, bad_colour))
+    table.setflags(write=False)
+    return table
+
+
+def apply(data, cmap, vmin=None, vmax=None, N=256, reversed=False, bad=(0, 0, 0, 0),
+          valid_min=None, valid_max=None):
+    """
+    Colour an array, or a stack of maps, with a single lookup table gather.
+
+    Parameters
+    ----------
+    data : array-like or masked array
+        Values to colour, any shape, e.g. a (H, W) map or a (n_maps, H, W) stack.
+        NaNs and masked values are coloured with `bad`.
+
+    cmap : str or `~matplotlib.colors.Colormap`
+        See lut()
+
+    vmin, vmax : float, optional
+        Normalization range shared by the whole array, like `~matplotlib.colors.Normalize`.
+        Values outside it are clipped to the end colours.
+        Default to the min and max of the valid values.
+
+    N : int, optional
+        Number of lookup table entries, e.g. 256 or 4096.
+        Defaults to 256.
+
+    reversed : bool, optional
+        If True, use the reversed colourmap.
+        Defaults to False.
+
+    bad : color, optional
+        Colour for invalid values.
+        Defaults to transparent.
+
+    valid_min, valid_max : float, optional
+        Values below valid_min or above valid_max are treated as invalid, the same as
+        np.ma.masked_less(data, valid_min) and np.ma.masked_greater(data, valid_max).
+
+    Returns
+    -------
+    rgba : ndarray
+        uint8 array with the shape of data plus a trailing axis of 4 (RGBA)
+    """
+    values = np.asarray(np.ma.getdata(data), dtype=float)
+    invalid = np.ma.getmaskarray(data) | ~np.isfinite(values)
+    with np.errstate(invalid='ignore'):
+        if valid_min is not None:
+            invalid |= values < valid_min
+        if valid_max is not None:
+            invalid |= values > valid_max
+    if vmin is None or vmax is None:
+        valid = values[~invalid]
+        if vmin is None:
+            vmin = valid.min() if valid.size else 0
+        if vmax is None:
+            vmax = valid.max() if valid.size else 1
+    # Scale to [0, N) as Colormap.__call__ does, then clip and send invalid values to the bad entry
+    scale = N / (vmax - vmin) if vmax > vmin else 0
+    idx = np.where(invalid, 0, values)
+    idx -= vmin
+    idx *= scale
+    np.clip(idx, 0, N - 1, out=idx)
+    idx = idx.astype(np.intp)
+    idx[invalid] = N
+    return np.take(lut(cmap, N=N, reversed=reversed, bad=bad), idx, axis=0)
+
+
+def __getattr__(name):
+    # Module attributes are the default colourmaps from the registry
+    if name not in __all__:
+        raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+    return get(name)
+
 
-for name in __all__:
-    file = os.path.join(folder, name, name + '.txt')
-    cm_data = np.loadtxt(file)
-    vars()[name] = LinearSegmentedColormap.from_list(name, cm_data)
+def __dir__():
+    return sorted(set(globals()) | __all__)
@@ -0,0 +1,28 @@
+import numpy as np
+from AnalysisTools import phase
+
+
+def _points(frames, rows, cols, charges=1):
+    points = np.zeros(len(frames), dtype=phase.POINT_DTYPE)
+    points['frame'], points['row'], points['col'], points['charge'] = frames, rows, cols, charges
+    return points
+
+
+def test_track_links_past_already_linked_points():
+    # (0, 1) takes the track of (0, 0) first; (1.2, 0) must still continue the
+    # track of (2.5, 0), 1.3 px away, instead of starting a new one
+    points = _points([0, 0, 1, 1], [0, 2.5, 0, 1.2], [0, 0, 1, 0])
+    tracks = phase.track(points, max_distance=3)
+    assert list(tracks['track']) == [0, 1, 0, 1]
+
+
+def test_track_starts_new_tracks_beyond_max_distance():
+    points = _points([0, 1], [0, 10], [0, 0])
+    tracks = phase.track(points, max_distance=3)
+    assert list(tracks['track']) == [0, 1]
+
+
+def test_track_keeps_charges_apart():
+    points = _points([0, 1], [0, 1], [0, 0], charges=[1, -1])
+    tracks = phase.track(points, max_distance=3)
+    assert list(tracks['track']) == [0, 1]